@@ -0,0 +1 @@
+"""Offline, reproducible benchmarks for the digest pipeline (see `python -m benchmarks.run --help`)."""
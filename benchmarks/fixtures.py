@@ -0,0 +1,207 @@
+"""
+Deterministic benchmark fixtures: arXiv API Atom feeds of several sizes and synthetic PDFs.
+
+Feeds are generated in exactly the format the arXiv API returns (the same namespaces,
+elements and OpenSearch header), from a fixed seed, so every run sees identical input.
+A feed saved from the real API with `curl` can be dropped in as a fixture instead.
+
+    python -m benchmarks.fixtures --out .cache/benchmarks/fixtures
+"""
+import argparse
+import gzip
+import os
+import random
+from xml.sax.saxutils import escape, quoteattr
+
+FEED_SIZES = (100, 1000, 10000)
+
+_VOCABULARY = (
+    "galaxy galaxies star formation molecular gas dense cloud clouds interstellar medium dust emission "
+    "spectra spectroscopy survey redshift halo halos dark matter simulation simulations quenching feedback "
+    "supernova black hole accretion disk outflow jet magnetic field turbulence kinematics rotation curve "
+    "metallicity abundance stellar population photometry telescope observations ALMA JWST CO HCN kpc "
+    "luminosity function mass ratio efficiency depletion time cosmic evolution nearby massive dwarf "
+    "spiral elliptical cluster clusters filament filaments resolution model models data sample method"
+).split()
+_SECTIONS = ("Introduction", "Data and Observations", "Methods", "Results", "Discussion", "Conclusions")
+_SURNAMES = ("Smith", "Garcia", "Chen", "Müller", "Okafor", "Tanaka", "Rossi", "Novak", "Silva", "Khan")
+_CATEGORIES = ("astro-ph.GA", "astro-ph.CO", "astro-ph.SR", "astro-ph.HE", "astro-ph.IM")
+
+FEED_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<feed xmlns="http://www.w3.org/2005/Atom">\n'
+    '  <link href="http://arxiv.org/api/query" rel="self" type="application/atom+xml"/>\n'
+    '  <title type="html">ArXiv Query: benchmark fixture</title>\n'
+    '  <id>http://arxiv.org/api/benchmark</id>\n'
+    '  <updated>2026-01-05T00:00:00-05:00</updated>\n'
+    '  <opensearch:totalResults xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">{total}</opensearch:totalResults>\n'
+    '  <opensearch:startIndex xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">{start}</opensearch:startIndex>\n'
+    '  <opensearch:itemsPerPage xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">{per_page}</opensearch:itemsPerPage>\n'
+)
+FEED_FOOTER = '</feed>\n'
+
+
+def _sentence(rng, words):
+    text = " ".join(rng.choice(_VOCABULARY) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def make_entry(index, seed=0, category="astro-ph.GA"):
+    """Returns one Atom <entry> (as text) for a synthetic paper; the same index and seed give the same entry."""
+    rng = random.Random(f"{seed}:{index}")
+    arxiv_id = f"2601.{index:05d}v{rng.randint(1, 3)}"
+    title = _sentence(rng, rng.randint(6, 14))[:-1]
+    abstract = " ".join(_sentence(rng, rng.randint(12, 25)) for _ in range(rng.randint(6, 10)))
+    cross_lists = rng.sample([c for c in _CATEGORIES if c != category], rng.randint(0, 2))
+    authors = "".join(
+        f'    <author>\n      <name>{escape(rng.choice("ABCDEFGHJKLMNPRS"))}. {escape(rng.choice(_SURNAMES))}</name>\n'
+        + (f'      <arxiv:affiliation xmlns:arxiv="http://arxiv.org/schemas/atom">University {rng.randint(1, 50)}</arxiv:affiliation>\n'
+           if rng.random() < 0.5 else '')
+        + '    </author>\n'
+        for _ in range(rng.randint(1, 8))
+    )
+    categories = "".join(f'    <category term={quoteattr(c)} scheme="http://arxiv.org/schemas/atom"/>\n'
+                         for c in [category] + cross_lists)
+    day = 1 + index % 28
+    return (
+        '  <entry>\n'
+        f'    <id>http://arxiv.org/abs/{arxiv_id}</id>\n'
+        f'    <updated>2026-01-{day:02d}T18:00:00Z</updated>\n'
+        f'    <published>2026-01-{day:02d}T15:00:00Z</published>\n'
+        f'    <title>{escape(title)}</title>\n'
+        f'    <summary>  {escape(abstract)}\n    </summary>\n'
+        f'{authors}'
+        f'    <arxiv:comment xmlns:arxiv="http://arxiv.org/schemas/atom">{rng.randint(5, 40)} pages, {rng.randint(1, 20)} figures</arxiv:comment>\n'
+        f'    <link href="http://arxiv.org/abs/{arxiv_id}" rel="alternate" type="text/html"/>\n'
+        f'    <link title="pdf" href="http://arxiv.org/pdf/{arxiv_id}" rel="related" type="application/pdf"/>\n'
+        f'    <arxiv:primary_category xmlns:arxiv="http://arxiv.org/schemas/atom" term="{category}" scheme="http://arxiv.org/schemas/atom"/>\n'
+        f'{categories}'
+        '  </entry>\n'
+    )
+
+
+def make_feed(entries, total=None, start=0):
+    """Wraps entry texts in a feed page with the OpenSearch header the pipeline reads."""
+    header = FEED_HEADER.format(total=len(entries) if total is None else total, start=start, per_page=len(entries))
+    return header + "".join(entries) + FEED_FOOTER
+
+
+def write_feed_fixture(path, size, seed=0, category="astro-ph.GA"):
+    """Writes a complete feed of `size` papers to `path` (gzipped if it ends in .gz) and returns the path."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    feed = make_feed([make_entry(i, seed, category) for i in range(size)])
+    opener = gzip.open if path.endswith('.gz') else open
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with opener(tmp_path, 'wt', encoding='utf-8') as f:
+        f.write(feed)
+    os.replace(tmp_path, path)
+    return path
+
+
+def feed_fixture(directory, size, seed=0):
+    """Returns the path of the fixture feed with `size` papers, generating it on first use."""
+    path = os.path.join(directory, f"feed_{size}_seed{seed}.xml.gz")
+    if not os.path.exists(path):
+        write_feed_fixture(path, size, seed)
+    return path
+
+
+def read_feed_entries(path):
+    """Splits a saved feed into its raw <entry> texts, so a stub server can page through them."""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        text = f.read()
+    entries, position = [], 0
+    while True:
+        start = text.find('<entry>', position)
+        if start < 0:
+            return entries
+        end = text.index('</entry>', start) + len('</entry>')
+        entries.append('  ' + text[start:end] + '\n')
+        position = end
+
+
+def _pdf_string(text):
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def make_pdf(n_pages, seed=0, lines_per_page=48, words_per_line=12):
+    """
+    Builds a text-only PDF with `n_pages` pages of paper-like prose.
+
+    Pages carry numbered section headings (Introduction ... Conclusions), then References,
+    so extraction and section-aware context selection do realistic work. The output is
+    deterministic for a given seed and parses with PyPDF2.
+
+    Returns:
+        bytes: The PDF file.
+    """
+    rng = random.Random(f"pdf:{seed}")
+    body_pages = n_pages - 1 if n_pages > 1 else 1
+    # Sections are spread evenly over the body lines, so even short papers have every heading.
+    body_lines = body_pages * lines_per_page
+    line_number, section = 0, -1
+    pages = []
+    for page in range(n_pages):
+        lines = []
+        if page == 0:
+            lines += [_sentence(rng, 8)[:-1], "A. Author, B. Author", "Abstract", *[_sentence(rng, words_per_line) for _ in range(6)]]
+        if n_pages > 1 and page == n_pages - 1:
+            lines.append("References")
+            lines += [f"{rng.choice(_SURNAMES)}, A. 20{rng.randint(10, 25)}, ApJ, {rng.randint(100, 999)}, {rng.randint(1, 99)}"
+                      for _ in range(lines_per_page - 1)]
+        else:
+            while len(lines) < lines_per_page:
+                if line_number * len(_SECTIONS) // body_lines > section:
+                    section += 1
+                    lines.append(f"{section + 1} {_SECTIONS[section]}")
+                else:
+                    lines.append(_sentence(rng, words_per_line))
+                line_number += 1
+        pages.append(lines)
+
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for lines in pages:
+        stream = "BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(f"{_pdf_string(line)} Tj T*" for line in lines) + " ET"
+        stream = stream.encode('latin-1', 'replace')
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >>"
+                       b" /Contents %d 0 R >>" % len(objects))
+        page_ids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % page_id for page_id in page_ids), len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write the benchmark feed fixtures and sample PDFs.")
+    parser.add_argument('--out', default=os.path.join('.cache', 'benchmarks', 'fixtures'))
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(FEED_SIZES))
+    parser.add_argument('--pages', type=int, nargs='+', default=[4, 16, 64])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    for size in args.sizes:
+        print(feed_fixture(args.out, size, args.seed))
+    for n_pages in args.pages:
+        path = os.path.join(args.out, f"paper_{n_pages}p.pdf")
+        with open(path, 'wb') as f:
+            f.write(make_pdf(n_pages, args.seed))
+        print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,154 @@
+"""
+Network-free, end-to-end benchmarks of the digest pipeline.
+
+For every feed size and PDF length, `run_digest` runs twice in a fresh cache directory,
+against a local arXiv stub and a fake Gemini client:
+
+  cold  Empty caches. Every paper is fetched and embedded, and the top papers are downloaded,
+        extracted and summarized.
+  warm  The run state is reset but the caches are kept, as for a rerun or a second user.
+        Embeddings, extracted texts and LLM responses come from the caches.
+
+Each run's per-stage spans and counters (see src/instrumentation.py) are written to one
+JSON file, so results from different commits can be compared:
+
+    python -m benchmarks.run --sizes 100 1000 --pages 8 32 --llm-latency 0.5
+"""
+import argparse
+import contextlib
+import datetime
+import glob
+import io
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+
+from benchmarks.fixtures import FEED_SIZES, feed_fixture
+from benchmarks.stubs import HashingEmbeddingModel, StubArxivServer
+
+# The stubs answer instantly, so the politeness limits are lifted to measure the pipeline itself.
+UNLIMITED = {'arxiv_api_delay': 0, 'pdf_requests_per_second': 1e6, 'llm_requests_per_minute': 1e9}
+
+SUMMARY_SPANS = ('fetch', 'embed', 'rank', 'download', 'extract', 'context', 'summarize')
+
+
+def make_context(cache_dir, args):
+    from src.pipeline import PipelineContext
+    from src.summarize_executor import FakeGenaiClient
+
+    if args.embedding_model == 'hashing':
+        model, model_name = HashingEmbeddingModel(), 'hashing-384'
+    else:
+        model, model_name = None, args.embedding_model
+    return PipelineContext(cache_dir=cache_dir, embedding_model_name=model_name, limits=UNLIMITED,
+                           embedding_model=model, client=FakeGenaiClient(latency=args.llm_latency))
+
+
+def run_phase(phase, ctx, server, args):
+    """Runs one digest with fresh metrics and returns its result row."""
+    from src.instrumentation import Metrics, set_metrics
+    from src.pipeline import DEFAULT_CATEGORY, DEFAULT_INTERESTS, run_digest
+
+    metrics = Metrics()
+    set_metrics(metrics)
+    requests_before, bytes_before = dict(server.requests), server.bytes_served
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output) if not args.verbose else contextlib.nullcontext():
+        with metrics.span('digest'):
+            digest = run_digest(ctx, DEFAULT_CATEGORY, args.interests or DEFAULT_INTERESTS, top_k=args.top_k,
+                                prefilter=args.prefilter)
+    wall = time.perf_counter() - start
+    snapshot = metrics.snapshot()
+    papers = snapshot['counters'].get('arxiv.papers', 0)
+    return {
+        'phase': phase,
+        'wall_s': wall,
+        'papers': papers,
+        'papers_per_s': papers / wall if wall else None,
+        'digest_ok': digest is not None,
+        'stub_requests': {kind: server.requests[kind] - requests_before[kind] for kind in server.requests},
+        'stub_bytes': server.bytes_served - bytes_before,
+        'metrics': snapshot,
+    }
+
+
+def run_case(size, pdf_pages, args):
+    """Benchmarks one feed size and PDF length, cold then warm, in a throwaway cache directory."""
+    from src import arxiv_utils
+
+    feed_path = feed_fixture(args.fixtures, size, args.seed)
+    cache_dir = tempfile.mkdtemp(prefix=f"bench_{size}_{pdf_pages}p_", dir=args.work_dir)
+    api_url, pdf_url = arxiv_utils.ARXIV_API_URL, arxiv_utils.ARXIV_PDF_URL
+    rows = []
+    try:
+        with StubArxivServer(feed_path, pdf_pages=pdf_pages, latency=args.network_latency) as server:
+            arxiv_utils.ARXIV_API_URL, arxiv_utils.ARXIV_PDF_URL = server.api_url, server.pdf_url
+            ctx = make_context(cache_dir, args)
+            rows.append(run_phase('cold', ctx, server, args))
+            # Forget the run and the watermark, but keep every cache.
+            ctx.state.close()
+            for path in glob.glob(os.path.join(cache_dir, "state.sqlite*")):
+                os.remove(path)
+            rows.append(run_phase('warm', make_context(cache_dir, args), server, args))
+    finally:
+        arxiv_utils.ARXIV_API_URL, arxiv_utils.ARXIV_PDF_URL = api_url, pdf_url
+        if not args.keep:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+    for row in rows:
+        row.update(size=size, pdf_pages=pdf_pages)
+    return rows
+
+
+def format_row(row):
+    spans = row['metrics']['spans']
+    stages = "  ".join(f"{name}={spans[name]['total_s']:.3f}s" for name in SUMMARY_SPANS if name in spans)
+    return (f"{row['phase']:>4}  papers={row['size']:<6} pages={row['pdf_pages']:<4} wall={row['wall_s']:.3f}s  "
+            f"{row['papers_per_s'] or 0:.0f} papers/s  {stages}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmarks of the digest pipeline.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(FEED_SIZES[:2]),
+                        help="Papers in the feed fixture; one benchmark per size.")
+    parser.add_argument('--pages', type=int, nargs='+', default=[8], help="Pages per synthetic PDF; one benchmark per value.")
+    parser.add_argument('--top-k', type=int, default=5, help="Papers downloaded and summarized per run.")
+    parser.add_argument('--prefilter', type=int, default=None, help="Benchmark the BM25 prefilter path with N candidates.")
+    parser.add_argument('--interests', default=None)
+    parser.add_argument('--llm-latency', type=float, default=0.2, help="Seconds the fake Gemini client takes per call.")
+    parser.add_argument('--network-latency', type=float, default=0.0, help="Seconds the arXiv stub adds to each response.")
+    parser.add_argument('--embedding-model', default='hashing',
+                        help="'hashing' (offline, near-free) or a SentenceTransformer name such as all-MiniLM-L6-v2.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--fixtures', default=os.path.join('.cache', 'benchmarks', 'fixtures'))
+    parser.add_argument('--work-dir', default=None, help="Where the throwaway cache directories go (default: the system temp dir).")
+    parser.add_argument('--keep', action='store_true', help="Keep each run's cache directory.")
+    parser.add_argument('--output', default=None,
+                        help="The JSON results file (default: .cache/benchmarks/results_<timestamp>.json).")
+    parser.add_argument('--verbose', action='store_true', help="Show the pipeline's own output.")
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in args.sizes:
+        for pdf_pages in args.pages:
+            for row in run_case(size, pdf_pages, args):
+                print(format_row(row))
+                results.append(row)
+
+    output = args.output or os.path.join(
+        '.cache', 'benchmarks', f"results_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'created': datetime.datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+                   'platform': platform.platform(), 'args': vars(args), 'results': results}, f, indent=2)
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,167 @@
+"""
+Offline stand-ins for the network services: a local arXiv API/PDF server and a hashing
+embedding model. The fake Gemini client is `src.summarize_executor.FakeGenaiClient`.
+"""
+import hashlib
+import re
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from benchmarks.fixtures import make_feed, make_pdf, read_feed_entries
+
+_PDF_PATH = re.compile(r"^/pdf/(.+?)(?:\.pdf)?$")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b"", content_type="application/octet-stream", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        stub = self.server.stub
+        stub.record_request(self.path)
+        if stub.latency:
+            time.sleep(stub.latency)
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == '/api/query':
+            query = urllib.parse.parse_qs(url.query)
+            start = int(query.get('start', ['0'])[0])
+            max_results = int(query.get('max_results', ['100'])[0])
+            page = make_feed(stub.entries[start:start + max_results], total=len(stub.entries), start=start)
+            self._send(200, page.encode('utf-8'), "application/atom+xml; charset=utf-8")
+            return
+        match = _PDF_PATH.match(url.path)
+        if match:
+            body = stub.pdf_bytes(match.group(1))
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            if self.headers.get('If-None-Match') == etag:
+                self._send(304, headers={"ETag": etag})
+                return
+            stub.record_bytes(len(body))
+            self._send(200, body, "application/pdf", {"ETag": etag, "Last-Modified": "Mon, 05 Jan 2026 00:00:00 GMT"})
+            return
+        self._send(404, b"not found", "text/plain")
+
+
+class StubArxivServer:
+    """
+    A local HTTP server that answers arXiv API queries from a saved feed and serves synthetic PDFs.
+
+    `/api/query` pages through the feed's entries using `start` and `max_results` (the search
+    query itself is ignored), and `/pdf/<id>.pdf` returns a deterministic PDF whose page count
+    is `pdf_pages`, or drawn per paper from a (min, max) range. PDFs carry an ETag and honour
+    If-None-Match. Point the pipeline at it with `api_url` and `pdf_url`.
+
+    Args:
+        feed_path (str): A saved Atom feed (see `benchmarks.fixtures.feed_fixture`).
+        pdf_pages (int or tuple): Pages per PDF, or a (min, max) range.
+        latency (float): Seconds added before every response, to model network round trips.
+        host (str), port (int): The address to bind; port 0 picks a free port.
+    """
+
+    def __init__(self, feed_path, pdf_pages=8, latency=0.0, host='127.0.0.1', port=0):
+        self.entries = read_feed_entries(feed_path)
+        self.pdf_pages = pdf_pages
+        self.latency = latency
+        self.requests = {'api': 0, 'pdf': 0}
+        self.bytes_served = 0
+        self._pdfs = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        return f"{self.base_url}/api/query?"
+
+    @property
+    def pdf_url(self):
+        return f"{self.base_url}/pdf/"
+
+    def record_request(self, path):
+        with self._lock:
+            self.requests['api' if path.startswith('/api/') else 'pdf'] += 1
+
+    def record_bytes(self, n_bytes):
+        with self._lock:
+            self.bytes_served += n_bytes
+
+    def pdf_bytes(self, arxiv_id):
+        """Returns (and memoizes) the synthetic PDF for an arXiv ID."""
+        with self._lock:
+            body = self._pdfs.get(arxiv_id)
+        if body is None:
+            seed = zlib.crc32(arxiv_id.encode('utf-8'))
+            pages = self.pdf_pages
+            if isinstance(pages, (tuple, list)):
+                pages = pages[0] + seed % (pages[1] - pages[0] + 1)
+            body = make_pdf(pages, seed)
+            with self._lock:
+                self._pdfs[arxiv_id] = body
+        return body
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class HashingEmbeddingModel:
+    """
+    A network-free embedding model with SentenceTransformer's `encode` interface.
+
+    Each text becomes a normalized bag of hashed words, so similar texts still score
+    higher than unrelated ones. It is far cheaper than MiniLM; benchmark with the real
+    model (`--embedding-model all-MiniLM-L6-v2`) to measure embedding cost.
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, batch_size=64, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False):
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            columns = [zlib.crc32(word.encode('utf-8')) % self.dim for word in _WORD.findall(text.lower())]
+            np.add.at(embeddings[row], columns, 1.0)
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            embeddings /= norms
+        return embeddings
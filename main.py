@@ -1,164 +1,202 @@
+import argparse
+import datetime
 import os
+import sys
+
 from dotenv import load_dotenv
-import datetime
-import requests
-import xml.etree.ElementTree as ET # Keep this for ET.fromstring in main.py
-import io # Not explicitly used, but if it was in original, remove if not needed
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-from google import genai
-from google.genai import types
-import contextlib # for httpx error
 
 # Load environment variables from .env file
 # Explicitly specifying '.env' to ensure it finds the file
 load_dotenv('.env')
 
-# --- Import functions from your new modules ---
-from src.arxiv_utils import get_arxiv_dates, extract_arxiv_metadata, convert_abs_url_to_pdf_url, download_pdf
-from src.llm_utils import generate_content_with_history, update_chat_config, summarize_text_with_llm
-from src.pdf_utils import extract_text_from_pdf
-
-# --- API Key & Client Initialization ---
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-
-if GOOGLE_API_KEY is None:
-    raise ValueError("GOOGLE_API_KEY environment variable not set. Please create a .env file with GOOGLE_API_KEY=YOUR_KEY.")
-
-client = genai.Client(api_key=GOOGLE_API_KEY)
+# Only lightweight modules are imported here; each command imports sentence-transformers,
+# google-genai and the rest of the pipeline only when it needs them.
+from src.pipeline import DEFAULT_CATEGORY, DEFAULT_INTERESTS, PipelineContext
 
-# --- Embedding Model Initialization ---
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
 
+def cmd_fetch(ctx, args):
+    from src.arxiv_utils import get_arxiv_dates
+    from src.pipeline import fetch_papers
 
-# --- Define research interests ---
-research_interests = "I'm interested in the connection between molecular gas and star formation in nearby galaxies, with a focus on dense molecular gas."
-print(f"Your research interests are: {research_interests}") # This will still print as it goes to stdout, not stderr
+    start_date, end_date = get_arxiv_dates()
+    papers, _ = fetch_papers(ctx, args.category, start_date, end_date)
+    print(f"Fetched and embedded {len(papers)} {args.category} papers submitted {start_date}-{end_date}.")
 
-# --- ArXiv API Query Setup and Execution ---
-start_date, end_date = get_arxiv_dates()
 
-print(f"Start date (YYYYMMDDHHMM): {start_date}")
-print(f"End date (YYYYMMDDHHMM): {end_date}")
+def cmd_rank(ctx, args):
+    from src.arxiv_utils import get_arxiv_dates
+    from src.pipeline import load_papers
+    from src.ranking_utils import rank_papers
+
+    start_date, end_date = get_arxiv_dates()
+    papers, embeddings = load_papers(ctx, args.category, end_date, start_date=start_date, embed=not args.prefilter)
+    if not papers:
+        print(f"No {args.category} papers found for {start_date}-{end_date}.")
+        return 1
+    interests = args.interests or [DEFAULT_INTERESTS]
+    rankings = rank_papers(papers, interests, ctx.embedding_model, top_k=args.top_k, paper_embeddings=embeddings,
+                           cache=ctx.embedding_cache, lexical_index=ctx.lexical_index if args.prefilter else None,
+                           candidates=args.prefilter, boost_terms=args.boost, exclude_terms=args.exclude)
+    for interest, ranked in zip(interests, rankings):
+        print(f"\n--- {interest} ---")
+        for i, item in enumerate(ranked):
+            print(f"{i+1}. ({item['similarity']:.4f}) {item['metadata']['title']} <{item['metadata']['id']}>")
+    return 0
+
+
+def cmd_summarize(ctx, args):
+    from src.pipeline import format_digest, summarize_papers
+
+    print(format_digest(summarize_papers(ctx, args.arxiv_urls)))
+    return 0
+
+
+def cmd_digest(ctx, args):
+    from src.pipeline import load_cached_digest, run_digest, user_digest_name, window_day
+
+    if not args.cached:
+        digest = run_digest(ctx, args.category, args.interests, top_k=args.top_k, prefilter=args.prefilter,
+                            boost_terms=args.boost, exclude_terms=args.exclude)
+        if digest is None:
+            # Nothing new since the last run is not an error, e.g. for a cron job run twice a day.
+            print(f"No new digest for {args.category}: nothing new was submitted since the last run.")
+        return 0
+
+    day = args.date
+    if day is None:
+        from src.arxiv_utils import get_arxiv_dates
+        day = window_day(get_arxiv_dates()[1])
+    name = user_digest_name(args.user) if args.user else args.category
+    digest = load_cached_digest(ctx, day, name)
+    if digest is None:
+        print(f"No saved digest for {args.user or args.category} on {day}. Run `python main.py digest` or `batch` first.")
+        return 1
+    print(digest)
+    return 0
+
+
+def cmd_batch(ctx, args):
+    from src.batch import load_batch_config, run_batch
+
+    paths = run_batch(ctx, load_batch_config(args.config))
+    if not paths:
+        print("No new digests: nothing new was submitted since the last batch run.")
+    for user_name, path in paths.items():
+        print(f"Digest for {user_name}: {path}")
+    return 0
+
+
+def cmd_import(ctx, args):
+    from src.bulk_import import import_metadata, index_shards
+    from src.pipeline import LazyEmbeddingModel
+
+    out_dir = args.out or os.path.join(ctx.cache_dir, "bulk")
+    # The model is built on first use, after the parsing processes have started.
+    embedding_model = None if args.no_embed else LazyEmbeddingModel(ctx)
+    import_metadata(args.sources, out_dir, embedding_model, categories=args.categories, since=args.since,
+                    until=args.until, max_workers=args.workers, shard_size=args.shard_size,
+                    model_name=None if args.no_embed else ctx.embedding_model_name)
+    if args.index:
+        count = index_shards(out_dir, None if args.no_embed else ctx.corpus_index, ctx.lexical_index)
+        print(f"Indexed {count} imported papers.")
+    return 0
+
+
+def cmd_serve(ctx, args):
+    from src.service import serve
+
+    serve(args.host, args.port, ctx)
+    return 0
+
+
+def _parse_day(value):
+    return datetime.datetime.strptime(value, '%Y%m%d').date()
+
+
+def _add_prefilter_arguments(parser):
+    parser.add_argument('--prefilter', type=int, default=None, metavar='N',
+                        help="Embed only the N best keyword (BM25) matches per interest profile.")
+    parser.add_argument('--boost', action='append', default=None, help="With --prefilter, a keyword to favour; repeatable.")
+    parser.add_argument('--exclude', action='append', default=None, help="With --prefilter, a keyword to exclude; repeatable.")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Rank and summarize new arXiv papers for your research interests.")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Where embeddings, snapshots, digests and LLM responses are kept "
+                             "(default: $ARXIV_ASSISTANT_CACHE_DIR or .cache).")
+    parser.add_argument('--metrics', default=None, metavar='PATH',
+                        help="Write per-stage timings and counters (papers, bytes, pages, tokens, cache hits) as JSON.")
+    subparsers = parser.add_subparsers(dest='command')
+
+    fetch = subparsers.add_parser('fetch', help="Fetch and embed the latest papers in a category.")
+    fetch.add_argument('--category', default=DEFAULT_CATEGORY)
+    fetch.set_defaults(func=cmd_fetch)
+
+    rank = subparsers.add_parser('rank', help="Rank the latest papers against one or more interest profiles.")
+    rank.add_argument('--category', default=DEFAULT_CATEGORY)
+    rank.add_argument('--interests', action='append', help="An interest profile; repeat for several profiles.")
+    rank.add_argument('--top-k', type=int, default=5)
+    _add_prefilter_arguments(rank)
+    rank.set_defaults(func=cmd_rank)
+
+    summarize = subparsers.add_parser('summarize', help="Download and summarize specific papers.")
+    summarize.add_argument('arxiv_urls', nargs='+', metavar='arxiv_url',
+                           help="An arXiv abstract URL (e.g., http://arxiv.org/abs/2504.06802v1).")
+    summarize.set_defaults(func=cmd_summarize)
+
+    digest = subparsers.add_parser('digest', help="Run the full daily pipeline (the default command).")
+    digest.add_argument('--category', default=DEFAULT_CATEGORY)
+    digest.add_argument('--interests', default=DEFAULT_INTERESTS)
+    digest.add_argument('--top-k', type=int, default=5)
+    _add_prefilter_arguments(digest)
+    digest.add_argument('--cached', action='store_true', help="Print the saved digest instead of running the pipeline.")
+    digest.add_argument('--date', type=_parse_day, default=None, help="The digest to print with --cached (YYYYMMDD).")
+    digest.add_argument('--user', default=None, help="With --cached, print a batch user's digest instead.")
+    digest.set_defaults(func=cmd_digest)
+
+    batch = subparsers.add_parser('batch', help="Build digests for many users and categories in one run.")
+    batch.add_argument('--config', required=True, help="A JSON file mapping users to categories and interests.")
+    batch.set_defaults(func=cmd_batch)
+
+    bulk = subparsers.add_parser('import', help="Bulk-import arXiv metadata snapshots (JSON lines) or OAI-PMH dumps (XML).")
+    bulk.add_argument('sources', nargs='+', help="Snapshot (.json/.jsonl[.gz]) or OAI-PMH (.xml[.gz]) files.")
+    bulk.add_argument('--out', default=None, help="Output directory for the shards (default: <cache-dir>/bulk).")
+    bulk.add_argument('--categories', action='append', default=None,
+                      help="Keep only this category or archive (e.g., astro-ph); repeatable.")
+    bulk.add_argument('--since', default=None, help="Keep papers first submitted on or after YYYY-MM-DD.")
+    bulk.add_argument('--until', default=None, help="Keep papers first submitted on or before YYYY-MM-DD.")
+    bulk.add_argument('--workers', type=int, default=None, help="Parsing processes (default: one per CPU).")
+    bulk.add_argument('--shard-size', type=int, default=50000)
+    bulk.add_argument('--no-embed', action='store_true', help="Write metadata shards only.")
+    bulk.add_argument('--index', action='store_true', help="Also add the papers to the corpus and keyword indexes.")
+    bulk.set_defaults(func=cmd_import)
+
+    serve = subparsers.add_parser('serve', help="Run a warm HTTP service that answers ranking requests.")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=int(os.getenv("ARXIV_ASSISTANT_PORT", "8765")))
+    serve.set_defaults(func=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        # Running `python main.py` on its own still produces the daily digest.
+        args = parser.parse_args((argv if argv is not None else sys.argv[1:]) + ['digest'])
+    ctx = PipelineContext(cache_dir=args.cache_dir)
+    if not args.metrics:
+        return args.func(ctx, args)
+    from src.instrumentation import get_metrics, span
 
-base_url = "http://export.arxiv.org/api/query?"
-category = "astro-ph.GA"
-sort_by = "submittedDate"
-sort_order = "ascending"
-start = 0
-max_results = 100
-search_query = f"search_query=cat:{category}+AND+submittedDate:[{start_date}+TO+{end_date}]"
-url = f"{base_url}{search_query}&sortBy={sort_by}&sortOrder={sort_order}&start={start}&max_results={max_results}"
-
-print(f"API Request URL for new astro-ph uploads: {url}")
-
-try:
-    response = requests.get(url)
-    response.raise_for_status()
-except requests.exceptions.RequestException as e:
-    print(f"An error occurred during the API request: {e}")
-    response = None
-
-arxiv_metadata = []
-if response:
     try:
-        arxiv_metadata = extract_arxiv_metadata(response.text)
-    except ET.ParseError as e:
-        print(f"Error parsing the arXiv API response: {e}")
-        arxiv_metadata = []
-
-# --- Embedding Generation and Paper Ranking ---
-paper_embeddings = {
-    paper['id']: embedding_model.encode(paper['abstract'])
-    for paper in arxiv_metadata if paper['abstract'] is not None and paper['id'] is not None
-}
-
-if arxiv_metadata and paper_embeddings:
-    research_interests_embedding = embedding_model.encode(research_interests)
-
-    ranked_papers = []
-    for paper in arxiv_metadata:
-        if paper['id'] in paper_embeddings:
-            similarity = cosine_similarity([research_interests_embedding], [paper_embeddings[paper['id']]])[0][0]
-            ranked_papers.append({'metadata': paper, 'similarity': similarity})
-
-    ranked_papers.sort(key=lambda item: item['similarity'], reverse=True)
-    top_relevant_papers = ranked_papers[:5]
-
-    llm_prompt_content = f"""Based on your research interests: "{research_interests}", please review the following arXiv paper metadata and identify the most relevant ones. The papers are pre-ranked based on the semantic similarity of their abstracts to your interests.
-
-    ArXiv Paper Metadata (Top Relevant):
-    """
-    arxiv_urls = []
-    for i, item in enumerate(top_relevant_papers):
-        paper = item['metadata']
-        arxiv_urls.append(paper['id'])
-        llm_prompt_content += f"""
-    --- Paper {i+1} (Similarity: {item['similarity']:.4f}) ---
-    Title: {paper['title']}
-    ArXiv ID: {paper['id']}
-    Authors: {', '.join([author['name'] for author in paper['authors']])}
-    Publish Date: {paper['published']}
-    Abstract: {paper['abstract']}
-    Categories: {', '.join(paper['categories'])}
-    """
-
-    llm_prompt_content += """
-
-    Based on the above metadata (ranked by abstract similarity), please identify the top 3 papers that would be of most interest, considering both the similarity score and the content of the abstract. For each of these top 3 papers, list the **Title**, **Similarity**, **ArXiv ID**, **Author List**, **ArXiv Publish Date**, **Abstract**, and a brief **Reasoning** explaining why it aligns with the research interests: "{research_interests}". Format your response in Markdown, with each piece of metadata on a new line.
-    """
-
-    prompt = llm_prompt_content
-    try:
-        chat_session = None
-        response_from_llm, chat_session = generate_content_with_history(prompt, client, chat_session=None)
-        print("\n--- LLM Response: Top Relevant Papers (Based on Embeddings and LLM Review) ---\n")
-        print(response_from_llm.text)
-    except Exception as e:
-        print(f"An error occurred while generating the LLM response: {e}")
-else:
-    print("No arXiv metadata or paper embeddings were successfully generated, so the LLM cannot identify papers of interest.")
-
-# --- Main Execution Block for PDF Download and Summarization (this is still inside the 'with' block) ---
-if __name__ == "__main__": # This inner if __name__ == "__main__": is redundant but harmless
-                            # if it was already there, you can leave it or remove it.
-                            # The outer 'with' block now ensures suppression.
-
-    all_summaries = ""
-    all_summaries_list = []
-
-    if arxiv_urls:
-        for i, arxiv_url in enumerate(arxiv_urls):
-            print(f"\n--- Processing Paper {i+1} ---")
-            print(f"arXiv URL: {arxiv_url}")
-
-            pdf_url = convert_abs_url_to_pdf_url(arxiv_url)
-            print(f"PDF URL: {pdf_url}")
-
-            pdf_path = download_pdf(pdf_url)
-
-            if pdf_path:
-                extracted_text = extract_text_from_pdf(pdf_path)
-
-                if extracted_text:
-                    summary = summarize_text_with_llm(extracted_text, client, chat_session)
-
-                if summary:
-                        all_summaries_list.append(f"**Paper {i+1}: {summary}\n")
-                else:
-                        all_summaries_list.append(f"Failed to generate summary for Paper {i+1}\n")
-
-                if pdf_path:
-                    os.remove(pdf_path)
-                    print(f"Deleted the downloaded PDF: {pdf_path}")
-
-            else:
-                all_summaries_list.append(f"Failed to download PDF for Paper {i+1}\n")
-
-        final_summary = "Good morning! Here's a quick look at some papers you might find relevant\n\n" + "\n".join(all_summaries_list)
+        with span(args.command):
+            return args.func(ctx, args)
+    finally:
+        get_metrics().to_json(args.metrics)
+        print(f"Metrics written to {args.metrics}")
 
-        print("\n--- All Paper Summaries ---")
-        print(final_summary)
 
-    else:
-        print("No arXiv URLs found for detailed summarization.")
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,8 +4,12 @@ import xml.etree.ElementTree as ET
 import requests # For the initial API request
 import urllib.parse # For convert_abs_url_to_pdf_url's os.path.basename
 import urllib.request 
-import os             
-import time           
+import os
+import re
+import time
+
+from src.instrumentation import count
+from src.rate_limit import TokenBucket
 
 def get_arxiv_dates():
     """
@@ -33,60 +37,188 @@ def get_arxiv_dates():
 
     return start_date_formatted, end_date_formatted
 
+ATOM_NAMESPACES = {
+    'atom': 'http://www.w3.org/2005/Atom',
+    'arxiv': 'http://arxiv.org/schemas/atom',
+    'opensearch': 'http://a9.com/-/spec/opensearch/1.1/',
+}
+
+def _parse_entry(entry, namespace=ATOM_NAMESPACES):
+    """Extracts the metadata dict for a single Atom <entry> element."""
+    metadata = {}
+    # Extract core Atom elements
+    title = entry.find('atom:title', namespace)
+    metadata['title'] = title.text.strip() if title is not None else None
+    id_element = entry.find('atom:id', namespace)
+    metadata['id'] = id_element.text.strip() if id_element is not None else None
+    published = entry.find('atom:published', namespace)
+    metadata['published'] = published.text.strip() if published is not None else None
+    updated = entry.find('atom:updated', namespace)
+    metadata['updated'] = updated.text.strip() if updated is not None else None
+    summary = entry.find('atom:summary', namespace)
+    metadata['abstract'] = summary.text.strip() if summary is not None else None
+
+    # Extract authors
+    authors = entry.findall('atom:author', namespace)
+    metadata['authors'] = []
+    for author in authors:
+        name = author.find('atom:name', namespace)
+        affiliation = author.find('arxiv:affiliation', namespace)
+        author_info = {'name': name.text.strip() if name is not None else None,
+                       'affiliation': affiliation.text.strip() if affiliation is not None else None}
+        metadata['authors'].append(author_info)
+
+    # Extract categories
+    categories = [cat.get('term') for cat in entry.findall('atom:category', namespace) if cat.get('scheme') == 'http://arxiv.org/schemas/atom']
+    metadata['categories'] = categories
+
+    # Extract primary category
+    primary_category = entry.find('arxiv:primary_category', namespace)
+    metadata['primary_category'] = primary_category.get('term') if primary_category is not None else None
+
+    # Extract links
+    links = entry.findall('atom:link', namespace)
+    metadata['links'] = []
+    for link in links:
+        metadata['links'].append({'href': link.get('href'), 'rel': link.get('rel'), 'title': link.get('title'), 'type': link.get('type')})
+
+    # Extract arXiv-specific elements
+    comment = entry.find('arxiv:comment', namespace)
+    metadata['comment'] = comment.text.strip() if comment is not None else None
+    journal_ref = entry.find('arxiv:journal_ref', namespace)
+    metadata['journal_ref'] = journal_ref.text.strip() if journal_ref is not None else None
+    doi = entry.find('arxiv:doi', namespace)
+    metadata['doi'] = doi.text.strip() if doi is not None else None
+    return metadata
+
 def extract_arxiv_metadata(xml_response):
     """Parses the arXiv API Atom feed and extracts all relevant metadata."""
     root = ET.fromstring(xml_response)
-    namespace = {'atom': 'http://www.w3.org/2005/Atom', 'arxiv': 'http://arxiv.org/schemas/atom'}
+    namespace = ATOM_NAMESPACES
     papers_metadata = []
     for entry in root.findall('atom:entry', namespace):
-        metadata = {}
-        # Extract core Atom elements
-        title = entry.find('atom:title', namespace)
-        metadata['title'] = title.text.strip() if title is not None else None
-        id_element = entry.find('atom:id', namespace)
-        metadata['id'] = id_element.text.strip() if id_element is not None else None
-        published = entry.find('atom:published', namespace)
-        metadata['published'] = published.text.strip() if published is not None else None
-        updated = entry.find('atom:updated', namespace)
-        metadata['updated'] = updated.text.strip() if updated is not None else None
-        summary = entry.find('atom:summary', namespace)
-        metadata['abstract'] = summary.text.strip() if summary is not None else None
-
-        # Extract authors
-        authors = entry.findall('atom:author', namespace)
-        metadata['authors'] = []
-        for author in authors:
-            name = author.find('atom:name', namespace)
-            affiliation = author.find('arxiv:affiliation', namespace)
-            author_info = {'name': name.text.strip() if name is not None else None,
-                           'affiliation': affiliation.text.strip() if affiliation is not None else None}
-            metadata['authors'].append(author_info)
-
-        # Extract categories
-        categories = [cat.get('term') for cat in entry.findall('atom:category', namespace) if cat.get('scheme') == 'http://arxiv.org/schemas/atom']
-        metadata['categories'] = categories
-
-        # Extract primary category
-        primary_category = entry.find('arxiv:primary_category', namespace)
-        metadata['primary_category'] = primary_category.get('term') if primary_category is not None else None
-
-        # Extract links
-        links = entry.findall('atom:link', namespace)
-        metadata['links'] = []
-        for link in links:
-            metadata['links'].append({'href': link.get('href'), 'rel': link.get('rel'), 'title': link.get('title'), 'type': link.get('type')})
-
-        # Extract arXiv-specific elements
-        comment = entry.find('arxiv:comment', namespace)
-        metadata['comment'] = comment.text.strip() if comment is not None else None
-        journal_ref = entry.find('arxiv:journal_ref', namespace)
-        metadata['journal_ref'] = journal_ref.text.strip() if journal_ref is not None else None
-        doi = entry.find('arxiv:doi', namespace)
-        metadata['doi'] = doi.text.strip() if doi is not None else None
-
-        papers_metadata.append(metadata)
+        papers_metadata.append(_parse_entry(entry, namespace))
     return papers_metadata
 
+# Both can point at a mirror or a local stub (see benchmarks/), e.g. for offline runs.
+ARXIV_API_URL = os.getenv("ARXIV_ASSISTANT_API_URL", "http://export.arxiv.org/api/query?")
+ARXIV_PDF_URL = os.getenv("ARXIV_ASSISTANT_PDF_URL", "http://export.arxiv.org/pdf/")
+
+def iter_arxiv_entries(xml_stream, feed_info=None):
+    """
+    Incrementally parses an arXiv Atom feed and yields each paper as its entry closes.
+
+    Parsed elements are cleared as soon as they are consumed, so memory stays flat
+    regardless of how many entries the stream holds.
+
+    Args:
+        xml_stream: A binary file-like object (e.g., a streamed HTTP response body) or a path.
+        feed_info (dict, optional): Filled in with 'total_results' from the OpenSearch header.
+
+    Yields:
+        dict: Paper metadata in the same format as `extract_arxiv_metadata`.
+    """
+    entry_tag = f"{{{ATOM_NAMESPACES['atom']}}}entry"
+    total_tag = f"{{{ATOM_NAMESPACES['opensearch']}}}totalResults"
+    root = None
+    depth = 0
+    for event, element in ET.iterparse(xml_stream, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            depth += 1
+            continue
+        depth -= 1
+        if element.tag == total_tag and feed_info is not None and element.text:
+            feed_info['total_results'] = int(element.text)
+        elif element.tag == entry_tag and depth == 1:
+            yield _parse_entry(element)
+            root.remove(element)
+
+def build_arxiv_query_url(category, start_date, end_date, start=0, max_results=100,
+                          sort_by="submittedDate", sort_order="ascending"):
+    """Builds an arXiv API query URL for one page of a category's submissions in a date window."""
+    search_query = f"search_query=cat:{category}+AND+submittedDate:[{start_date}+TO+{end_date}]"
+    return f"{ARXIV_API_URL}{search_query}&sortBy={sort_by}&sortOrder={sort_order}&start={start}&max_results={max_results}"
+
+def iter_arxiv_feed(category, start_date, end_date, session=None, page_size=200, delay=3, max_retries=3,
+                    max_results=None, feed_info=None):
+    """
+    Yields every paper in a category and date window, following `start`/`totalResults` across pages.
+
+    Each page is streamed and parsed incrementally, so callers can start embedding papers
+    before the last page has arrived. Requests go over one persistent session and are paced
+    at least `delay` seconds apart, as arXiv's API guidelines ask.
+
+    Args:
+        category (str): The arXiv category (e.g., 'astro-ph.GA').
+        start_date (str): The window start in YYYYMMDDHHMM format.
+        end_date (str): The window end in YYYYMMDDHHMM format.
+        session (requests.Session, optional): A session to reuse; one is created if omitted.
+        page_size (int): The number of results requested per page.
+        delay (float): The minimum number of seconds between requests.
+        max_retries (int): Attempts per page before giving up on the rest of the feed.
+        max_results (int, optional): Stops after this many papers.
+        feed_info (dict, optional): Filled with 'total_results' and 'complete', which is True only
+                                    once every result in the window has been yielded.
+
+    Yields:
+        dict: Paper metadata in the same format as `extract_arxiv_metadata`.
+    """
+    own_session = session is None
+    if own_session:
+        session = requests.Session()
+    limiter = TokenBucket(1 / delay) if delay else None
+    if feed_info is None:
+        feed_info = {}
+    feed_info['complete'] = False
+    start = 0
+    total_results = None
+    try:
+        while total_results is None or start < total_results:
+            if max_results is not None and start >= max_results:
+                return
+            page_limit = page_size if max_results is None else min(page_size, max_results - start)
+            url = build_arxiv_query_url(category, start_date, end_date, start, page_limit)
+            page_count = 0
+            for attempt in range(max_retries):
+                if limiter is not None:
+                    limiter.acquire()
+                page_info = {}
+                page_count = 0
+                count('arxiv.requests')
+                try:
+                    with session.get(url, stream=True, timeout=60) as response:
+                        response.raise_for_status()
+                        response.raw.decode_content = True
+                        for paper in iter_arxiv_entries(response.raw, page_info):
+                            page_count += 1
+                            count('arxiv.papers')
+                            yield paper
+                except (requests.exceptions.RequestException, ET.ParseError) as e:
+                    print(f"An error occurred while fetching {url} (Attempt {attempt + 1}/{max_retries}): {e}")
+                    if page_count:
+                        # Entries already yielded cannot be taken back; resume after them.
+                        break
+                    continue
+                total_results = page_info.get('total_results', total_results)
+                feed_info['total_results'] = total_results
+                # arXiv occasionally returns an empty page mid-result-set; retry those.
+                if page_count or total_results is None or start >= total_results:
+                    break
+                print(f"Empty page at start={start} of {total_results} (Attempt {attempt + 1}/{max_retries}), retrying...")
+            if page_count == 0:
+                if total_results is None or start < total_results:
+                    print(f"Giving up on the arXiv feed at start={start}.")
+                else:
+                    feed_info['complete'] = True
+                return
+            start += page_count
+        feed_info['complete'] = True
+    finally:
+        if own_session:
+            session.close()
+
 def convert_abs_url_to_pdf_url(abs_url):
     """
     Converts an arXiv abstract URL to its corresponding PDF URL using the export.arxiv.org format.
@@ -106,7 +238,7 @@ def convert_abs_url_to_pdf_url(abs_url):
             # Remove potential 'v' and the version number
             arxiv_id = arxiv_id_with_version.split('v')
             # Construct the PDF URL using the extracted arXiv ID
-            pdf_url = f"http://export.arxiv.org/pdf/{arxiv_id_with_version}.pdf"
+            pdf_url = f"{ARXIV_PDF_URL}{arxiv_id_with_version}.pdf"
             return pdf_url
     return None
 
@@ -114,10 +246,14 @@ def download_pdf(pdf_url, max_retries=3, wait_time=3):
     """
     Downloads a PDF from a given URL with retry logic respecting arXiv API limits.
 
+    Waits only after a failed attempt, doubling the wait each time. For downloading
+    many papers, prefer `src.download_utils.download_pdfs`, which streams into memory
+    over a pooled session under a shared rate limit.
+
     Args:
         pdf_url (str): The URL of the PDF to download.
         max_retries (int): The maximum number of times to retry the download.
-        wait_time (int): The time to wait (in seconds) between retries.
+        wait_time (int): The time to wait (in seconds) before the first retry.
 
     Returns:
         str or None: The path to the downloaded PDF if successful, otherwise None.
@@ -132,17 +268,30 @@ def download_pdf(pdf_url, max_retries=3, wait_time=3):
         except urllib.error.URLError as e:
             print(f"Download failed (Attempt {attempt + 1}/{max_retries}): {e}")
             if attempt < max_retries - 1:
-                print(f"Waiting for {wait_time} seconds before retrying...")
-                time.sleep(wait_time)
+                delay = wait_time * (2 ** attempt)
+                print(f"Waiting for {delay} seconds before retrying...")
+                time.sleep(delay)
             else:
                 print("Max retries reached. Download failed.")
                 return None
         except Exception as e:
             print(f"An unexpected error occurred during download (Attempt {attempt + 1}/{max_retries}): {e}")
             return None
-        finally:
-            # Respect arXiv API rate limit by waiting after each attempt
-            if attempt < max_retries - 1:
-                time.sleep(wait_time)
-            elif attempt == max_retries -1 and attempt > 0:
-                time.sleep(wait_time) # Wait after the last attempt as well, if retries occurred
+
+def parse_arxiv_id(arxiv_url):
+    """
+    Splits an arXiv abstract URL or identifier into its base ID and version number.
+
+    Args:
+        arxiv_url (str): An arXiv URL or ID (e.g., 'http://arxiv.org/abs/2504.06802v1',
+                         '2504.06802v1' or 'astro-ph/0601001v2').
+
+    Returns:
+        tuple: (arxiv_id, version), e.g. ('2504.06802', 1). The version is None
+               if the input does not carry one.
+    """
+    arxiv_id = arxiv_url.strip().split("arxiv.org/abs/")[-1]
+    match = re.match(r"^(.+?)v(\d+)$", arxiv_id)
+    if match:
+        return match.group(1), int(match.group(2))
+    return arxiv_id, None
@@ -0,0 +1,312 @@
+"""
+Batch digests for many users across many categories in a single run.
+
+Each category's feed is requested once, papers cross-listed in several categories are
+deduplicated by arXiv ID and embedded once, every user is scored in one matrix multiply,
+and each selected paper is downloaded and summarized once before the summaries are fanned
+back out to the per-user digests.
+
+The config is a JSON file:
+
+    {
+      "name": "department",
+      "users": [
+        {"name": "ashley", "categories": ["astro-ph.GA", "astro-ph.CO"],
+         "interests": ["dense molecular gas in nearby galaxies"], "top_k": 5},
+        {"name": "sam", "categories": ["astro-ph.GA"], "interests": "galaxy quenching",
+         "boost_terms": ["JWST"], "exclude_terms": ["dark matter"]}
+      ],
+      "review": true,
+      "prefilter": 200
+    }
+
+With "prefilter", each user's papers are first narrowed to that many BM25 candidates per
+interest (using their optional boost and exclusion keywords) and only candidates are embedded.
+"""
+import contextlib
+import json
+
+import numpy as np
+
+from src.instrumentation import span
+from src.pipeline import format_digest, format_summary_entries, save_digest, user_digest_name, window_day
+
+
+def load_batch_config(path):
+    """
+    Reads and validates a batch config file.
+
+    Returns:
+        dict: The config, as returned by `parse_batch_config`.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return parse_batch_config(json.load(f), path)
+
+
+def parse_batch_config(config, source='the batch config'):
+    """
+    Validates a batch config already parsed from JSON (e.g., the body of a service request).
+
+    Args:
+        config (dict): The raw config, in the format of a batch config file.
+        source (str): Where the config came from, for error messages.
+
+    Returns:
+        dict: {'name': str, 'users': [{'name', 'categories', 'interests', 'top_k', 'boost_terms',
+              'exclude_terms'}, ...], 'review': bool, 'prefilter': int or None}, with 'interests'
+              always a list. The config name keys resumable runs.
+    """
+    if not isinstance(config, dict):
+        raise ValueError(f"{source} is not a JSON object.")
+    users, names = [], set()
+    for i, user in enumerate(config.get('users') or []):
+        name = user.get('name')
+        if not name:
+            raise ValueError(f"User {i + 1} in {source} has no 'name'.")
+        if name in names:
+            raise ValueError(f"User name '{name}' appears more than once in {source}.")
+        names.add(name)
+        categories = user.get('categories') or []
+        interests = user.get('interests') or []
+        if isinstance(categories, str):
+            categories = [categories]
+        if isinstance(interests, str):
+            interests = [interests]
+        if not categories or not interests:
+            raise ValueError(f"User '{name}' in {source} needs at least one category and one interest.")
+        users.append({'name': name, 'categories': list(categories), 'interests': list(interests),
+                      'top_k': int(user.get('top_k', config.get('top_k', 5))),
+                      'boost_terms': user.get('boost_terms'), 'exclude_terms': user.get('exclude_terms')})
+    if not users:
+        raise ValueError(f"No users defined in {source}.")
+    prefilter = config.get('prefilter')
+    return {'name': str(config.get('name', 'default')), 'users': users, 'review': bool(config.get('review', True)),
+            'prefilter': int(prefilter) if prefilter else None}
+
+
+def _iter_unique_papers(categories, start_date, end_date, paper_index, category_members, is_known=None,
+                        feed_infos=None, delay=3):
+    """
+    Streams each category's feed once and yields each paper the first time its arXiv ID is seen.
+
+    `paper_index` (base arXiv ID -> position) and `category_members` (category -> positions)
+    are filled in as papers arrive, so cross-listed papers are recorded under every category
+    that lists them. Papers for which `is_known(paper_id, category)` is true are left out of that
+    category only, so a cross-listed paper that is new to another category still reaches it.
+    """
+    from src.arxiv_utils import iter_arxiv_feed, parse_arxiv_id
+
+    for category in categories:
+        members = category_members.setdefault(category, set())
+        feed_info = feed_infos.setdefault(category, {}) if feed_infos is not None else None
+        for paper in iter_arxiv_feed(category, start_date, end_date, delay=delay, feed_info=feed_info):
+            if paper.get('id') is None or paper.get('abstract') is None:
+                continue
+            if is_known is not None and is_known(paper['id'], category):
+                continue
+            arxiv_id = parse_arxiv_id(paper['id'])[0]
+            position = paper_index.get(arxiv_id)
+            if position is None:
+                position = paper_index[arxiv_id] = len(paper_index)
+                members.add(position)
+                yield paper
+            else:
+                members.add(position)
+
+
+def fetch_categories(ctx, categories, start_date, end_date, run=None, feed_infos=None, embed=True):
+    """
+    Fetches several categories, embedding each distinct paper once (or, with `embed` False,
+    only indexing it lexically so that just the prefiltered candidates are embedded later).
+
+    Args:
+        run (dict, optional): A run from `ctx.state`. Papers that earlier runs of the same name
+                              ingested from a category are skipped for that category, and new
+                              ones are recorded.
+        feed_infos (dict, optional): Filled with each category's `iter_arxiv_feed` feed_info.
+
+    Returns:
+        tuple: (papers, embeddings, category_members), where `category_members` maps each
+               category to the set of positions of the papers its feed listed.
+    """
+    from src.paper_store import save_daily_snapshot
+    from src.ranking_utils import encode_paper_stream
+
+    is_known = None
+    if run is not None:
+        is_known = lambda paper_id, category: ctx.state.is_known(paper_id, run, category)
+    paper_index, category_members = {}, {}
+    feed = _iter_unique_papers(categories, start_date, end_date, paper_index, category_members, is_known, feed_infos,
+                               delay=ctx.limits['arxiv_api_delay'])
+    with span('fetch'):
+        if embed:
+            papers, embeddings = encode_paper_stream(feed, ctx.embedding_model, cache=ctx.embedding_cache)
+        else:
+            papers, embeddings = list(feed), None
+    print(f"Fetched {len(papers)} distinct papers from {len(categories)} categories.")
+    if run is not None:
+        ctx.state.record_papers(papers, 'embedded' if embed else 'fetched', run['run_id'])
+        for category, members in category_members.items():
+            ctx.state.record_ingested(run, category, [papers[position]['id'] for position in members])
+    if papers:
+        with ctx.index_lock:
+            if embed:
+                ctx.corpus_index.add([paper['id'] for paper in papers], embeddings)
+                ctx.corpus_index.save()
+            if ctx.lexical_index.add(papers):
+                ctx.lexical_index.save()
+        for category, members in category_members.items():
+            if members:
+                save_daily_snapshot([papers[position] for position in sorted(members)], ctx.snapshot_dir(),
+                                    window_day(end_date), name=category, merge=True)
+    return papers, embeddings, category_members
+
+
+def score_users(users, papers, embeddings, category_members, embedding_model, lexical_index=None, candidates=200,
+                cache=None, index_lock=None):
+    """
+    Ranks papers for every user at once.
+
+    All users' interest profiles are embedded together and scored against the papers with
+    one matrix multiply. A user's score for a paper is the best score over their profiles,
+    and only papers listed in the user's categories are eligible.
+
+    If `embeddings` is None, each user's eligible papers are first narrowed to the top
+    `candidates` BM25 matches per interest in `lexical_index`, honouring the user's
+    'boost_terms' and 'exclude_terms', and only the union of all users' candidates is embedded.
+    The lexical index is only used while holding `index_lock`, if one is given.
+
+    Returns:
+        dict: user name -> list of {'metadata', 'similarity'} dicts, best first.
+    """
+    from src.ranking_utils import encode_papers, encode_texts, top_k_indices
+
+    if not papers:
+        return {user['name']: [] for user in users}
+
+    category_masks = {}
+    for category, members in category_members.items():
+        mask = np.zeros(len(papers), dtype=bool)
+        mask[list(members)] = True
+        category_masks[category] = mask
+    eligible = {}
+    for user in users:
+        mask = np.zeros(len(papers), dtype=bool)
+        for category in user['categories']:
+            mask |= category_masks.get(category, False)
+        eligible[user['name']] = mask
+
+    if embeddings is None:
+        positions = {paper['id']: position for position, paper in enumerate(papers)}
+        with index_lock or contextlib.nullcontext():
+            lexical_index.add(papers)
+            for user in users:
+                keys = [papers[j]['id'] for j in np.flatnonzero(eligible[user['name']])]
+                mask = np.zeros(len(papers), dtype=bool)
+                for interest in user['interests']:
+                    matches = lexical_index.search(interest, candidates, user.get('boost_terms'),
+                                                   user.get('exclude_terms'), keys)
+                    mask[[positions[key] for key, _ in matches]] = True
+                eligible[user['name']] = mask
+        scored = np.flatnonzero(np.logical_or.reduce(list(eligible.values())))
+        print(f"Embedding {len(scored)} lexical candidates out of {len(papers)} papers.")
+        if not len(scored):
+            return {user['name']: [] for user in users}
+        embeddings = encode_papers([papers[j] for j in scored], embedding_model, cache=cache)
+    else:
+        scored = np.arange(len(papers))
+
+    profiles = list(dict.fromkeys(interest for user in users for interest in user['interests']))
+    profile_rows = {interest: row for row, interest in enumerate(profiles)}
+    with span('rank'):
+        scores = encode_texts(embedding_model, profiles) @ embeddings.T
+
+    rankings = {}
+    for user in users:
+        user_scores = scores[[profile_rows[interest] for interest in user['interests']]].max(axis=0)
+        user_eligible = eligible[user['name']][scored]
+        user_scores = np.where(user_eligible, user_scores, -np.inf)
+        top = top_k_indices(user_scores[np.newaxis, :], min(user['top_k'], int(user_eligible.sum())))[0]
+        rankings[user['name']] = [{'metadata': papers[scored[j]], 'similarity': float(user_scores[j])} for j in top]
+    return rankings
+
+
+def run_batch(ctx, config, token_budget=6000):
+    """
+    Runs the digest pipeline for every user in a batch config.
+
+    Like `run_digest`, the run covers submissions since this config's last run and resumes
+    from its last completed step if an earlier run with the same config name stopped partway.
+
+    Args:
+        ctx (PipelineContext): Shared models, clients and caches.
+        config (dict): A config as returned by `load_batch_config`.
+        token_budget (int): The per-paper context budget for summaries.
+
+    Returns:
+        dict: user name -> path of the saved digest.
+    """
+    from src.pipeline import incremental_window, load_run_papers, review_top_papers, summarize_paper_urls
+
+    users = config['users']
+    prefilter = config.get('prefilter')
+    categories = list(dict.fromkeys(category for user in users for category in user['categories']))
+    state = ctx.state
+    run = incremental_window(ctx, categories, f"batch:{config['name']}")
+    if run is None:
+        return {}
+    start_date, end_date = run['start_date'], run['end_date']
+    print(f"Batch run for {len(users)} users over {', '.join(categories)} ({start_date}-{end_date})")
+
+    if run['status'] == 'started':
+        feed_infos = {}
+        papers, embeddings, category_members = fetch_categories(ctx, categories, start_date, end_date, run, feed_infos,
+                                                                embed=not prefilter)
+        state.update_run(run, 'fetched', papers=[paper['id'] for paper in papers],
+                         categories={category: sorted(members) for category, members in category_members.items()})
+        for category in categories:
+            if feed_infos.get(category, {}).get('complete'):
+                state.set_watermark(run['name'], category, end_date)
+    else:
+        papers, embeddings = load_run_papers(ctx, run, embed=not prefilter)
+        positions = {paper['id']: position for position, paper in enumerate(papers)}
+        category_members = {
+            category: {positions[run['papers'][member]] for member in members if run['papers'][member] in positions}
+            for category, members in run['categories'].items()
+        }
+
+    if run['status'] == 'fetched':
+        rankings = score_users(users, papers, embeddings, category_members, ctx.embedding_model,
+                               ctx.lexical_index if prefilter else None, prefilter, ctx.embedding_cache, ctx.index_lock)
+        state.update_run(run, 'ranked', rankings={
+            name: [[item['metadata']['id'], item['similarity']] for item in ranked] for name, ranked in rankings.items()})
+    else:
+        by_id = {paper['id']: paper for paper in papers}
+        rankings = {name: [{'metadata': by_id[paper_id], 'similarity': similarity}
+                           for paper_id, similarity in ranked if paper_id in by_id]
+                    for name, ranked in run['rankings'].items()}
+        rankings = {user['name']: rankings.get(user['name'], []) for user in users}
+
+    if config.get('review', True):
+        for user in users:
+            if rankings[user['name']]:
+                review = review_top_papers(ctx, rankings[user['name']], "; ".join(user['interests']))
+                if review:
+                    print(f"\n--- LLM Review for {user['name']} ---\n")
+                    print(review)
+
+    # Each paper is downloaded and summarized once, however many users it was picked for.
+    selected = list(dict.fromkeys(item['metadata']['id'] for ranked in rankings.values() for item in ranked))
+    print(f"Summarizing {len(selected)} distinct papers selected for {len(users)} users.")
+    results = dict(zip(selected, summarize_paper_urls(ctx, selected, token_budget, state=state)))
+
+    day = window_day(end_date)
+    paths = {}
+    for user in users:
+        user_results = [results[item['metadata']['id']] for item in rankings[user['name']]]
+        digest = format_digest(format_summary_entries(user_results))
+        paths[user['name']] = save_digest(ctx, day, user_digest_name(user['name']), digest)
+    state.update_run(run, 'done')
+    if selected:
+        print(f"LLM response cache: {ctx.llm_cache.stats()}")
+    return paths
@@ -0,0 +1,389 @@
+"""
+Bulk import of arXiv metadata from offline dumps into sharded, incrementally loadable files.
+
+Two sources are supported:
+
+* The published arXiv metadata snapshot (one JSON object per line, several GB). The file is
+  split into byte ranges aligned to line boundaries and parsed by a pool of processes.
+* OAI-PMH harvests (XML files in the `arXiv` or `arXivRaw` metadata formats), one file per task,
+  parsed incrementally.
+
+Records are normalized to the dict format produced by `extract_arxiv_metadata`, optionally
+filtered by category and submission date, and written by the workers as PaperBatch shards
+of at most `shard_size` papers, so memory stays bounded by workers x shard size. The parent
+embeds each shard in large batches as soon as it is written, while the workers keep parsing.
+
+Output layout:
+
+    out_dir/manifest.json         completed tasks and shards, updated atomically after each shard
+    out_dir/<task>-<part>.npz     PaperBatch shard
+    out_dir/<task>-<part>.emb.npy float16 embeddings, one row per paper in the shard
+
+Re-running an interrupted import skips the tasks already recorded in the manifest.
+"""
+import email.utils
+import gzip
+import json
+import os
+import re
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from src.paper_store import PaperBatch
+
+OAI_NAMESPACE = 'http://www.openarchives.org/OAI/2.0/'
+ARXIV_OAI_NAMESPACE = 'http://arxiv.org/OAI/arXiv/'
+ARXIV_RAW_OAI_NAMESPACE = 'http://arxiv.org/OAI/arXivRaw/'
+MANIFEST_NAME = 'manifest.json'
+
+
+def _iso_timestamp(value):
+    """Converts an RFC 2822 date ('Mon, 2 Apr 2007 19:18:42 GMT') or a YYYY-MM-DD date to the API's ISO format."""
+    if not value:
+        return None
+    value = value.strip()
+    if re.match(r'^\d{4}-\d{2}-\d{2}$', value):
+        return f"{value}T00:00:00Z"
+    try:
+        return email.utils.parsedate_to_datetime(value).strftime('%Y-%m-%dT%H:%M:%SZ')
+    except (TypeError, ValueError):
+        return None
+
+
+def _clean(value):
+    return value.strip() if isinstance(value, str) and value.strip() else None
+
+
+def _arxiv_links(arxiv_id_with_version):
+    return [
+        {'href': f"http://arxiv.org/abs/{arxiv_id_with_version}", 'rel': 'alternate', 'title': None, 'type': 'text/html'},
+        {'href': f"http://arxiv.org/pdf/{arxiv_id_with_version}", 'rel': 'related', 'title': 'pdf', 'type': 'application/pdf'},
+    ]
+
+
+def _make_paper(arxiv_id, version, title, abstract, published, updated, authors, categories, comment, journal_ref, doi):
+    id_with_version = f"{arxiv_id}{version or ''}"
+    categories = (categories or '').split()
+    return {
+        'title': _clean(title),
+        'id': f"http://arxiv.org/abs/{id_with_version}",
+        'published': published,
+        'updated': updated or published,
+        'abstract': _clean(abstract),
+        'authors': authors,
+        'categories': categories,
+        'primary_category': categories[0] if categories else None,
+        'links': _arxiv_links(id_with_version),
+        'comment': _clean(comment),
+        'journal_ref': _clean(journal_ref),
+        'doi': _clean(doi),
+    }
+
+
+def _split_author_string(authors):
+    names = re.split(r',\s*|\s+and\s+', re.sub(r'\s+', ' ', authors or ''))
+    return [{'name': name.strip(), 'affiliation': None} for name in names if name.strip()]
+
+
+def normalize_snapshot_record(record):
+    """
+    Converts one record of the arXiv metadata snapshot (JSON lines) to `extract_arxiv_metadata` format.
+
+    The ID carries the latest version, as the API's does; 'published' is the v1 date and
+    'updated' the latest version's date.
+    """
+    versions = record.get('versions') or []
+    version = versions[-1].get('version') if versions else None
+    published = _iso_timestamp(versions[0].get('created')) if versions else None
+    updated = _iso_timestamp(versions[-1].get('created')) if versions else None
+    if published is None:
+        published = _iso_timestamp(record.get('update_date'))
+    if record.get('authors_parsed'):
+        authors = [{'name': " ".join(part for part in (parts[1], parts[0], parts[2] if len(parts) > 2 else '') if part),
+                    'affiliation': None} for parts in record['authors_parsed']]
+    else:
+        authors = _split_author_string(record.get('authors'))
+    return _make_paper(record.get('id'), version, record.get('title'), record.get('abstract'), published, updated,
+                       authors, record.get('categories'), record.get('comments'), record.get('journal-ref'),
+                       record.get('doi'))
+
+
+def normalize_oai_record(metadata):
+    """
+    Converts the metadata element of an OAI-PMH record in the `arXiv` or `arXivRaw` format.
+
+    Returns:
+        dict or None: The paper, or None if the element is in neither format. Papers from the
+                      `arXiv` format carry no version in their ID, since that format has none.
+    """
+    if metadata.tag == f"{{{ARXIV_RAW_OAI_NAMESPACE}}}arXivRaw":
+        ns = {'a': ARXIV_RAW_OAI_NAMESPACE}
+        versions = metadata.findall('a:version', ns)
+        version = versions[-1].get('version') if versions else None
+        published = _iso_timestamp(versions[0].findtext('a:date', namespaces=ns)) if versions else None
+        updated = _iso_timestamp(versions[-1].findtext('a:date', namespaces=ns)) if versions else None
+        authors = _split_author_string(metadata.findtext('a:authors', namespaces=ns))
+    elif metadata.tag == f"{{{ARXIV_OAI_NAMESPACE}}}arXiv":
+        ns = {'a': ARXIV_OAI_NAMESPACE}
+        version = None
+        published = _iso_timestamp(metadata.findtext('a:created', namespaces=ns))
+        updated = _iso_timestamp(metadata.findtext('a:updated', namespaces=ns))
+        authors = []
+        for author in metadata.findall('a:authors/a:author', ns):
+            parts = [author.findtext(f'a:{field}', default='', namespaces=ns).strip()
+                     for field in ('forenames', 'keyname', 'suffix')]
+            authors.append({'name': " ".join(part for part in parts if part),
+                            'affiliation': _clean(author.findtext('a:affiliation', namespaces=ns))})
+    else:
+        return None
+    find = lambda field: metadata.findtext(f'a:{field}', namespaces=ns)
+    return _make_paper(_clean(find('id')), version, find('title'), find('abstract'), published, updated, authors,
+                       find('categories'), find('comments'), find('journal-ref'), find('doi'))
+
+
+def _parse_lines(lines, path):
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            print(f"Skipping a malformed line in {path}: {e}")
+
+
+def _lines_in_range(f, start, end):
+    if start > 0:
+        # Finish the line that straddles `start`; it belongs to the previous range.
+        f.seek(start - 1)
+        f.readline()
+    while end is None or f.tell() < end:
+        line = f.readline()
+        if not line:
+            break
+        yield line
+
+
+def iter_snapshot_range(path, start=0, end=None):
+    """
+    Yields the parsed JSON records of the lines that start within [start, end) bytes of a JSON-lines file.
+
+    Gzipped files are read whole (they cannot be split by byte offset).
+    """
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            yield from _parse_lines(f, path)
+        return
+    with open(path, 'rb') as f:
+        yield from _parse_lines(_lines_in_range(f, start, end), path)
+
+
+def iter_oai_records(path):
+    """Streams the metadata elements of the live (non-deleted) records in an OAI-PMH XML file."""
+    record_tag = f"{{{OAI_NAMESPACE}}}record"
+    header_tag = f"{{{OAI_NAMESPACE}}}header"
+    metadata_tag = f"{{{OAI_NAMESPACE}}}metadata"
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        ancestors = []
+        for event, element in ET.iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                ancestors.append(element)
+                continue
+            ancestors.pop()
+            if element.tag != record_tag:
+                continue
+            header = element.find(header_tag)
+            metadata = element.find(metadata_tag)
+            if metadata is not None and len(metadata) and (header is None or header.get('status') != 'deleted'):
+                yield metadata[0]
+            # Drop the finished record from its parent so memory stays flat.
+            if ancestors:
+                ancestors[-1].remove(element)
+
+
+def _keep(paper, categories=None, since=None, until=None):
+    if not paper['id'] or not paper['abstract']:
+        return False
+    if categories and not any(category == wanted or category.startswith(wanted + '.')
+                              for category in paper['categories'] for wanted in categories):
+        return False
+    published = (paper['published'] or '')[:10]
+    return not ((since and published < since) or (until and published > until))
+
+
+def _import_task(task):
+    """Parses one task's records, writes them as shards, and returns (task name, [(shard, count)], records seen)."""
+    name, kind, path, start, end, out_dir, filters, shard_size = task
+    if kind == 'jsonl':
+        papers = (normalize_snapshot_record(record) for record in iter_snapshot_range(path, start, end))
+    else:
+        papers = (normalize_oai_record(metadata) for metadata in iter_oai_records(path))
+
+    shards, buffer, seen = [], [], 0
+
+    def flush():
+        shard = f"{name}-{len(shards):03d}.npz"
+        PaperBatch.from_dicts(buffer).save(os.path.join(out_dir, shard))
+        shards.append((shard, len(buffer)))
+        buffer.clear()
+
+    for paper in papers:
+        seen += 1
+        if paper is not None and _keep(paper, **filters):
+            buffer.append(paper)
+            if len(buffer) >= shard_size:
+                flush()
+    if buffer:
+        flush()
+    return name, shards, seen
+
+
+def plan_tasks(sources, out_dir, chunk_bytes=64 * 1024 * 1024, shard_size=50000, filters=None):
+    """
+    Splits the sources into independent parsing tasks.
+
+    JSON-lines files (.json, .jsonl, optionally .gz) are split into `chunk_bytes` ranges;
+    XML files (OAI-PMH) are one task each.
+    """
+    tasks = []
+    for source_index, path in enumerate(sources):
+        is_xml = path.endswith('.xml') or path.endswith('.xml.gz')
+        if is_xml or path.endswith('.gz'):
+            tasks.append((f"s{source_index:03d}-c00000", 'oai' if is_xml else 'jsonl', path, 0, None, out_dir,
+                          filters or {}, shard_size))
+            continue
+        size = os.path.getsize(path)
+        for chunk, start in enumerate(range(0, max(size, 1), chunk_bytes)):
+            tasks.append((f"s{source_index:03d}-c{chunk:05d}", 'jsonl', path, start, min(start + chunk_bytes, size),
+                          out_dir, filters or {}, shard_size))
+    return tasks
+
+
+def _read_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def _embed_shard(out_dir, shard, embedding_model, batch_size):
+    from src.ranking_utils import encode_texts
+
+    batch = PaperBatch.load(os.path.join(out_dir, shard))
+    embeddings = encode_texts(embedding_model, batch.columns['abstract'].to_list(), batch_size)
+    path = os.path.join(out_dir, shard[:-len('.npz')] + '.emb.npy')
+    tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, embeddings.astype(np.float16))
+    os.replace(tmp_path, path)
+
+
+def import_metadata(sources, out_dir, embedding_model=None, categories=None, since=None, until=None, max_workers=None,
+                    chunk_bytes=64 * 1024 * 1024, shard_size=50000, batch_size=256, model_name=None):
+    """
+    Imports arXiv metadata dumps into sharded PaperBatch files with matching embeddings.
+
+    Args:
+        sources (list of str): Snapshot (.json/.jsonl[.gz]) and OAI-PMH (.xml[.gz]) files.
+        out_dir (str): The output directory.
+        embedding_model (optional): A SentenceTransformer; without one, only metadata is written.
+        categories (list of str, optional): Keeps papers in these categories or their subcategories
+                                            (e.g. 'astro-ph' matches 'astro-ph.GA').
+        since (str, optional): Keeps papers first submitted on or after this YYYY-MM-DD date.
+        until (str, optional): Keeps papers first submitted on or before this YYYY-MM-DD date.
+        max_workers (int, optional): Parsing processes. Defaults to the CPU count.
+        chunk_bytes (int): The size of each JSON-lines parsing task.
+        shard_size (int): The maximum number of papers per shard.
+        batch_size (int): The embedding batch size.
+        model_name (str, optional): Recorded in the manifest so embeddings from another model are not mixed in.
+
+    Returns:
+        dict: The manifest, with 'tasks' (name -> shards) and 'papers' (the total imported).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    filters = {'categories': list(categories) if categories else None, 'since': since, 'until': until}
+    settings = {'sources': [os.path.abspath(path) for path in sources], 'filters': filters,
+                'chunk_bytes': chunk_bytes, 'shard_size': shard_size, 'model': model_name}
+    manifest = _read_manifest(out_dir)
+    if manifest is None or manifest.get('settings') != settings:
+        if manifest is not None:
+            print(f"Import settings changed; starting {out_dir} over.")
+        manifest = {'settings': settings, 'tasks': {}, 'papers': 0}
+
+    tasks = [task for task in plan_tasks(sources, out_dir, chunk_bytes, shard_size, filters)
+             if task[0] not in manifest['tasks']]
+    print(f"Importing {len(tasks)} chunks ({len(manifest['tasks'])} already done) into {out_dir}...")
+    seen = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_import_task, task) for task in tasks]
+        for future in as_completed(futures):
+            name, shards, task_seen = future.result()
+            # Embedding in the parent overlaps with the workers parsing the next chunks.
+            if embedding_model is not None:
+                for shard, _ in shards:
+                    _embed_shard(out_dir, shard, embedding_model, batch_size)
+            seen += task_seen
+            manifest['tasks'][name] = {'shards': [shard for shard, _ in shards], 'counts': [count for _, count in shards],
+                                       'embedded': embedding_model is not None}
+            manifest['papers'] += sum(count for _, count in shards)
+            _write_manifest(out_dir, manifest)
+            print(f"  {name}: kept {sum(count for _, count in shards)} of {task_seen} records "
+                  f"({len(manifest['tasks'])} chunks, {manifest['papers']} papers so far)")
+    print(f"Imported {manifest['papers']} papers from {seen} new records.")
+    return manifest
+
+
+def iter_shards(out_dir, with_embeddings=True):
+    """
+    Yields (PaperBatch, embeddings) per shard of an import, one shard in memory at a time.
+
+    Embeddings are returned as float32 (or None if the shard was not embedded).
+    """
+    manifest = _read_manifest(out_dir)
+    if manifest is None:
+        return
+    for name in sorted(manifest['tasks']):
+        for shard in manifest['tasks'][name]['shards']:
+            batch = PaperBatch.load(os.path.join(out_dir, shard))
+            embeddings = None
+            emb_path = os.path.join(out_dir, shard[:-len('.npz')] + '.emb.npy')
+            if with_embeddings and os.path.exists(emb_path):
+                embeddings = np.load(emb_path).astype(np.float32)
+            yield batch, embeddings
+
+
+def index_shards(out_dir, corpus_index=None, lexical_index=None):
+    """
+    Adds an import's papers to the long-lived corpus (dense) and lexical indexes.
+
+    Both indexes skip papers they already hold, so this can be re-run after importing more shards.
+
+    Returns:
+        int: The number of papers processed.
+    """
+    total = 0
+    for batch, embeddings in iter_shards(out_dir, with_embeddings=corpus_index is not None):
+        ids = batch.columns['id'].to_list()
+        if corpus_index is not None and embeddings is not None:
+            corpus_index.add(ids, embeddings)
+        if lexical_index is not None:
+            lexical_index.add({'id': paper_id, 'title': title, 'abstract': abstract, 'comment': comment}
+                              for paper_id, title, abstract, comment in zip(
+                                  ids, batch.columns['title'].to_list(), batch.columns['abstract'].to_list(),
+                                  batch.columns['comment'].to_list()))
+        total += len(ids)
+    if corpus_index is not None:
+        corpus_index.save()
+    if lexical_index is not None:
+        lexical_index.save()
+    return total
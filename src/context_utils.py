@@ -0,0 +1,261 @@
+import re
+
+import numpy as np
+
+from src.ranking_utils import encode_texts
+
+# Canonical section names and the heading words that map to them.
+SECTION_KEYWORDS = {
+    'abstract': ('abstract',),
+    'introduction': ('introduction', 'background', 'motivation'),
+    'data': ('data', 'observations', 'observation', 'sample', 'sample selection', 'simulations',
+             'data reduction', 'the data', 'the sample', 'dataset', 'datasets'),
+    'methods': ('methods', 'method', 'methodology', 'analysis', 'modelling', 'modeling', 'model',
+                'models', 'approach', 'techniques', 'data analysis'),
+    'results': ('results', 'findings', 'results and discussion'),
+    'discussion': ('discussion', 'implications'),
+    'conclusions': ('conclusions', 'conclusion', 'summary', 'summary and conclusions',
+                    'conclusions and future work', 'discussion and conclusions', 'concluding remarks'),
+    'acknowledgements': ('acknowledgements', 'acknowledgments', 'acknowledgement', 'acknowledgment'),
+    'references': ('references', 'bibliography'),
+    'appendix': ('appendix', 'appendices', 'supplementary material'),
+}
+
+# Relative value of each section for a Data / Methodology / Key Findings summary.
+# Sections weighted 0 are dropped outright.
+SECTION_WEIGHTS = {
+    'front': 1.0,
+    'abstract': 1.0,
+    'introduction': 0.6,
+    'data': 1.0,
+    'methods': 1.0,
+    'results': 1.0,
+    'discussion': 0.8,
+    'conclusions': 1.0,
+    'other': 0.7,
+    'appendix': 0.0,
+    'acknowledgements': 0.0,
+    'references': 0.0,
+}
+
+# The summary headings the selected context has to support.
+SUMMARY_QUERIES = (
+    "Data Used: the observations, telescopes, surveys, samples or simulations the study relies on.",
+    "Methodology: the methods, models, analysis techniques and procedures used in the study.",
+    "Key Findings: the main results, measurements and conclusions of the study.",
+)
+
+# Heading words that are also everyday words. A line holding only one of them may be the tail of
+# a wrapped sentence or a figure label, so it counts as a heading only when numbered or in capitals.
+AMBIGUOUS_HEADINGS = {
+    'data', 'observation', 'observations', 'sample', 'simulations', 'dataset', 'datasets', 'method', 'methods',
+    'analysis', 'modelling', 'modeling', 'model', 'models', 'approach', 'techniques', 'findings', 'implications',
+    'background', 'motivation', 'summary',
+}
+MAX_HEADING_WORDS = 8
+
+_KEYWORD_TO_SECTION = {keyword: section for section, keywords in SECTION_KEYWORDS.items() for keyword in keywords}
+_HEADING_PATTERN = re.compile(
+    r'^\s*(?P<number>(?:\d+(?:\.\d+)*|[IVXLC]+|[A-Z])[.)]?\s+)?(?P<title>[A-Za-z][A-Za-z &-]{2,60}?)\s*:?\s*$'
+)
+# "Appendix", "APPENDIX B", "Appendix A: Derivation of the likelihood". The optional title allows
+# no sentence punctuation, so a body sentence starting with "Appendix A shows ..." does not match.
+_APPENDIX_PATTERN = re.compile(
+    r'^\s*(?:APPENDIX|Appendix)(?:\s+[A-Z0-9]{1,3})?\s*[:.]?(?:\s+(?P<title>[A-Za-z][A-Za-z0-9 &()-]{0,60}?))?\s*$'
+)
+_BOILERPLATE_PATTERNS = [
+    re.compile(r'^\s*arXiv:\S+\s+\[[^\]]+\]', re.IGNORECASE),  # arXiv margin stamp
+    re.compile(r'^\s*\S+@\S+\.\S+\s*$'),  # bare e-mail lines
+    re.compile(r'^\s*(?:page\s*)?\d{1,4}\s*(?:of\s*\d+)?\s*$', re.IGNORECASE),  # page numbers
+    re.compile(r'^\s*(?:Received|Accepted|Published)\b.*\d{4}', re.IGNORECASE),
+    re.compile(r'^\s*(?:©|\(c\)|Copyright)', re.IGNORECASE),
+]
+
+_heading_embedding_cache = {}
+
+
+def estimate_tokens(text):
+    """A cheap token estimate (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def _is_heading_shaped(title, numbered):
+    """
+    True for short titles that start with a capital and are ALL CAPS or Title Case. Numbered
+    headings may also be in sentence case ("2 Observations and data reduction").
+    """
+    words = title.split()
+    if not words or len(words) > MAX_HEADING_WORDS or not title[0].isupper():
+        return False
+    if numbered or title.isupper():
+        return True
+    return all(word[0].isupper() for word in words if len(word) > 3)
+
+
+def classify_heading(line):
+    """
+    Returns the canonical section name for a heading line, or None if the line is not a heading.
+
+    Only heading-shaped lines count: short, with no sentence punctuation, and numbered or in
+    Title Case / ALL CAPS. Single everyday words (AMBIGUOUS_HEADINGS) also need a number or capitals.
+    """
+    appendix = _APPENDIX_PATTERN.match(line)
+    if appendix:
+        title = appendix.group('title')
+        return 'appendix' if title is None or _is_heading_shaped(title, numbered=True) else None
+    match = _HEADING_PATTERN.match(line)
+    if not match:
+        return None
+    title = match.group('title').strip()
+    numbered = match.group('number') is not None
+    if not _is_heading_shaped(title, numbered):
+        return None
+    key = title.lower()
+    section = _KEYWORD_TO_SECTION.get(key)
+    if section is not None:
+        if key in AMBIGUOUS_HEADINGS and not (numbered or title.isupper()):
+            return None
+        return section
+    # Compound headings ("Observations and Data Reduction") are classified by their first word.
+    words = title.split()
+    if len(words) <= 6:
+        return _KEYWORD_TO_SECTION.get(words[0].lower())
+    return None
+
+
+def is_boilerplate_line(line):
+    """True for margin stamps, page numbers, e-mail lines and table-like lines that are mostly numbers."""
+    stripped = line.strip()
+    if not stripped:
+        return False
+    if any(pattern.match(stripped) for pattern in _BOILERPLATE_PATTERNS):
+        return True
+    letters = sum(ch.isalpha() for ch in stripped)
+    # Rows of numeric tables: long lines that are mostly digits, signs and separators.
+    return len(stripped) >= 12 and letters < 0.3 * len(stripped)
+
+
+def split_sections(text):
+    """
+    Splits extracted paper text into sections at recognizable headings.
+
+    Returns:
+        list of tuple: (section_name, text) pairs in document order. Text before the first heading
+        is labelled 'front' (title, authors, often the abstract); unrecognized headings stay in the
+        current section.
+    """
+    sections = []
+    current_name, current_lines = 'front', []
+    for line in text.splitlines():
+        section = classify_heading(line)
+        if section is not None:
+            if current_lines:
+                sections.append((current_name, "\n".join(current_lines).strip()))
+            current_name, current_lines = section, []
+            continue
+        if not is_boilerplate_line(line):
+            current_lines.append(line)
+    if current_lines:
+        sections.append((current_name, "\n".join(current_lines).strip()))
+    return [(name, body) for name, body in sections if body]
+
+
+def chunk_text(text, max_chars=1200):
+    """Splits text into chunks of at most about `max_chars`, breaking at paragraph and then sentence boundaries."""
+    pieces = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+        else:
+            pieces.extend(re.split(r'(?<=[.!?])\s+', paragraph))
+
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 1 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current} {piece}".strip()
+        while len(current) > max_chars:
+            chunks.append(current[:max_chars])
+            current = current[max_chars:]
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _query_embeddings(embedding_model):
+    key = id(embedding_model)
+    if key not in _heading_embedding_cache:
+        _heading_embedding_cache[key] = encode_texts(embedding_model, list(SUMMARY_QUERIES))
+    return _heading_embedding_cache[key]
+
+
+def select_context(text, embedding_model=None, token_budget=4000, front_tokens=600, chunk_chars=1200):
+    """
+    Reduces a paper's extracted text to the passages most useful for a structured summary.
+
+    References, acknowledgements and appendices are dropped, and boilerplate lines are stripped.
+    The front matter (title, authors, abstract) is always kept. The remaining chunks are ranked
+    by their best cosine similarity to the "Data Used", "Methodology" and "Key Findings" queries
+    (using the same MiniLM model as ranking), scaled by a per-section weight, and added until the
+    token budget is spent. Without an embedding model, chunks are ranked by section weight alone.
+    Selected chunks are returned in document order under their section names.
+
+    Args:
+        text (str): The full extracted text of the paper.
+        embedding_model (optional): A SentenceTransformer used to score chunks.
+        token_budget (int): The approximate maximum size of the result in tokens.
+        front_tokens (int): The share of the budget reserved for the front matter and abstract.
+        chunk_chars (int): The target chunk size in characters.
+
+    Returns:
+        str: The reduced context, or the input unchanged if it already fits the budget.
+    """
+    if not text or estimate_tokens(text) <= token_budget:
+        return text
+
+    chunks = []  # (position, section, chunk text)
+    for section, body in split_sections(text):
+        if SECTION_WEIGHTS.get(section, SECTION_WEIGHTS['other']) <= 0:
+            continue
+        for chunk in chunk_text(body, chunk_chars):
+            chunks.append((len(chunks), section, chunk))
+    if not chunks:
+        return text[:token_budget * 4]
+
+    selected, used = set(), 0
+    for position, section, chunk in chunks:
+        if section in ('front', 'abstract') and used + estimate_tokens(chunk) <= front_tokens:
+            selected.add(position)
+            used += estimate_tokens(chunk)
+
+    weights = np.array([SECTION_WEIGHTS.get(section, SECTION_WEIGHTS['other']) for _, section, _ in chunks])
+    if embedding_model is not None:
+        chunk_embeddings = encode_texts(embedding_model, [chunk for _, _, chunk in chunks])
+        relevance = (chunk_embeddings @ _query_embeddings(embedding_model).T).max(axis=1)
+        scores = weights * relevance
+    else:
+        # Prefer higher-weight sections, then earlier chunks within them.
+        scores = weights - np.arange(len(chunks)) / (10.0 * len(chunks))
+
+    for position in np.argsort(-scores, kind='stable'):
+        if position in selected:
+            continue
+        cost = estimate_tokens(chunks[position][2])
+        if used + cost > token_budget:
+            continue
+        selected.add(int(position))
+        used += cost
+
+    parts, last_section = [], None
+    for position, section, chunk in chunks:
+        if position not in selected:
+            continue
+        if section != last_section:
+            parts.append(f"\n[{section.title()}]")
+            last_section = section
+        parts.append(chunk)
+    return "\n".join(parts).strip()
@@ -0,0 +1,609 @@
+import contextlib
+import json
+import glob
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from src.arxiv_utils import parse_arxiv_id
+from src.ranking_utils import normalize_rows, top_k_indices
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within a process.
+    fcntl = None
+
+
+QUANTIZATIONS = ('int8', 'float16', 'float32')
+
+
+def quantize(vectors, quantization):
+    """
+    Compresses normalized vectors for the in-memory scan.
+
+    Args:
+        vectors (numpy.ndarray): A (n, dim) float32 array.
+        quantization (str): One of 'int8', 'float16' or 'float32'.
+
+    Returns:
+        tuple: (codes, scales). For 'int8', each row is scaled by its own max-abs value and
+               `scales` holds the per-row factor that maps codes back to floats; otherwise
+               `scales` is None.
+    """
+    if quantization == 'int8':
+        max_abs = np.abs(vectors).max(axis=1)
+        max_abs[max_abs == 0] = 1.0
+        scales = (max_abs / 127.0).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales[:, np.newaxis]), -127, 127).astype(np.int8)
+        return codes, scales
+    if quantization == 'float16':
+        return vectors.astype(np.float16), None
+    if quantization == 'float32':
+        return vectors.astype(np.float32), None
+    raise ValueError(f"Unknown quantization '{quantization}'. Expected one of {QUANTIZATIONS}.")
+
+
+def kmeans(vectors, n_clusters, n_iter=10, seed=0, chunk_size=16384):
+    """
+    Spherical k-means on normalized vectors, used to train the coarse IVF quantizer.
+
+    Returns:
+        numpy.ndarray: A (n_clusters, dim) float32 array of unit-length centroids.
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = assign_to_centroids(vectors, centroids, chunk_size)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        # Re-seed empty clusters from random points so every list stays useful.
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+def assign_to_centroids(vectors, centroids, chunk_size=16384):
+    """Returns the index of the most similar centroid for each row, in bounded-memory chunks."""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+        assignments[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+class CorpusIndex:
+    """
+    An inverted-file (IVF) approximate nearest-neighbour index over paper embeddings.
+
+    Full-precision vectors are appended to a float32 file on disk and only read back
+    through a memory map to rescore short lists. The in-memory scan works on quantized
+    codes (int8 by default, a quarter of the float32 size) restricted to the `n_probe`
+    coarse clusters closest to the query. Until the index holds `train_threshold`
+    vectors it simply scans every code; after that, the coarse quantizer is trained
+    again each time the index grows `retrain_factor`-fold, so lists stay short.
+
+    Papers are keyed by their base arXiv ID: adding a newer version of an indexed paper
+    replaces its row rather than adding a second entry.
+
+    Several processes can share one index. `add` and `save` take an exclusive lock on the
+    index directory and first pick up whatever other processes saved; `save` then merges
+    this process's unsaved papers into it before writing, so no writer drops another's rows.
+    """
+
+    VECTORS_FILE = 'vectors.f32'
+    META_FILE = 'meta.json'
+    LOCK_FILE = 'lock'
+
+    def __init__(self, path, dim, quantization='int8', n_lists=None, n_probe=16, train_threshold=10000,
+                 retrain_factor=2.0):
+        """
+        Args:
+            path (str): The directory holding the index files.
+            dim (int): The embedding dimension.
+            quantization (str): 'int8', 'float16' or 'float32' codes for the in-memory scan.
+            n_lists (int, optional): The number of coarse clusters. Defaults to about 4*sqrt(n) at each training.
+            n_probe (int): The number of clusters scanned per query.
+            train_threshold (int): The corpus size at which the coarse quantizer is first trained.
+            retrain_factor (float): Retrain once the index holds this many times the rows it was trained on.
+        """
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization '{quantization}'. Expected one of {QUANTIZATIONS}.")
+        self.path = path
+        self.dim = dim
+        self.quantization = quantization
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.train_threshold = train_threshold
+        self.retrain_factor = retrain_factor
+        os.makedirs(path, exist_ok=True)
+        self.vectors_path = os.path.join(path, self.VECTORS_FILE)
+        self.meta_path = os.path.join(path, self.META_FILE)
+        self.lock_path = os.path.join(path, self.LOCK_FILE)
+        self._thread_lock = threading.RLock()
+        self._mmap_codes = False
+        self._meta_stat = None
+        self._clear()
+
+    def _clear(self):
+        self.ids = []
+        # Base arXiv ID -> row. `ids` keeps the (possibly versioned) ID each row was added with.
+        self.row_for_id = {}
+        self._superseded_rows = None
+        self.codes = np.zeros((0, self.dim), dtype=quantize(np.zeros((1, self.dim), np.float32), self.quantization)[0].dtype)
+        self.scales = np.zeros(0, dtype=np.float32) if self.quantization == 'int8' else None
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.trained_rows = 0
+        self._list_order = None
+        self._list_offsets = None
+        self._mmap = None
+        # Rows below `_saved_rows` are in the vector file. Later rows wait in a private file
+        # (`_unsaved_path`) until `save`, and `_replaced` holds new versions of saved rows.
+        self._saved_rows = 0
+        self._unsaved_path = None
+        self._unsaved_rows = 0
+        self._unsaved_mmap = None
+        self._replaced = {}
+        self._retrained = False
+
+    def __del__(self):
+        try:
+            self._discard_unsaved()
+        except Exception:
+            pass
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, paper_id):
+        return parse_arxiv_id(paper_id)[0] in self.row_for_id
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Holds this process's lock and, where the platform allows, an exclusive lock on the index."""
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _stat_meta(self):
+        try:
+            stat = os.stat(self.meta_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _vectors(self):
+        """Returns a read-only memory map over the saved full-precision vectors."""
+        if self._mmap is None or self._mmap.shape[0] != self._saved_rows:
+            if not self._saved_rows:
+                return np.zeros((0, self.dim), dtype=np.float32)
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(self._saved_rows, self.dim))
+        return self._mmap
+
+    def _unsaved_vectors(self):
+        """Returns a writable memory map over the vectors added since the last save."""
+        if not self._unsaved_rows:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        if self._unsaved_mmap is None or self._unsaved_mmap.shape[0] != self._unsaved_rows:
+            self._unsaved_mmap = np.memmap(self._unsaved_path, dtype=np.float32, mode='r+',
+                                           shape=(self._unsaved_rows, self.dim))
+        return self._unsaved_mmap
+
+    def _append_unsaved(self, vectors):
+        if self._unsaved_path is None:
+            fd, self._unsaved_path = tempfile.mkstemp(prefix=f"{self.VECTORS_FILE}.{os.getpid()}.", suffix='.unsaved',
+                                                      dir=self.path)
+            os.close(fd)
+        with open(self._unsaved_path, 'ab') as f:
+            f.write(vectors.tobytes())
+        self._unsaved_rows += len(vectors)
+
+    def _discard_unsaved(self):
+        self._unsaved_mmap = None
+        if self._unsaved_path is not None:
+            try:
+                os.remove(self._unsaved_path)
+            except FileNotFoundError:
+                pass
+        self._unsaved_path = None
+        self._unsaved_rows = 0
+
+    def _remove_orphaned_unsaved(self):
+        """Removes the unsaved-vector files of processes that exited without saving."""
+        for path in glob.glob(os.path.join(self.path, f"{self.VECTORS_FILE}.*.unsaved")):
+            try:
+                pid = int(os.path.basename(path).split('.')[2])
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                os.remove(path)
+            except (ValueError, IndexError, OSError):
+                continue
+
+    def _full_vectors(self, rows):
+        """Returns the full-precision vectors of the given rows, saved or not."""
+        rows = np.asarray(rows, dtype=np.int64)
+        vectors = np.empty((len(rows), self.dim), dtype=np.float32)
+        saved = rows < self._saved_rows
+        if saved.any():
+            vectors[saved] = self._vectors()[rows[saved]]
+        if not saved.all():
+            vectors[~saved] = self._unsaved_vectors()[rows[~saved] - self._saved_rows]
+        if self._replaced:
+            for i, row in enumerate(rows.tolist()):
+                if row in self._replaced:
+                    vectors[i] = self._replaced[row]
+        return vectors
+
+    def _drop_unsaved_rows(self):
+        """Truncates rows appended to the vector file by a save that stopped before writing its metadata."""
+        expected_bytes = len(self.ids) * self.dim * 4
+        if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) > expected_bytes:
+            self._mmap = None
+            with open(self.vectors_path, 'r+b') as f:
+                f.truncate(expected_bytes)
+
+    def _read(self):
+        """Replaces the in-memory index with the one on disk. Call with the lock held."""
+        self._clear()
+        self._meta_stat = self._stat_meta()
+        if self._meta_stat is None:
+            return
+        with open(self.meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.ids = meta['ids']
+        self._saved_rows = n_rows = len(self.ids)
+        self._drop_unsaved_rows()
+        mmap_mode = 'r' if self._mmap_codes else None
+        # Arrays renamed into place by a save that crashed before its metadata can hold extra rows.
+        self.codes = np.load(os.path.join(self.path, 'codes.npy'), mmap_mode=mmap_mode)[:n_rows]
+        if self.quantization == 'int8':
+            self.scales = np.load(os.path.join(self.path, 'scales.npy'), mmap_mode=mmap_mode)[:n_rows]
+        centroids_path = os.path.join(self.path, 'centroids.npy')
+        if os.path.exists(centroids_path):
+            self.centroids = np.load(centroids_path)
+            self.assignments = np.load(os.path.join(self.path, 'assignments.npy'))[:n_rows]
+            self.trained_rows = meta.get('trained_rows', n_rows)
+            if len(self.assignments) < n_rows:
+                # Saved by an interrupted first training: assign every row again.
+                self.assignments = assign_to_centroids(self._vectors(), self.centroids)
+        self._index_ids()
+
+    @property
+    def has_unsaved_changes(self):
+        return len(self.ids) > self._saved_rows or bool(self._replaced) or self._retrained
+
+    def _refresh(self, chunk_size=65536):
+        """Picks up what other processes saved, then replays this process's unsaved additions on top."""
+        if self._stat_meta() == self._meta_stat:
+            return
+        added_ids = self.ids[self._saved_rows:]
+        replaced_ids = [self.ids[row] for row in self._replaced]
+        replaced = [self._replaced[row] for row in self._replaced]
+        added = self._unsaved_vectors()
+        unsaved_path = self._unsaved_path
+        self._unsaved_path = None
+        try:
+            self._read()
+            for start in range(0, len(added_ids), chunk_size):
+                self._insert(added_ids[start:start + chunk_size], np.asarray(added[start:start + chunk_size]))
+            if replaced_ids:
+                self._insert(replaced_ids, np.stack(replaced))
+        finally:
+            del added
+            if unsaved_path is not None:
+                os.remove(unsaved_path)
+
+    def add(self, paper_ids, vectors):
+        """
+        Inserts new papers into the index. They are searchable at once and written by `save`.
+
+        Papers already indexed under the same base arXiv ID are skipped, unless `paper_ids`
+        carries a newer version, which replaces the indexed one in place.
+
+        Args:
+            paper_ids (list of str): One arXiv ID per row.
+            vectors (numpy.ndarray): A (n, dim) array of embeddings.
+
+        Returns:
+            int: The number of papers actually added (new versions that replaced a row are not counted).
+        """
+        paper_ids, vectors = list(paper_ids), normalize_rows(vectors)
+        with self._locked():
+            self._refresh()
+            return self._insert(paper_ids, vectors)
+
+    def _insert(self, paper_ids, vectors):
+        """Applies an `add` to the in-memory index and the unsaved-vector file."""
+        # The latest version of each base ID in this call, as {base_id: (version, position)}.
+        latest = {}
+        for i, paper_id in enumerate(paper_ids):
+            base_id, version = parse_arxiv_id(paper_id)
+            version = version or 0
+            if base_id not in latest or version > latest[base_id][0]:
+                latest[base_id] = (version, i)
+        keep, replace = [], []
+        for base_id, (version, i) in latest.items():
+            row = self.row_for_id.get(base_id)
+            if row is None:
+                keep.append(i)
+            elif version > (parse_arxiv_id(self.ids[row])[1] or 0):
+                replace.append((row, i))
+        keep.sort()
+
+        if replace:
+            self._replace_rows([row for row, _ in replace], [paper_ids[i] for _, i in replace],
+                               np.ascontiguousarray(vectors[[i for _, i in replace]]))
+        if not keep:
+            return 0
+        vectors = np.ascontiguousarray(vectors[keep])
+
+        self._append_unsaved(vectors)
+        for i in keep:
+            self.row_for_id[parse_arxiv_id(paper_ids[i])[0]] = len(self.ids)
+            self.ids.append(paper_ids[i])
+
+        codes, scales = quantize(vectors, self.quantization)
+        self.codes = np.concatenate([self.codes, codes])
+        if scales is not None:
+            self.scales = np.concatenate([self.scales, scales])
+
+        if self.is_trained:
+            self.assignments = np.concatenate([self.assignments, assign_to_centroids(vectors, self.centroids)])
+            self._list_order = None
+            if len(self.ids) >= self.retrain_factor * max(self.trained_rows, 1):
+                self.train()
+        elif len(self.ids) >= self.train_threshold:
+            self.train()
+        return len(keep)
+
+    def _replace_rows(self, rows, paper_ids, vectors):
+        """Swaps new versions of the papers into their rows, in memory until the next `save`."""
+        for row, vector in zip(rows, vectors):
+            if row < self._saved_rows:
+                self._replaced[row] = vector
+            else:
+                self._unsaved_vectors()[row - self._saved_rows] = vector
+        rows = np.asarray(rows)
+        codes, scales = quantize(vectors, self.quantization)
+        if not self.codes.flags.writeable:
+            self.codes = np.array(self.codes)
+        self.codes[rows] = codes
+        if scales is not None:
+            if not self.scales.flags.writeable:
+                self.scales = np.array(self.scales)
+            self.scales[rows] = scales
+        if self.is_trained:
+            self.assignments[rows] = assign_to_centroids(vectors, self.centroids)
+            self._list_order = None
+        for row, paper_id in zip(rows, paper_ids):
+            self.ids[row] = paper_id
+
+    def train(self, n_lists=None, sample_size=None, n_iter=10):
+        """
+        Trains the coarse quantizer on a sample of the stored vectors and assigns every row to a list.
+
+        Args:
+            n_lists (int, optional): The number of clusters; defaults to `self.n_lists` or ~4*sqrt(n).
+            sample_size (int, optional): The number of vectors used for k-means; defaults to 64 per list.
+            n_iter (int): The number of k-means iterations.
+        """
+        n_rows = len(self.ids)
+        if n_rows == 0:
+            return
+        n_lists = min(n_lists or self.n_lists or max(1, int(4 * np.sqrt(n_rows))), n_rows)
+        sample_size = min(n_rows, sample_size or 64 * n_lists)
+        sample_rows = np.sort(np.random.default_rng(0).choice(n_rows, sample_size, replace=False))
+        self.centroids = kmeans(self._full_vectors(sample_rows), n_lists, n_iter=n_iter)
+        assignments = [assign_to_centroids(self._vectors(), self.centroids),
+                       assign_to_centroids(self._unsaved_vectors(), self.centroids)]
+        self.assignments = np.concatenate(assignments)
+        if self._replaced:
+            replaced_rows = list(self._replaced)
+            self.assignments[replaced_rows] = assign_to_centroids(self._full_vectors(replaced_rows), self.centroids)
+        self.trained_rows = n_rows
+        self._list_order = None
+        self._retrained = True
+
+    def _inverted_lists(self):
+        """Returns (row order grouped by list, list offsets), rebuilding them after inserts."""
+        if self._list_order is None:
+            self._list_order = np.argsort(self.assignments, kind='stable')
+            self._list_offsets = np.concatenate([[0], np.cumsum(np.bincount(self.assignments, minlength=len(self.centroids)))])
+        return self._list_order, self._list_offsets
+
+    def _candidate_rows(self, query, n_probe):
+        if not self.is_trained:
+            return np.arange(len(self.ids))
+        order, offsets = self._inverted_lists()
+        n_probe = min(n_probe, len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+        return np.concatenate([order[offsets[c]:offsets[c + 1]] for c in probe])
+
+    def _approximate_scores(self, rows, query):
+        codes = self.codes[rows]
+        if self.quantization == 'int8':
+            return (codes.astype(np.float32) @ query) * self.scales[rows]
+        return codes.astype(np.float32) @ query
+
+    def search(self, query, k=10, n_probe=None, rescore=True, rescore_factor=4, exclude=None):
+        """
+        Finds the papers most similar to a query embedding.
+
+        Args:
+            query (numpy.ndarray): A (dim,) embedding of interests or of another paper.
+            k (int): The number of results to return.
+            n_probe (int, optional): Overrides the number of clusters scanned.
+            rescore (bool): Whether to rescore the shortlist with full-precision vectors.
+            rescore_factor (int): The shortlist holds k * rescore_factor candidates.
+            exclude (set, optional): Paper IDs to leave out of the results.
+
+        Returns:
+            list of tuple: (paper_id, similarity) pairs ordered by descending similarity.
+        """
+        if not self.ids:
+            return []
+        query = normalize_rows(query)[0]
+        rows = self._candidate_rows(query, n_probe or self.n_probe)
+        skip = [self.row_for_id[base_id] for base_id in (parse_arxiv_id(paper_id)[0] for paper_id in exclude or ())
+                if base_id in self.row_for_id]
+        if self._superseded_rows is not None:
+            skip.extend(self._superseded_rows)
+        if skip:
+            rows = rows[~np.isin(rows, skip)]
+        if len(rows) == 0:
+            return []
+
+        scores = self._approximate_scores(rows, query)
+        shortlist_size = k * rescore_factor if rescore else k
+        shortlist = top_k_indices(scores[np.newaxis, :], shortlist_size)[0]
+        rows, scores = rows[shortlist], scores[shortlist]
+
+        if rescore:
+            # Sorted row order keeps the memory-mapped reads sequential.
+            order = np.argsort(rows)
+            exact = np.empty(len(rows), dtype=np.float32)
+            exact[order] = self._full_vectors(rows[order]) @ query
+            scores = exact
+            best = top_k_indices(scores[np.newaxis, :], k)[0]
+            rows, scores = rows[best], scores[best]
+        else:
+            rows, scores = rows[:k], scores[:k]
+
+        return [(self.ids[row], float(score)) for row, score in zip(rows, scores)]
+
+    def search_similar_to(self, paper_id, k=10, **kwargs):
+        """Finds the indexed papers most similar to an already indexed paper, excluding itself."""
+        row = self.row_for_id.get(parse_arxiv_id(paper_id)[0])
+        if row is None:
+            return []
+        query = self._full_vectors([row])[0]
+        return self.search(query, k=k, exclude={paper_id}, **kwargs)
+
+    def save(self):
+        """
+        Merges this process's additions into the index on disk and writes it.
+
+        Under the index lock, papers saved by other processes are loaded first and this
+        process's unsaved additions are replayed on top. New vectors are then appended to
+        the vector file, and every other file is written to a temporary name and renamed
+        into place, with the metadata (which holds the IDs) last. `load` trims arrays and
+        vectors beyond the ID list, so a crash between the steps never misaligns rows.
+        """
+        with self._locked():
+            self._refresh()
+            self._remove_orphaned_unsaved()
+            if not self.has_unsaved_changes:
+                return
+            self._mmap = None
+            if not os.path.exists(self.vectors_path):
+                open(self.vectors_path, 'wb').close()
+            with open(self.vectors_path, 'r+b') as f:
+                for row, vector in sorted(self._replaced.items()):
+                    f.seek(row * self.dim * 4)
+                    f.write(np.ascontiguousarray(vector, dtype=np.float32).tobytes())
+                f.seek(self._saved_rows * self.dim * 4)
+                f.truncate()
+                unsaved = self._unsaved_vectors()
+                for start in range(0, len(unsaved), 65536):
+                    f.write(np.ascontiguousarray(unsaved[start:start + 65536]).tobytes())
+                del unsaved
+                f.flush()
+                os.fsync(f.fileno())
+
+            arrays = {'codes.npy': self.codes}
+            if self.scales is not None:
+                arrays['scales.npy'] = self.scales
+            if self.is_trained:
+                arrays['centroids.npy'] = self.centroids
+                arrays['assignments.npy'] = self.assignments
+            tmp_paths = {}
+            for name, array in arrays.items():
+                tmp_paths[name] = os.path.join(self.path, f"{name}.{os.getpid()}.tmp")
+                with open(tmp_paths[name], 'wb') as f:
+                    np.save(f, array)
+            for name, tmp_path in tmp_paths.items():
+                os.replace(tmp_path, os.path.join(self.path, name))
+            meta = {
+                'dim': self.dim,
+                'quantization': self.quantization,
+                'n_lists': self.n_lists,
+                'n_probe': self.n_probe,
+                'train_threshold': self.train_threshold,
+                'retrain_factor': self.retrain_factor,
+                'trained_rows': self.trained_rows,
+                'ids': self.ids,
+            }
+            tmp_path = f"{self.meta_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, self.meta_path)
+
+            self._meta_stat = self._stat_meta()
+            self._saved_rows = len(self.ids)
+            self._discard_unsaved()
+            self._replaced = {}
+            self._retrained = False
+
+    @classmethod
+    def load(cls, path, mmap_codes=False):
+        """
+        Loads an index written by `save`.
+
+        Args:
+            path (str): The index directory.
+            mmap_codes (bool): Memory-map the quantized codes instead of reading them into RAM.
+                               Suitable for read-only serving; `add` copies them into memory.
+
+        Returns:
+            CorpusIndex: The loaded index.
+        """
+        with open(os.path.join(path, cls.META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        # Before retraining, meta.json held the trained list count rather than the configured one.
+        n_lists = meta['n_lists'] if 'trained_rows' in meta else None
+        index = cls(path, meta['dim'], quantization=meta['quantization'], n_lists=n_lists, n_probe=meta['n_probe'],
+                    train_threshold=meta['train_threshold'], retrain_factor=meta.get('retrain_factor', 2.0))
+        index._mmap_codes = mmap_codes
+        with index._locked():
+            index._read()
+        return index
+
+    def _index_ids(self):
+        """Maps base IDs to rows. Indexes written before versions were merged may hold a paper
+        more than once; the latest version's row is used and the others are left out of searches."""
+        self.row_for_id = {}
+        superseded = []
+        for row, paper_id in enumerate(self.ids):
+            base_id, version = parse_arxiv_id(paper_id)
+            previous = self.row_for_id.get(base_id)
+            if previous is not None:
+                if (version or 0) < (parse_arxiv_id(self.ids[previous])[1] or 0):
+                    superseded.append(row)
+                    continue
+                superseded.append(previous)
+            self.row_for_id[base_id] = row
+        self._superseded_rows = np.asarray(superseded) if superseded else None
+
+    @classmethod
+    def open(cls, path, dim, **kwargs):
+        """Loads the index at `path` if one exists, otherwise creates an empty one."""
+        if os.path.exists(os.path.join(path, cls.META_FILE)):
+            return cls.load(path)
+        return cls(path, dim, **kwargs)
@@ -0,0 +1,185 @@
+import functools
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.instrumentation import count
+from src.rate_limit import TokenBucket
+
+# arXiv asks automated clients for no more than one request every three seconds.
+ARXIV_REQUESTS_PER_SECOND = 1 / 3
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def create_session(pool_size=8, user_agent="genai-arxiv-assistant"):
+    """
+    Creates a requests.Session whose connection pool is large enough for every worker,
+    so downloads reuse keep-alive connections instead of opening one per PDF.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"User-Agent": user_agent})
+    return session
+
+
+def backoff_delay(attempt, base=2.0, maximum=60.0, retry_after=None):
+    """Returns the delay before retry `attempt` (0-based): exponential with jitter, or Retry-After if given."""
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), maximum)
+        except ValueError:
+            pass
+    return min(maximum, base * (2 ** attempt)) * (0.5 + random.random() / 2)
+
+
+def fetch_pdf(pdf_url, session, limiter=None, max_retries=3, backoff_base=2.0, spill_threshold=32 * 1024 * 1024,
+              timeout=60, chunk_size=64 * 1024, headers=None, response_info=None):
+    """
+    Streams one PDF into a memory buffer, retrying with exponential backoff only on failure.
+
+    Args:
+        pdf_url (str): The URL of the PDF to download.
+        session (requests.Session): A pooled session shared across workers.
+        limiter (TokenBucket, optional): A shared limiter; one token is taken per HTTP request.
+        max_retries (int): The maximum number of attempts.
+        backoff_base (float): The first retry delay in seconds; it doubles on each further retry.
+        spill_threshold (int): PDFs larger than this many bytes are spilled to a temporary file.
+        timeout (float): The connect/read timeout for each request.
+        chunk_size (int): The streaming chunk size in bytes.
+        headers (dict, optional): Extra request headers, e.g. If-None-Match for a conditional request.
+        response_info (dict, optional): Filled with the final response's 'status', 'etag' and
+                                        'last_modified'.
+
+    Returns:
+        tempfile.SpooledTemporaryFile or None: A buffer positioned at the start of the PDF,
+        or None if every attempt failed or the server answered 304 Not Modified. The caller
+        should close it when done.
+    """
+    for attempt in range(max_retries):
+        if limiter is not None:
+            limiter.acquire()
+        retry_after = None
+        buffer = None
+        count('download.requests')
+        try:
+            with session.get(pdf_url, stream=True, timeout=timeout, headers=headers) as response:
+                if response_info is not None:
+                    response_info.update(status=response.status_code, etag=response.headers.get("ETag"),
+                                         last_modified=response.headers.get("Last-Modified"))
+                if response.status_code == 304:
+                    return None
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    retry_after = response.headers.get("Retry-After")
+                    raise requests.exceptions.HTTPError(f"HTTP {response.status_code}", response=response)
+                response.raise_for_status()
+                buffer = tempfile.SpooledTemporaryFile(max_size=spill_threshold)
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    buffer.write(chunk)
+                count('download.bytes', buffer.tell())
+                buffer.seek(0)
+                return buffer
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            if buffer is not None:
+                buffer.close()
+            error = e
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status not in RETRYABLE_STATUS_CODES:
+                print(f"Download failed for {pdf_url}: {e}")
+                return None
+            error = e
+        except (requests.exceptions.RequestException, OSError) as e:
+            # Anything else (a bad URL, too many redirects, an undecodable body, a full disk
+            # while spilling) will not go away on retry; give up on this URL only.
+            if buffer is not None:
+                buffer.close()
+            print(f"Download failed for {pdf_url}: {e}")
+            return None
+
+        if attempt < max_retries - 1:
+            delay = backoff_delay(attempt, backoff_base, retry_after=retry_after)
+            print(f"Download failed for {pdf_url} (Attempt {attempt + 1}/{max_retries}): {error}. "
+                  f"Retrying in {delay:.1f} seconds...")
+            time.sleep(delay)
+        else:
+            print(f"Max retries reached. Download failed for {pdf_url}: {error}")
+    return None
+
+
+def fetch_pdf_cached(pdf_url, session, cache, limiter=None, **fetch_kwargs):
+    """
+    Returns a PDF from a `PaperCache`, going to the network only on a miss or to revalidate.
+
+    A fresh cached copy is opened from disk without any request. A copy due for revalidation
+    is checked with a conditional request; a 304 reuses it, a new body replaces it, and if the
+    request fails the stale copy is returned rather than nothing. Downloads are added to the cache.
+
+    Returns:
+        file object or None: The PDF positioned at its start, or None if it could not be obtained.
+    """
+    cached = cache.get_pdf(pdf_url)
+    if cached is not None:
+        count('paper_cache.pdf_hits')
+        return cached
+    response_info = {}
+    buffer = fetch_pdf(pdf_url, session, limiter, headers=cache.conditional_headers(pdf_url) or None,
+                       response_info=response_info, **fetch_kwargs)
+    if response_info.get('status') == 304:
+        count('download.not_modified')
+        return cache.mark_revalidated(pdf_url)
+    if buffer is None:
+        stale = cache.get_pdf(pdf_url, allow_stale=True)
+        if stale is not None:
+            print(f"Using the cached copy of {pdf_url}, which could not be revalidated.")
+        return stale
+    try:
+        cache.put_pdf(pdf_url, buffer, etag=response_info.get('etag'), last_modified=response_info.get('last_modified'))
+    except OSError as e:
+        print(f"Warning: could not cache {pdf_url}: {e}")
+    buffer.seek(0)
+    return buffer
+
+
+def download_pdfs(pdf_urls, max_workers=4, requests_per_second=ARXIV_REQUESTS_PER_SECOND, burst=1,
+                  session=None, cache=None, **fetch_kwargs):
+    """
+    Downloads many PDFs concurrently into memory buffers under one shared rate limit.
+
+    Concurrency overlaps transfer time across papers, while the shared token bucket keeps
+    the combined request rate within arXiv's politeness policy no matter how many workers run.
+
+    Args:
+        pdf_urls (list of str): The PDF URLs to fetch. None entries are skipped.
+        max_workers (int): The maximum number of concurrent downloads.
+        requests_per_second (float): The request rate shared by all workers.
+        burst (float): The number of requests allowed back to back.
+        session (requests.Session, optional): A session to reuse; one is created if omitted.
+        cache (PaperCache, optional): A shared PDF cache; cached papers are read from disk and
+                                      new downloads are added to it (see `fetch_pdf_cached`).
+        **fetch_kwargs: Passed through to `fetch_pdf` (max_retries, spill_threshold, timeout, ...).
+
+    Returns:
+        list: One buffer or open file (or None on failure) per URL, in input order.
+    """
+    fetch = functools.partial(fetch_pdf_cached, cache=cache) if cache is not None else fetch_pdf
+    own_session = session is None
+    if own_session:
+        session = create_session(pool_size=max_workers)
+    limiter = TokenBucket(requests_per_second, capacity=burst)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(fetch, url, session, limiter=limiter, **fetch_kwargs) if url else None
+                for url in pdf_urls
+            ]
+            return [future.result() if future is not None else None for future in futures]
+    finally:
+        if own_session:
+            session.close()
@@ -0,0 +1,297 @@
+import contextlib
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from src.arxiv_utils import parse_arxiv_id
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within a process.
+    fcntl = None
+
+
+def text_hash(text):
+    """Returns a short, stable hash of the embedded text, so edited abstracts miss the cache."""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def make_cache_key(arxiv_url, text):
+    """Builds the (arXiv ID, version, text hash) part of a cache key; the model is fixed per store."""
+    arxiv_id, version = parse_arxiv_id(arxiv_url)
+    return f"{arxiv_id}|{version or 0}|{text_hash(text)}"
+
+
+class EmbeddingCache:
+    """
+    An on-disk embedding store for a single embedding model.
+
+    Vectors live in an append-only float32 file that is read back through a
+    read-only memory map, so lookups do not copy the whole store into memory.
+    A small JSON index maps (arXiv ID, version, text hash) keys to row numbers
+    and the time each row was written. Every model gets its own subdirectory,
+    so vectors from different models never mix.
+
+    Writers take an exclusive lock on the store, merge the index on disk with
+    their own entries and replace it atomically, so several processes can share
+    one cache. Index writes are batched: `put_many` only rewrites the index every
+    `flush_every` new entries, and `flush` writes whatever is still pending.
+    """
+
+    VECTORS_FILE = 'vectors.f32'
+    INDEX_FILE = 'index.json'
+    LOCK_FILE = 'lock'
+
+    def __init__(self, cache_dir, model_name, dim=None, flush_every=10000):
+        """
+        Args:
+            cache_dir (str): The root directory for all embedding caches.
+            model_name (str): The embedding model name (e.g., 'all-MiniLM-L6-v2').
+            dim (int, optional): The embedding dimension. Inferred from the first write if omitted.
+            flush_every (int): The number of new entries after which `put_many` writes the index.
+        """
+        self.model_name = model_name
+        self.path = os.path.join(cache_dir, re.sub(r'[^A-Za-z0-9_.-]', '_', model_name))
+        os.makedirs(self.path, exist_ok=True)
+        self.vectors_path = os.path.join(self.path, self.VECTORS_FILE)
+        self.index_path = os.path.join(self.path, self.INDEX_FILE)
+        self.lock_path = os.path.join(self.path, self.LOCK_FILE)
+        self.dim = dim
+        self.flush_every = flush_every
+        self.index = {}
+        self.generation = 0
+        self._pending = {}
+        self._index_stat = None
+        self._mmap = None
+        self._thread_lock = threading.RLock()
+        self._load_index()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Holds this process's lock and, where the platform allows, an exclusive lock on the store."""
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _stat_index(self):
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _read_index(self):
+        """Returns the index on disk as (dim, generation, entries), or None if there is none or it is unusable."""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Warning: could not read embedding cache index {self.index_path}: {e}")
+            return None
+        if data.get('model') != self.model_name:
+            print(f"Warning: embedding cache at {self.path} belongs to {data.get('model')}, ignoring it.")
+            return None
+        entries = {key: tuple(value) for key, value in data.get('entries', {}).items()}
+        return data.get('dim', self.dim), data.get('generation', 0), entries
+
+    def _load_index(self):
+        """(Re)reads the index on disk, keeping this process's unflushed entries unless the store was compacted."""
+        self._index_stat = self._stat_index()
+        on_disk = self._read_index()
+        if on_disk is None:
+            return
+        dim, generation, entries = on_disk
+        if generation != self.generation:
+            # Another process compacted the store, so rows appended here no longer exist.
+            self._pending = {}
+            self._mmap = None
+        self.dim, self.generation = dim, generation
+        entries.update(self._pending)
+        self.index = entries
+
+    def _refresh(self):
+        """Picks up entries (and compactions) written by other processes since the index was last read."""
+        if self._stat_index() != self._index_stat:
+            with self._thread_lock:
+                self._load_index()
+
+    def _write_index(self):
+        tmp_path = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'model': self.model_name, 'dim': self.dim, 'generation': self.generation,
+                       'entries': self.index}, f)
+        os.replace(tmp_path, self.index_path)
+        self._index_stat = self._stat_index()
+        self._pending = {}
+
+    def flush(self):
+        """Merges pending entries into the index on disk."""
+        with self._locked():
+            if not self._pending:
+                return
+            self._load_index()
+            if self._pending:
+                self._write_index()
+
+    def _rows_on_disk(self):
+        if self.dim is None or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (4 * self.dim)
+
+    def _vectors(self):
+        """Returns a read-only memory map over every row written so far."""
+        n_rows = self._rows_on_disk()
+        if n_rows == 0:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        if self._mmap is None or self._mmap.shape[0] != n_rows:
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(n_rows, self.dim))
+        return self._mmap
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def get(self, key):
+        """Returns the cached vector for a key as a view into the memory map, or None on a miss."""
+        self._refresh()
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+        return self._vectors()[entry[0]]
+
+    def lookup(self, keys):
+        """
+        Looks up many keys at once.
+
+        Args:
+            keys (list of str): Cache keys from `make_cache_key`.
+
+        Returns:
+            tuple: (rows, missing), where `rows` is a list with the memory-map row number for
+                   each hit (None for misses) and `missing` lists the positions of the misses.
+        """
+        self._refresh()
+        rows = [self.index[key][0] if key in self.index else None for key in keys]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        return rows, missing
+
+    def put_many(self, keys, vectors, flush=False):
+        """
+        Appends vectors to the store and records them in the index.
+
+        The vectors are synced before the index is rewritten, so a crash can only
+        leave unreferenced rows behind (reclaimed by `compact`), never a dangling key.
+        A partial row left by an interrupted write is cut off before appending, so
+        row numbers always match file offsets.
+
+        Args:
+            keys (list of str): Cache keys, one per row of `vectors`.
+            vectors (numpy.ndarray): A (len(keys), dim) array.
+            flush (bool): Write the index now rather than once `flush_every` entries are pending.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if len(keys) == 0:
+            return
+        with self._locked():
+            self._refresh()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional vectors for {self.model_name}, got {vectors.shape[1]}.")
+
+            first_row = self._rows_on_disk()
+            with open(self.vectors_path, 'ab') as f:
+                f.truncate(first_row * 4 * self.dim)
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            now = time.time()
+            for offset, key in enumerate(keys):
+                self.index[key] = self._pending[key] = (first_row + offset, now)
+            if flush or len(self._pending) >= self.flush_every:
+                self._load_index()
+                self._write_index()
+
+    def get_or_encode(self, keys, texts, encode_fn, flush=True):
+        """
+        Returns one vector per key, encoding only the texts that miss the cache.
+
+        Args:
+            keys (list of str): Cache keys, one per text.
+            texts (list of str): The texts to embed on a miss.
+            encode_fn (callable): Takes a list of texts and returns a (n, dim) array.
+            flush (bool): Write the index before returning (pass False and call `flush`
+                          once when filling the cache in many chunks).
+
+        Returns:
+            numpy.ndarray: A (len(keys), dim) float32 array in the order of `keys`.
+        """
+        rows, missing = self.lookup(keys)
+        if missing:
+            # Duplicate keys in one call are encoded once.
+            unique_missing = list(dict.fromkeys(keys[i] for i in missing))
+            text_for_key = {keys[i]: texts[i] for i in missing}
+            self.put_many(unique_missing, encode_fn([text_for_key[key] for key in unique_missing]), flush=flush)
+            rows = [self.index[key][0] for key in keys]
+        if not rows:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.asarray(self._vectors()[np.asarray(rows)])
+
+    def evict(self, max_age_days):
+        """
+        Drops entries written more than `max_age_days` ago and compacts the store.
+
+        Returns:
+            int: The number of entries evicted.
+        """
+        cutoff = time.time() - max_age_days * 86400
+        with self._locked():
+            self._load_index()
+            stale = [key for key, (_, written) in self.index.items() if written < cutoff]
+            for key in stale:
+                del self.index[key]
+                self._pending.pop(key, None)
+            if stale:
+                self._compact()
+        return len(stale)
+
+    def compact(self):
+        """Rewrites the vector file so it holds only rows that the index still references."""
+        with self._locked():
+            self._load_index()
+            self._compact()
+
+    def _compact(self):
+        if self.dim is None:
+            return
+        vectors = self._vectors()
+        keys = sorted(self.index, key=lambda key: self.index[key][0])
+        tmp_path = f"{self.vectors_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            for new_row, key in enumerate(keys):
+                row, written = self.index[key]
+                f.write(np.ascontiguousarray(vectors[row]).tobytes())
+                self.index[key] = (new_row, written)
+            f.flush()
+            os.fsync(f.fileno())
+        self._mmap = None
+        os.replace(tmp_path, self.vectors_path)
+        # Other processes see the new generation and drop row numbers they have not flushed yet.
+        self.generation += 1
+        self._write_index()
@@ -0,0 +1,192 @@
+import multiprocessing
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.pdf_utils import iter_reader_pages, open_pdf_source, spill_pdf_source
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; the memory cap is then skipped.
+    resource = None
+
+# Outcome of one sandboxed extraction.
+STATUS_OK = 'ok'              # Every page was extracted.
+STATUS_TRUNCATED = 'truncated'  # Stopped at the page limit.
+STATUS_FALLBACK = 'fallback'    # The full run failed; text comes from the first-pages fallback.
+STATUS_TIMEOUT = 'timeout'      # Killed at the wall-clock limit; text holds the pages received so far.
+STATUS_MEMORY = 'memory'        # Exceeded the memory cap.
+STATUS_KILLED = 'killed'        # The worker died without reporting (e.g., a signal).
+STATUS_ERROR = 'error'          # The PDF could not be parsed.
+
+
+def _current_address_space():
+    """Returns the process's current virtual memory size in bytes where /proc is available, else 0."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _limit_memory(max_memory_mb):
+    if resource is None or not max_memory_mb:
+        return
+    # The cap is on top of what the worker already maps, so forked children that inherit
+    # a large parent (e.g., one with torch loaded) still get the full budget for parsing.
+    limit = _current_address_space() + int(max_memory_mb) * 1024 * 1024
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ValueError, OSError) as e:
+        print(f"Warning: could not apply the {max_memory_mb} MB memory cap: {e}")
+
+
+def _sandbox_worker(conn, source, max_pages, max_memory_mb):
+    """
+    Runs in the child process: streams page texts back over a pipe so the parent keeps
+    whatever was extracted even if it has to kill the child mid-document.
+    """
+    _limit_memory(max_memory_mb)
+    try:
+        import PyPDF2
+        with open_pdf_source(source) as pdf_file:
+            # One reader both counts and extracts, so the document is parsed only once.
+            pdf_reader = PyPDF2.PdfReader(pdf_file)
+            conn.send(('meta', len(pdf_reader.pages)))
+            for page_text in iter_reader_pages(pdf_reader, 0, max_pages):
+                conn.send(('page', page_text))
+        conn.send(('done', None))
+    except MemoryError:
+        conn.send(('error', STATUS_MEMORY, 'memory limit exceeded'))
+    except Exception as e:
+        conn.send(('error', STATUS_ERROR, str(e)))
+    finally:
+        conn.close()
+
+
+def _run_in_sandbox(source, timeout, max_memory_mb, max_pages):
+    ctx = multiprocessing.get_context()
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_sandbox_worker, args=(child_conn, source, max_pages, max_memory_mb), daemon=True)
+    process.start()
+    child_conn.close()
+
+    pages = []
+    total_pages = None
+    status, reason = None, None
+    deadline = time.monotonic() + timeout
+    try:
+        while status is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not parent_conn.poll(remaining):
+                status, reason = STATUS_TIMEOUT, f"exceeded {timeout}s"
+                break
+            try:
+                message = parent_conn.recv()
+            except EOFError:
+                status, reason = STATUS_KILLED, "worker exited without finishing"
+                break
+            if message[0] == 'meta':
+                total_pages = message[1]
+            elif message[0] == 'page':
+                pages.append(message[1])
+            elif message[0] == 'done':
+                truncated = max_pages is not None and total_pages is not None and total_pages > max_pages
+                status = STATUS_TRUNCATED if truncated else STATUS_OK
+                reason = f"page limit {max_pages} of {total_pages}" if truncated else None
+            else:
+                status, reason = message[1], message[2]
+    finally:
+        parent_conn.close()
+        if status in (STATUS_OK, STATUS_TRUNCATED, STATUS_ERROR, STATUS_MEMORY):
+            process.join(1)
+        if process.is_alive():
+            process.kill()
+        process.join()
+    if status == STATUS_KILLED and process.exitcode is not None and process.exitcode < 0:
+        reason = f"worker killed by signal {-process.exitcode}"
+
+    return {
+        'status': status,
+        'text': "".join(pages) if pages else None,
+        'pages_extracted': len(pages),
+        'total_pages': total_pages,
+        'reason': reason,
+    }
+
+
+def extract_text_sandboxed(source, timeout=60, max_memory_mb=1024, max_pages=200, fallback_pages=10,
+                           fallback_timeout=15):
+    """
+    Extracts text from one PDF in a separate process under time, memory and page budgets.
+
+    If the full extraction fails (timeout, memory cap, crash or parse error) without yielding
+    any text, a cheap fallback re-runs the extraction on only the first `fallback_pages` pages.
+    The worker is handed a path: bytes and in-memory buffers are first written to a temporary
+    file, so file objects are not read into the parent's memory and no PDF is pickled to the child.
+
+    Args:
+        source: A PDF path, bytes or binary file object.
+        timeout (float): The wall-clock limit in seconds for the full extraction.
+        max_memory_mb (int): The address-space cap for the worker process (POSIX only).
+        max_pages (int, optional): The maximum number of pages to extract.
+        fallback_pages (int): Pages extracted by the fallback run; 0 disables the fallback.
+        fallback_timeout (float): The wall-clock limit in seconds for the fallback run.
+
+    Returns:
+        dict: 'status' (one of the STATUS_* values), 'text' (str or None), 'pages_extracted',
+              'total_pages' and 'reason' (why the document was truncated or killed, if it was).
+    """
+    with tempfile.TemporaryDirectory(prefix='pdf_sandbox_') as spill_dir:
+        path = spill_pdf_source(source, spill_dir, 'source')
+        result = _run_in_sandbox(path, timeout, max_memory_mb, max_pages)
+        if result['text'] is None and fallback_pages and result['status'] not in (STATUS_OK, STATUS_TRUNCATED):
+            fallback = _run_in_sandbox(path, fallback_timeout, max_memory_mb, fallback_pages)
+            if fallback['text']:
+                fallback['reason'] = f"{result['status']}: {result['reason']}; used first {fallback['pages_extracted']} pages"
+                fallback['status'] = STATUS_FALLBACK
+                return fallback
+    return result
+
+
+def extract_texts_sandboxed(sources, max_workers=4, **limits):
+    """
+    Runs `extract_text_sandboxed` over many PDFs, with at most `max_workers` sandboxes at once.
+
+    Each source is spilled to disk only when its turn comes, so at most `max_workers` temporary
+    copies exist at a time.
+
+    Args:
+        sources (list): PDF paths, bytes or binary file objects. None entries are skipped.
+        max_workers (int): The maximum number of concurrent worker processes.
+        **limits: Passed through to `extract_text_sandboxed` (timeout, max_memory_mb, max_pages, ...).
+
+    Returns:
+        list: One result dict (or None for skipped entries) per source, in input order.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(extract_text_sandboxed, source, **limits) if source is not None else None
+                   for source in sources]
+        return [future.result() if future is not None else None for future in futures]
+
+
+def report_extraction_problems(results, labels=None):
+    """
+    Prints which documents were truncated, fell back or were killed.
+
+    Args:
+        results (list): Result dicts from `extract_texts_sandboxed`.
+        labels (list of str, optional): A display name per result (e.g., the arXiv URL).
+
+    Returns:
+        list of tuple: (label, status, reason) for every document that did not extract cleanly.
+    """
+    problems = []
+    for i, result in enumerate(results):
+        if result is None or result['status'] == STATUS_OK:
+            continue
+        label = labels[i] if labels else f"document {i}"
+        problems.append((label, result['status'], result['reason']))
+        print(f"Extraction {result['status']} for {label}: {result['reason']} "
+              f"({result['pages_extracted']}/{result['total_pages']} pages)")
+    return problems
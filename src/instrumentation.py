@@ -0,0 +1,130 @@
+"""
+Timing spans and counters for the pipeline stages.
+
+Stages wrap their work in `span('name')` and report volumes with `count('name', n)`. Both go
+to the process-wide `Metrics` (see `set_metrics`), which can be exported as JSON with
+`python main.py --metrics metrics.json ...` or by the benchmark harness. Spans nest and may
+overlap (feed fetching streams into embedding, for instance), so each span's total is
+inclusive wall-clock time rather than an exclusive share of the run.
+
+Span names: fetch, embed, prefilter, rank, download, extract, context, summarize and
+llm.request, plus the CLI command itself (e.g. digest) when run with --metrics. Spans
+recorded by concurrent workers (context, llm.request) add up across threads.
+Counter names: arxiv.requests, arxiv.papers, embed.papers, embedding_cache.hits,
+download.requests, download.bytes, download.not_modified, paper_cache.pdf_hits,
+paper_cache.text_hits, extract.papers, extract.pages, llm.requests, llm.cache_hits,
+llm.prompt_tokens, llm.response_tokens.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+
+# Per-span durations kept for percentiles; later calls still update count, total, min and max.
+MAX_SAMPLES = 10000
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+class Metrics:
+    """A thread-safe collection of span timings and counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self._spans = {}
+            self._counters = {}
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """Times the enclosed block and records it under `name`, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self._lock:
+            span = self._spans.get(name)
+            if span is None:
+                span = self._spans[name] = {'count': 0, 'total': 0.0, 'min': seconds, 'max': seconds, 'samples': []}
+            span['count'] += 1
+            span['total'] += seconds
+            span['min'] = min(span['min'], seconds)
+            span['max'] = max(span['max'], seconds)
+            if len(span['samples']) < MAX_SAMPLES:
+                span['samples'].append(seconds)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: {'started', 'elapsed_s', 'spans': {name: {'count', 'total_s', 'mean_s', 'min_s',
+                  'p50_s', 'p95_s', 'max_s'}}, 'counters': {name: value}}.
+        """
+        with self._lock:
+            spans = {}
+            for name, span in sorted(self._spans.items()):
+                samples = sorted(span['samples'])
+                spans[name] = {
+                    'count': span['count'],
+                    'total_s': span['total'],
+                    'mean_s': span['total'] / span['count'],
+                    'min_s': span['min'],
+                    'p50_s': _percentile(samples, 0.5),
+                    'p95_s': _percentile(samples, 0.95),
+                    'max_s': span['max'],
+                }
+            return {
+                'started': self.started,
+                'elapsed_s': time.time() - self.started,
+                'spans': spans,
+                'counters': dict(sorted(self._counters.items())),
+            }
+
+    def to_json(self, path=None):
+        """Returns the snapshot as JSON, also writing it to `path` (atomically) if one is given."""
+        text = json.dumps(self.snapshot(), indent=2)
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        return text
+
+
+_metrics = Metrics()
+
+
+def set_metrics(metrics):
+    """Installs the Metrics that `span` and `count` report to, e.g. a fresh one per benchmark run."""
+    global _metrics
+    _metrics = metrics
+
+
+def get_metrics():
+    return _metrics
+
+
+def span(name):
+    return _metrics.span(name)
+
+
+def count(name, value=1):
+    _metrics.count(name, value)
@@ -0,0 +1,369 @@
+import array
+import contextlib
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+from src.instrumentation import span
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within a process.
+    fcntl = None
+
+# Field weights for BM25: title words count double.
+FIELD_WEIGHTS = {'title': 2, 'abstract': 1, 'comment': 1}
+
+# The query weight added for each keyword in a list of boost terms.
+DEFAULT_BOOST = 2.0
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have having
+he her here hers him his how however i if in into is it its itself just may me more most much must my no
+nor not now of off on once only or other our ours out over own same she should so some such than that the
+their theirs them then there these they this those through thus to too under until up upon us very via was
+we were what when where which while who whom why will with within without would you your
+""".split())
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lowercases text and splits it into alphanumeric terms, dropping stopwords and single characters."""
+    if not text:
+        return []
+    return [term for term in _TOKEN_PATTERN.findall(text.lower()) if len(term) > 1 and term not in STOPWORDS]
+
+
+def encode_varints(values, out=None):
+    """Appends non-negative integers to a bytearray as LEB128 varints (7 bits per byte)."""
+    out = bytearray() if out is None else out
+    for value in values:
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return out
+
+
+def decode_varints(data):
+    """Decodes a buffer of LEB128 varints into a uint64 array, without a Python-level loop."""
+    data = np.frombuffer(bytes(data), dtype=np.uint8)
+    if data.size == 0:
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    # Each byte's position within its varint gives its shift.
+    shifts = (np.arange(data.size) - np.repeat(starts, ends - starts + 1)).astype(np.uint64) * np.uint64(7)
+    parts = (data & 0x7F).astype(np.uint64) << shifts
+    return np.add.reduceat(parts, starts)
+
+
+def paper_terms(paper):
+    """Returns the weighted term counts of a paper's title, abstract and comment."""
+    counts = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        for term in tokenize(paper.get(field)):
+            counts[term] += weight
+    return counts
+
+
+class LexicalIndex:
+    """
+    An in-process BM25 inverted index over paper titles, abstracts and comments.
+
+    Postings are kept per term as (doc-ID delta, term frequency) pairs packed into varints,
+    so they take a byte or two per posting, and new papers are appended without rewriting
+    earlier postings. The index is meant as a cheap first stage: it narrows a large window or
+    backfill to a few hundred candidates, and only those are embedded and reranked with MiniLM.
+
+    Several processes may share one index file. `save` holds a lock on it and, if another
+    process saved since this one loaded, reloads the file and re-adds only this process's
+    unsaved papers, so concurrent writers keep each other's papers.
+    """
+
+    def __init__(self, path=None, k1=1.2, b=0.75):
+        """
+        Args:
+            path (str, optional): The .npz file used by `save`.
+            k1 (float): BM25 term-frequency saturation.
+            b (float): BM25 document-length normalization.
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.doc_keys = []
+        self.doc_lengths = array.array('I')
+        self._key_to_doc = {}
+        self._postings = {}  # term -> bytearray of varint (doc delta, tf) pairs
+        self._last_doc = {}  # term -> the last doc ID in its postings, for delta encoding
+        self._doc_freq = {}  # term -> number of documents containing it
+        self._total_length = 0
+        self._saved_docs = 0  # docs below this ID are in the file as of `_disk_stat`
+        self._disk_stat = None
+        self._thread_lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_keys)
+
+    def __contains__(self, key):
+        return key in self._key_to_doc
+
+    def add(self, papers):
+        """
+        Indexes papers by their 'id'. Papers already in the index, or without an ID, are skipped.
+
+        Returns:
+            int: The number of papers added.
+        """
+        added = 0
+        for paper in papers:
+            key = paper.get('id')
+            if key is None or key in self._key_to_doc:
+                continue
+            self._add_terms(key, paper_terms(paper))
+            added += 1
+        return added
+
+    def _add_terms(self, key, counts):
+        all_postings, last_doc, doc_freq = self._postings, self._last_doc, self._doc_freq
+        doc = len(self.doc_keys)
+        for term, tf in counts.items():
+            postings = all_postings.get(term)
+            if postings is None:
+                postings = all_postings[term] = bytearray()
+                delta = doc
+            else:
+                delta = doc - last_doc[term]
+            if delta < 0x80 and tf < 0x80:
+                postings.append(delta)
+                postings.append(tf)
+            else:
+                encode_varints((delta, tf), postings)
+            last_doc[term] = doc
+            doc_freq[term] = doc_freq.get(term, 0) + 1
+        length = sum(counts.values())
+        self.doc_keys.append(key)
+        self._key_to_doc[key] = doc
+        self.doc_lengths.append(length)
+        self._total_length += length
+
+    def _unsaved_terms(self):
+        """Rebuilds the term counts of the docs added since the last load or save, from their postings."""
+        start = self._saved_docs
+        counts = [Counter() for _ in range(len(self.doc_keys) - start)]
+        for term, last in self._last_doc.items():
+            if last < start:
+                continue
+            docs, tfs = self.postings(term)
+            first = np.searchsorted(docs, start)
+            for doc, tf in zip(docs[first:].tolist(), tfs[first:].tolist()):
+                counts[doc - start][term] = int(tf)
+        return [(self.doc_keys[start + i], doc_counts) for i, doc_counts in enumerate(counts)]
+
+    def postings(self, term):
+        """Returns (doc_ids, term_frequencies) arrays for a term."""
+        data = self._postings.get(term)
+        if data is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        values = decode_varints(data)
+        return np.cumsum(values[0::2]).astype(np.int64), values[1::2].astype(np.float32)
+
+    def score(self, weighted_terms):
+        """
+        Computes BM25 scores for every document.
+
+        Args:
+            weighted_terms (dict): term -> query weight.
+
+        Returns:
+            numpy.ndarray: A float32 array with one score per document.
+        """
+        n_docs = len(self.doc_keys)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        if not n_docs:
+            return scores
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32).astype(np.float32)
+        norms = self.k1 * (1.0 - self.b + self.b * lengths / max(self._total_length / n_docs, 1e-9))
+        for term, weight in weighted_terms.items():
+            df = self._doc_freq.get(term)
+            if not df or weight == 0:
+                continue
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            docs, tfs = self.postings(term)
+            scores[docs] += weight * idf * tfs * (self.k1 + 1.0) / (tfs + norms[docs])
+        return scores
+
+    def _docs_with_all(self, terms):
+        docs = None
+        for term in terms:
+            term_docs = self.postings(term)[0]
+            docs = term_docs if docs is None else np.intersect1d(docs, term_docs, assume_unique=True)
+        return docs if docs is not None else np.zeros(0, dtype=np.int64)
+
+    def search(self, query, k=100, boost_terms=None, exclude_terms=None, keys=None):
+        """
+        Finds the documents that best match a free-text query.
+
+        Args:
+            query (str): The query text, e.g. a research-interest description.
+            k (int): The maximum number of results.
+            boost_terms (list or dict, optional): Keywords that count extra. A list adds DEFAULT_BOOST
+                                                  to each keyword's query weight; a dict maps
+                                                  keyword -> extra weight.
+            exclude_terms (list of str, optional): Documents containing any of these keywords (all
+                                                   words of a multi-word phrase) are dropped.
+            keys (iterable, optional): Restricts results to these paper IDs (e.g. the current window).
+
+        Returns:
+            list of tuple: (paper_id, score) pairs with positive scores, best first.
+        """
+        weights = Counter(tokenize(query))
+        if boost_terms:
+            items = boost_terms.items() if isinstance(boost_terms, dict) else ((term, DEFAULT_BOOST) for term in boost_terms)
+            for phrase, extra in items:
+                for term in tokenize(phrase):
+                    weights[term] += extra
+        scores = self.score(weights)
+        if keys is not None:
+            allowed = np.zeros(len(scores), dtype=bool)
+            allowed[[self._key_to_doc[key] for key in keys if key in self._key_to_doc]] = True
+            scores[~allowed] = 0.0
+        for phrase in exclude_terms or ():
+            terms = tokenize(phrase)
+            if terms:
+                scores[self._docs_with_all(terms)] = 0.0
+
+        matches = np.flatnonzero(scores > 0)
+        if len(matches) > k:
+            matches = matches[np.argpartition(-scores[matches], k - 1)[:k]]
+        matches = matches[np.argsort(-scores[matches], kind='stable')]
+        return [(self.doc_keys[doc], float(scores[doc])) for doc in matches]
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    @contextlib.contextmanager
+    def _locked(self, path):
+        """Holds this process's lock and, where the platform allows, an exclusive lock on the index file."""
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(f"{path}.lock", 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _merge_saved(self, path):
+        """Replaces this index with the saved one at `path` plus the papers only this process added."""
+        unsaved = self._unsaved_terms()
+        saved = LexicalIndex.load(path)
+        for key, counts in unsaved:
+            if key not in saved._key_to_doc:
+                saved._add_terms(key, counts)
+        self.doc_keys, self.doc_lengths, self._key_to_doc = saved.doc_keys, saved.doc_lengths, saved._key_to_doc
+        self._postings, self._last_doc, self._doc_freq = saved._postings, saved._last_doc, saved._doc_freq
+        self._total_length = saved._total_length
+
+    def save(self, path=None):
+        """
+        Writes the index to a single .npz file, replacing any earlier version atomically.
+
+        If the file changed since this index last loaded or saved it, the two are merged first.
+        """
+        path = path or self.path
+        if path is None:
+            raise ValueError("No path given for saving the lexical index.")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._locked(path):
+            stat = self._stat(path)
+            if stat is not None and (path != self.path or stat != self._disk_stat):
+                self._merge_saved(path)
+            terms = list(self._postings)
+            offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(self._postings[term]) for term in terms])
+            tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+            np.savez(
+                tmp_path,
+                terms=np.array(terms, dtype=str),
+                offsets=offsets,
+                postings=np.frombuffer(b"".join(self._postings[term] for term in terms), dtype=np.uint8),
+                last_doc=np.array([self._last_doc[term] for term in terms], dtype=np.int64),
+                doc_freq=np.array([self._doc_freq[term] for term in terms], dtype=np.int64),
+                doc_keys=np.array(self.doc_keys, dtype=str),
+                doc_lengths=np.frombuffer(self.doc_lengths, dtype=np.uint32),
+                params=np.array([self.k1, self.b], dtype=np.float64),
+            )
+            os.replace(tmp_path, path)
+            self.path = path
+            self._saved_docs = len(self.doc_keys)
+            self._disk_stat = self._stat(path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        stat = cls._stat(path)
+        with np.load(path, allow_pickle=False) as data:
+            k1, b = data['params']
+            index = cls(path, k1=float(k1), b=float(b))
+            terms = data['terms'].tolist()
+            offsets = data['offsets']
+            postings = data['postings'].tobytes()
+            index._postings = {term: bytearray(postings[offsets[i]:offsets[i + 1]]) for i, term in enumerate(terms)}
+            index._last_doc = dict(zip(terms, data['last_doc'].tolist()))
+            index._doc_freq = dict(zip(terms, data['doc_freq'].tolist()))
+            index.doc_keys = data['doc_keys'].tolist()
+            index.doc_lengths = array.array('I', data['doc_lengths'].astype(np.uint32).tobytes())
+        index._key_to_doc = {key: doc for doc, key in enumerate(index.doc_keys)}
+        index._total_length = int(sum(index.doc_lengths))
+        index._saved_docs = len(index.doc_keys)
+        index._disk_stat = stat
+        return index
+
+    @classmethod
+    def open(cls, path, **kwargs):
+        """Loads the index at `path` if it exists, or starts an empty one that saves there."""
+        if os.path.exists(path):
+            return cls.load(path)
+        return cls(path, **kwargs)
+
+
+def prefilter_papers(lexical_index, papers, queries, candidates=200, boost_terms=None, exclude_terms=None):
+    """
+    Narrows papers to the union of each query's top lexical matches.
+
+    Papers missing from the index are added first, so a fresh window can be filtered directly.
+
+    Args:
+        lexical_index (LexicalIndex): The index to search.
+        papers (list of dict): The papers to choose from.
+        queries (list of str): The research-interest texts.
+        candidates (int): The number of candidates kept per query.
+        boost_terms (list or dict, optional): Extra keywords, as in `LexicalIndex.search`.
+        exclude_terms (list of str, optional): Keywords whose papers are dropped.
+
+    Returns:
+        list of dict: The candidate papers, in their original order.
+    """
+    with span('prefilter'):
+        lexical_index.add(papers)
+        keys = [paper['id'] for paper in papers if paper.get('id') is not None]
+        selected = set()
+        for query in queries:
+            selected.update(key for key, _ in lexical_index.search(query, candidates, boost_terms, exclude_terms, keys))
+        return [paper for paper in papers if paper.get('id') in selected]
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def _config_to_jsonable(config):
+    """Turns a GenerateContentConfig, dict or None into something json.dumps can hash stably."""
+    if config is None:
+        return None
+    if isinstance(config, dict):
+        return config
+    if hasattr(config, 'model_dump'):
+        return config.model_dump(exclude_none=True, mode='json')
+    return str(config)
+
+
+def make_cache_key(model, config, prompt):
+    """
+    Hashes everything that determines an LLM response: the model name, the generation
+    config and the fully rendered prompt (which includes the paper text for summaries).
+    """
+    payload = json.dumps({'model': model, 'config': _config_to_jsonable(config), 'prompt': prompt},
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """
+    A persistent, content-addressed cache of LLM response texts backed by SQLite.
+
+    Entries expire after `ttl_seconds`; when the cache grows past `max_entries` or
+    `max_bytes`, the least recently used entries are evicted. SQLite's WAL mode lets
+    several processes share one cache file. Set `bypass` (or the environment variable
+    ARXIV_ASSISTANT_NO_LLM_CACHE=1) to skip reads while still recording fresh responses.
+    """
+
+    def __init__(self, path, ttl_seconds=30 * 86400, max_entries=None, max_bytes=None, bypass=None):
+        """
+        Args:
+            path (str): The SQLite database file.
+            ttl_seconds (float, optional): How long an entry stays valid. None keeps entries forever.
+            max_entries (int, optional): The maximum number of cached responses.
+            max_bytes (int, optional): The maximum total size of cached response texts.
+            bypass (bool, optional): Skip cache reads. Defaults to the ARXIV_ASSISTANT_NO_LLM_CACHE variable.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bypass = bypass if bypass is not None else os.getenv('ARXIV_ASSISTANT_NO_LLM_CACHE') == '1'
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL, size INTEGER NOT NULL,'
+            ' created REAL NOT NULL, last_access REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)')
+        self._conn.commit()
+
+    def get(self, key):
+        """Returns the cached response text for a key, or None on a miss, an expired entry or bypass."""
+        if self.bypass:
+            self.misses += 1
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute('SELECT response, created FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None or (self.ttl_seconds is not None and now - row[1] > self.ttl_seconds):
+                self.misses += 1
+                return None
+            self._conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response_text, model=None):
+        """Stores a response text and evicts old entries if the cache is over its limits."""
+        if not response_text:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, model, response, size, created, last_access)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                (key, model, response_text, len(response_text.encode('utf-8')), now, now),
+            )
+            self._conn.commit()
+        if self.max_entries is not None or self.max_bytes is not None:
+            self.evict()
+
+    def evict(self):
+        """
+        Removes expired entries, then least recently used ones until within the size limits.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        removed = 0
+        with self._lock:
+            if self.ttl_seconds is not None:
+                removed += self._conn.execute('DELETE FROM responses WHERE created < ?',
+                                              (time.time() - self.ttl_seconds,)).rowcount
+            if self.max_entries is not None:
+                removed += self._conn.execute(
+                    'DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access DESC'
+                    ' LIMIT -1 OFFSET ?)', (self.max_entries,)).rowcount
+            if self.max_bytes is not None:
+                total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+                if total > self.max_bytes:
+                    stale = []
+                    for key, size in self._conn.execute('SELECT key, size FROM responses ORDER BY last_access'):
+                        if total <= self.max_bytes:
+                            break
+                        stale.append((key,))
+                        total -= size
+                    self._conn.executemany('DELETE FROM responses WHERE key = ?', stale)
+                    removed += len(stale)
+            self._conn.commit()
+        return removed
+
+    def stats(self):
+        """Returns hit/miss counts for this process and the current size of the cache."""
+        with self._lock:
+            entries, total_bytes = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'bytes': total_bytes,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM responses')
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,23 +1,86 @@
 from google import genai
 from google.genai import types
 
-def generate_content_with_history(prompt, client, chat_session=None):
+from src.context_utils import estimate_tokens
+from src.instrumentation import count, span
+from src.llm_cache import make_cache_key
+
+DEFAULT_MODEL = 'gemini-2.0-flash'
+
+# Optional persistent response cache shared by every call below; see set_llm_cache.
+_llm_cache = None
+
+
+class CachedResponse:
+    """Stands in for a GenerateContentResponse when the text comes from the response cache."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+def record_llm_usage(prompt, response):
+    """
+    Counts a model call and its prompt and response tokens, taken from the response's usage
+    metadata when it has any and estimated from the text length otherwise.
+    """
+    usage = getattr(response, 'usage_metadata', None)
+    prompt_tokens = getattr(usage, 'prompt_token_count', None)
+    response_tokens = getattr(usage, 'candidates_token_count', None)
+    count('llm.requests')
+    count('llm.prompt_tokens', prompt_tokens if prompt_tokens is not None else estimate_tokens(str(prompt)))
+    count('llm.response_tokens',
+          response_tokens if response_tokens is not None else estimate_tokens(getattr(response, 'text', None) or ''))
+
+
+def set_llm_cache(cache):
+    """Installs (or, with None, removes) the LLMCache used by generate_content_with_history."""
+    global _llm_cache
+    _llm_cache = cache
+
+
+def get_llm_cache():
+    return _llm_cache
+
+
+def generate_content_with_history(prompt, client, chat_session=None, cache=None, use_cache=True, model=None,
+                                  config=None):
     """Generates content with chat history using genai.Client.
-    Accepts the 'client' object as an argument."""
+    Accepts the 'client' object as an argument.
+
+    If a response cache is given (or installed with set_llm_cache), a response for the same
+    model, generation config and prompt is returned from the cache without calling Gemini.
+    Chat history is not part of the key, so a cache hit is not added to the session history.
+    The key uses the `model` and `config` passed here: a session created here uses them (the
+    model defaults to DEFAULT_MODEL), while a caller passing its own session must also pass the
+    model it created the session with, or the response is not cached."""
     try:
         if chat_session is None:
             # Ensure client is valid before creating chat session
             if client is None:
                 print("Error: GenAI client is None in generate_content_with_history.")
                 return None, None
-            chat_session = client.chats.create(model='gemini-2.0-flash')
+            model = model or DEFAULT_MODEL
+            chat_session = client.chats.create(model=model, config=config)
         
         # Ensure chat_session is valid before sending message
         if chat_session is None:
             print("Error: Chat session is None before sending message.")
             return None, None
 
-        response = chat_session.send_message(prompt)
+        cache = cache if cache is not None else _llm_cache
+        cache_key = None
+        if cache is not None and use_cache and model is not None:
+            cache_key = make_cache_key(model, config, prompt)
+            cached_text = cache.get(cache_key)
+            if cached_text is not None:
+                count('llm.cache_hits')
+                return CachedResponse(cached_text), chat_session
+
+        with span('llm.request'):
+            response = chat_session.send_message(prompt)
+        record_llm_usage(prompt, response)
+        if cache_key is not None and getattr(response, 'text', None):
+            cache.put(cache_key, response.text, model=model)
         return response, chat_session
     except Exception as e:
         print(f"Error in generate_content_with_history: {e}")
@@ -40,25 +103,18 @@ def update_chat_config(chat_session, new_config):
     return chat_session
 
 
-def summarize_text_with_llm(text, client, chat_session, prompt="Placeholder prompt, actual prompt constructed below"):
-    """Summarizes the given text using a GenerativeModel with few-shot prompting."""
-    try:
-        new_config={
-            "max_output_tokens": 1024,
-            "temperature": 0.3,
-            "top_p": 0.8
-        }
-        if chat_session is None:
-            print("Error: chat_session is None when calling update_chat_config.")
-            return None
-
-        chat_session = update_chat_config(chat_session, new_config)
+# Generation settings for paper summaries.
+SUMMARY_GENERATION_CONFIG = {
+    "max_output_tokens": 1024,
+    "temperature": 0.3,
+    "top_p": 0.8
+}
 
-        # Few-shot examples - UPDATED FOR SECTIONED OUTPUT
-        few_shot_examples = [
-            {
-                "input": "This paper investigates the properties of dark matter halos using high-resolution N-body simulations. We find a strong correlation between halo concentration and formation time.",
-                "output": """**Title:** Dark Matter Halo Concentration and Formation Time
+# Few-shot examples - UPDATED FOR SECTIONED OUTPUT
+SUMMARY_FEW_SHOT_EXAMPLES = [
+    {
+        "input": "This paper investigates the properties of dark matter halos using high-resolution N-body simulations. We find a strong correlation between halo concentration and formation time.",
+        "output": """**Title:** Dark Matter Halo Concentration and Formation Time
 **Authors:** J. Doe, E. Black, et al.
 **ArXiv Link:** http://arxiv.org/abs/2401.12345v1
 
@@ -70,10 +126,10 @@ The methodology involved identifying dark matter halos at various cosmic epochs
 
 ### Key Findings
 The major finding is a strong, inverse correlation between a dark matter halo's final concentration and its formation time. Halos that formed earlier were found to be significantly more concentrated, suggesting that early assembly leads to denser inner structures."""
-            },
-            {
-                "input": "We present observations of a new exoplanet candidate using the Kepler space telescope. Photometric analysis indicates a planet with a radius of 2.5 Earth radii and an orbital period of 15 days.",
-                "output": """**Title:** Discovery and Characterization of Kepler-1234b
+    },
+    {
+        "input": "We present observations of a new exoplanet candidate using the Kepler space telescope. Photometric analysis indicates a planet with a radius of 2.5 Earth radii and an orbital period of 15 days.",
+        "output": """**Title:** Discovery and Characterization of Kepler-1234b
 **Authors:** A. Smith, B. Jones, et al.
 **ArXiv Link:** http://arxiv.org/abs/2402.67890v1
 
@@ -85,16 +141,17 @@ The methodology involved analyzing the high-precision light curves to identify p
 
 ### Key Findings
 The key finding is the discovery of Kepler-1234b, a new exoplanet candidate. Preliminary characterization suggests it has a radius of approximately 2.5 Earth radii and an orbital period of 15 days, placing it in the 'super-Earth' or 'mini-Neptune' category. This discovery contributes to understanding exoplanet demographics."""
-            }
-        ]
+    }
+]
 
-        # --- CORRECTED: Build example_prompt_text BEFORE constructing full_prompt ---
-        example_prompt_text = ""
-        for example in few_shot_examples:
-            example_prompt_text += f"Paper Input: {example['input']}\nSummary Output:\n{example['output']}\n\n"
 
-        # --- CORRECTED: Single definition of full_prompt ---
-        full_prompt = f"""Please summarize the following research paper. Your summary should be structured into clear sections using Markdown headings (e.g., '### Data Used', '### Methodology', '### Key Findings').
+def _build_summary_prompt_parts():
+    """Splits the few-shot summarization prompt into its static prefix and suffix around the paper text."""
+    example_prompt_text = ""
+    for example in SUMMARY_FEW_SHOT_EXAMPLES:
+        example_prompt_text += f"Paper Input: {example['input']}\nSummary Output:\n{example['output']}\n\n"
+
+    prefix = f"""Please summarize the following research paper. Your summary should be structured into clear sections using Markdown headings (e.g., '### Data Used', '### Methodology', '### Key Findings').
         For each summary, include:
         - **Paper Title**
         - **Short Author List**
@@ -110,11 +167,39 @@ The key finding is the discovery of Kepler-1234b, a new exoplanet candidate. Pre
         {example_prompt_text}
 
         Now, summarize the following research paper:
-        {text}
         """
+    suffix = """
+        """
+    return prefix, suffix
+
+
+# The few-shot prefix never changes, so it is rendered once at import rather than per paper.
+SUMMARY_PROMPT_PREFIX, SUMMARY_PROMPT_SUFFIX = _build_summary_prompt_parts()
+
+
+def build_summary_prompt(text):
+    """Builds the full few-shot summarization prompt for one paper's text."""
+    return SUMMARY_PROMPT_PREFIX + text + SUMMARY_PROMPT_SUFFIX
+
+
+def summarize_text_with_llm(text, client, chat_session, prompt="Placeholder prompt, actual prompt constructed below",
+                            cache=None, use_cache=True, model=DEFAULT_MODEL):
+    """Summarizes the given text using a GenerativeModel with few-shot prompting.
+    Repeated summaries of the same text are served from the response cache, if one is set;
+    `model` must name the model `chat_session` was created with, since it is part of the key."""
+    try:
+        if chat_session is None:
+            print("Error: chat_session is None when calling update_chat_config.")
+            return None
+
+        chat_session = update_chat_config(chat_session, SUMMARY_GENERATION_CONFIG)
+
+        full_prompt = build_summary_prompt(text)
 
         # Corrected call to generate_content_with_history - passing 'client' directly
-        response, chat_session = generate_content_with_history(full_prompt, client, chat_session)
+        response, chat_session = generate_content_with_history(full_prompt, client, chat_session,
+                                                               cache=cache, use_cache=use_cache, model=model,
+                                                               config=SUMMARY_GENERATION_CONFIG)
         
         if response is None or not hasattr(response, 'text') or not response.text:
             print(f"Warning: generate_content_with_history returned no text for summarization.")
@@ -0,0 +1,320 @@
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+
+from src.arxiv_utils import parse_arxiv_id
+
+# Matches arxiv.org and mirrors with the same /abs/ and /pdf/ layout.
+_ARXIV_URL_PATTERN = re.compile(r"/(?:abs|pdf)/(.+?)(?:\.pdf)?/?$")
+
+
+def paper_cache_key(url):
+    """
+    Builds the cache key for an arXiv abstract or PDF URL from its arXiv ID and version.
+
+    Returns:
+        tuple: (key, versioned), e.g. ('2504.06802v1', True) for both
+               'http://arxiv.org/abs/2504.06802v1' and 'http://export.arxiv.org/pdf/2504.06802v1.pdf'.
+               Old-style IDs have their slash replaced ('astro-ph_0601001v2'). Unversioned URLs
+               stand for the latest version and non-arXiv URLs are keyed by a hash; neither
+               counts as versioned.
+    """
+    match = _ARXIV_URL_PATTERN.search(url.strip())
+    if not match:
+        return 'url-' + hashlib.sha256(url.encode('utf-8')).hexdigest()[:32], False
+    arxiv_id, version = parse_arxiv_id(match.group(1))
+    key = re.sub(r'[^A-Za-z0-9.-]', '_', arxiv_id)
+    if version is None:
+        return key, False
+    return f"{key}v{version}", True
+
+
+class PaperCache:
+    """
+    A shared on-disk cache of paper PDFs and their extracted text.
+
+    Entries are keyed by arXiv ID and version. A given version of an arXiv paper never
+    changes, so versioned entries are served from disk without contacting arXiv; unversioned
+    entries (the latest version) are revalidated with a conditional request (If-None-Match /
+    If-Modified-Since) once they are older than `revalidate_after`. Files are written to a
+    temporary name and renamed into place, and a SQLite index in WAL mode records sizes,
+    validators and access times, so several processes can share one cache. When the cache
+    grows past `max_bytes`, the least recently used papers are evicted. A file that another
+    process evicted between the index lookup and the read counts as a miss.
+    """
+
+    def __init__(self, root, max_bytes=None, revalidate_after=86400):
+        """
+        Args:
+            root (str): The cache directory.
+            max_bytes (int, optional): The maximum total size of cached PDFs and texts.
+            revalidate_after (float): Seconds before an unversioned entry is checked with arXiv again.
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, 'index.sqlite'), check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS papers ('
+            ' key TEXT PRIMARY KEY, versioned INTEGER NOT NULL, etag TEXT, last_modified TEXT, sha256 TEXT,'
+            ' pdf_size INTEGER, text_size INTEGER, text_status TEXT, checked REAL NOT NULL, last_access REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS papers_last_access ON papers (last_access)')
+        self._conn.commit()
+
+    def _path(self, key, suffix):
+        # A two-character fan-out keeps directories small for large caches.
+        shard = hashlib.sha1(key.encode('utf-8')).hexdigest()[:2]
+        return os.path.join(self.root, 'objects', shard, key + suffix)
+
+    def _entry(self, key):
+        row = self._conn.execute(
+            'SELECT versioned, etag, last_modified, sha256, pdf_size, text_size, text_status, checked'
+            ' FROM papers WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('versioned', 'etag', 'last_modified', 'sha256', 'pdf_size', 'text_size', 'text_status',
+                         'checked'), row))
+
+    def _is_fresh(self, entry):
+        return bool(entry['versioned']) or time.time() - entry['checked'] < self.revalidate_after
+
+    def _touch(self, key):
+        self._conn.execute('UPDATE papers SET last_access = ? WHERE key = ?', (time.time(), key))
+        self._conn.commit()
+
+    def _write_atomically(self, path, source):
+        """Copies a file object (or writes bytes) to a temporary file beside `path`, then renames it into place."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                if isinstance(source, (bytes, bytearray)):
+                    chunks = (source,)
+                else:
+                    if hasattr(source, 'seek'):
+                        source.seek(0)
+                    chunks = iter(lambda: source.read(1024 * 1024), b'')
+                for chunk in chunks:
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return size, digest.hexdigest()
+
+    # --- PDFs ---
+
+    def pdf_path(self, url):
+        """Returns the path of a fresh cached PDF, or None."""
+        key, _ = paper_cache_key(url)
+        with self._lock:
+            entry = self._entry(key)
+            if entry is None or entry['pdf_size'] is None or not self._is_fresh(entry):
+                return None
+            path = self._path(key, '.pdf')
+            if not os.path.exists(path):
+                return None
+            self._touch(key)
+        return path
+
+    def get_pdf(self, url, allow_stale=False):
+        """
+        Opens a cached PDF.
+
+        Args:
+            url (str): The paper's abstract or PDF URL.
+            allow_stale (bool): Also return entries that are due for revalidation.
+
+        Returns:
+            file object or None: The PDF opened for binary reading (the caller closes it), or None on a miss.
+        """
+        key, _ = paper_cache_key(url)
+        with self._lock:
+            entry = self._entry(key)
+            if entry is None or entry['pdf_size'] is None or not (allow_stale or self._is_fresh(entry)):
+                self.misses += 1
+                return None
+            try:
+                pdf_file = open(self._path(key, '.pdf'), 'rb')
+            except FileNotFoundError:
+                self._conn.execute('UPDATE papers SET pdf_size = NULL WHERE key = ?', (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._touch(key)
+            self.hits += 1
+        return pdf_file
+
+    def conditional_headers(self, url):
+        """Returns If-None-Match / If-Modified-Since headers for revalidating a cached PDF ({} if none is cached)."""
+        key, _ = paper_cache_key(url)
+        with self._lock:
+            entry = self._entry(key)
+        headers = {}
+        if entry is not None and entry['pdf_size'] is not None and os.path.exists(self._path(key, '.pdf')):
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def mark_revalidated(self, url):
+        """Records that arXiv answered 304 Not Modified and returns the cached PDF, opened, or None."""
+        key, _ = paper_cache_key(url)
+        with self._lock:
+            self._conn.execute('UPDATE papers SET checked = ? WHERE key = ?', (time.time(), key))
+            self._conn.commit()
+            self.revalidated += 1
+        # Just confirmed as current, even if a zero revalidate_after makes every copy read as stale.
+        return self.get_pdf(url, allow_stale=True)
+
+    def put_pdf(self, url, source, etag=None, last_modified=None):
+        """
+        Stores a downloaded PDF, given as bytes or a binary file object, with its HTTP validators.
+
+        If the content differs from an earlier copy (an unversioned paper got a new version),
+        that copy's extracted text is dropped.
+
+        Returns:
+            str: The path of the cached PDF.
+        """
+        key, versioned = paper_cache_key(url)
+        path = self._path(key, '.pdf')
+        size, sha256 = self._write_atomically(path, source)
+        now = time.time()
+        with self._lock:
+            entry = self._entry(key)
+            if entry is not None and entry['sha256'] not in (None, sha256):
+                self._remove_file(self._path(key, '.txt'))
+                self._conn.execute('UPDATE papers SET text_size = NULL, text_status = NULL WHERE key = ?', (key,))
+            self._conn.execute(
+                'INSERT INTO papers (key, versioned, etag, last_modified, sha256, pdf_size, checked, last_access)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+                ' ON CONFLICT(key) DO UPDATE SET etag = excluded.etag, last_modified = excluded.last_modified,'
+                ' sha256 = excluded.sha256, pdf_size = excluded.pdf_size, checked = excluded.checked,'
+                ' last_access = excluded.last_access',
+                (key, int(versioned), etag, last_modified, sha256, size, now, now),
+            )
+            self._conn.commit()
+        if self.max_bytes is not None:
+            self.evict()
+        return path
+
+    # --- Extracted text ---
+
+    def get_text(self, url):
+        """Returns the cached extracted text of a paper, or None (also for entries due for revalidation)."""
+        key, _ = paper_cache_key(url)
+        with self._lock:
+            entry = self._entry(key)
+            if entry is None or entry['text_size'] is None or not self._is_fresh(entry):
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key, '.txt'), 'rb') as f:
+                    text = f.read().decode('utf-8')
+            except FileNotFoundError:
+                self._conn.execute('UPDATE papers SET text_size = NULL, text_status = NULL WHERE key = ?', (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._touch(key)
+            self.hits += 1
+        return text
+
+    def put_text(self, url, text, status=None):
+        """Stores a paper's extracted text, along with the extraction status."""
+        key, versioned = paper_cache_key(url)
+        size, _ = self._write_atomically(self._path(key, '.txt'), text.encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO papers (key, versioned, text_size, text_status, checked, last_access)'
+                ' VALUES (?, ?, ?, ?, ?, ?)'
+                ' ON CONFLICT(key) DO UPDATE SET text_size = excluded.text_size, text_status = excluded.text_status,'
+                ' last_access = excluded.last_access',
+                (key, int(versioned), size, status, now, now),
+            )
+            self._conn.commit()
+        if self.max_bytes is not None:
+            self.evict()
+
+    # --- Maintenance ---
+
+    def _remove_file(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """
+        Removes least recently used papers (PDF and text together) until the cache is within `max_bytes`.
+
+        Returns:
+            int: The number of papers removed.
+        """
+        if self.max_bytes is None:
+            return 0
+        with self._lock:
+            total = self._conn.execute(
+                'SELECT COALESCE(SUM(COALESCE(pdf_size, 0) + COALESCE(text_size, 0)), 0) FROM papers').fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            stale = []
+            for key, size in self._conn.execute(
+                    'SELECT key, COALESCE(pdf_size, 0) + COALESCE(text_size, 0) FROM papers ORDER BY last_access'):
+                if total <= self.max_bytes:
+                    break
+                stale.append(key)
+                total -= size
+            self._conn.executemany('DELETE FROM papers WHERE key = ?', [(key,) for key in stale])
+            self._conn.commit()
+        # Files are removed after their rows, so readers see a miss rather than a dangling entry.
+        for key in stale:
+            self._remove_file(self._path(key, '.pdf'))
+            self._remove_file(self._path(key, '.txt'))
+        return len(stale)
+
+    def stats(self):
+        """Returns hit/miss/revalidation counts for this process and the current size of the cache."""
+        with self._lock:
+            entries, pdfs, texts, total_bytes = self._conn.execute(
+                'SELECT COUNT(*), COUNT(pdf_size), COUNT(text_size),'
+                ' COALESCE(SUM(COALESCE(pdf_size, 0) + COALESCE(text_size, 0)), 0) FROM papers').fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidated': self.revalidated,
+            'entries': entries,
+            'pdfs': pdfs,
+            'texts': texts,
+            'bytes': total_bytes,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM papers')
+            self._conn.commit()
+        shutil.rmtree(os.path.join(self.root, 'objects'), ignore_errors=True)
+        os.makedirs(os.path.join(self.root, 'objects'), exist_ok=True)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
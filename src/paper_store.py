@@ -0,0 +1,482 @@
+import contextlib
+import datetime
+import glob
+import json
+import os
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshot writers are only serialized within a process.
+    fcntl = None
+
+STRING_FIELDS = ('id', 'title', 'abstract', 'comment', 'journal_ref', 'doi')
+
+
+class PaperRecord:
+    """A slotted, immutable-by-convention view of one paper's metadata."""
+
+    __slots__ = ('id', 'title', 'abstract', 'published', 'updated', 'authors', 'categories',
+                 'primary_category', 'links', 'comment', 'journal_ref', 'doi')
+
+    def __init__(self, id, title=None, abstract=None, published=None, updated=None, authors=(), categories=(),
+                 primary_category=None, links=(), comment=None, journal_ref=None, doi=None):
+        self.id = id
+        self.title = title
+        self.abstract = abstract
+        self.published = published
+        self.updated = updated
+        self.authors = tuple(authors)  # (name, affiliation) pairs
+        self.categories = tuple(categories)
+        self.primary_category = primary_category
+        self.links = tuple(links)
+        self.comment = comment
+        self.journal_ref = journal_ref
+        self.doi = doi
+
+    @classmethod
+    def from_dict(cls, metadata):
+        """Builds a record from a dict produced by `extract_arxiv_metadata`."""
+        return cls(
+            id=metadata.get('id'),
+            title=metadata.get('title'),
+            abstract=metadata.get('abstract'),
+            published=metadata.get('published'),
+            updated=metadata.get('updated'),
+            authors=[(author.get('name'), author.get('affiliation')) for author in metadata.get('authors') or []],
+            categories=metadata.get('categories') or (),
+            primary_category=metadata.get('primary_category'),
+            links=[dict(link) for link in metadata.get('links') or []],
+            comment=metadata.get('comment'),
+            journal_ref=metadata.get('journal_ref'),
+            doi=metadata.get('doi'),
+        )
+
+    def to_dict(self):
+        """Returns the record in the dict format produced by `extract_arxiv_metadata`."""
+        return {
+            'title': self.title,
+            'id': self.id,
+            'published': self.published,
+            'updated': self.updated,
+            'abstract': self.abstract,
+            'authors': [{'name': name, 'affiliation': affiliation} for name, affiliation in self.authors],
+            'categories': list(self.categories),
+            'primary_category': self.primary_category,
+            'links': [dict(link) for link in self.links],
+            'comment': self.comment,
+            'journal_ref': self.journal_ref,
+            'doi': self.doi,
+        }
+
+    def __repr__(self):
+        return f"PaperRecord(id={self.id!r}, title={self.title!r})"
+
+
+class StringColumn:
+    """
+    A nullable string column stored Arrow-style: one UTF-8 byte buffer plus an offsets array,
+    so a million abstracts cost one allocation instead of a million Python objects.
+    """
+
+    __slots__ = ('data', 'offsets', 'valid')
+
+    def __init__(self, data, offsets, valid):
+        self.data = data
+        self.offsets = offsets
+        self.valid = valid
+
+    @classmethod
+    def from_list(cls, values):
+        encoded = [value.encode('utf-8') if value is not None else b'' for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8).copy()
+        valid = np.array([value is not None for value in values], dtype=bool)
+        return cls(data, offsets, valid)
+
+    def __len__(self):
+        return len(self.valid)
+
+    def __getitem__(self, i):
+        if not self.valid[i]:
+            return None
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def to_list(self):
+        raw = self.data.tobytes()
+        return [raw[self.offsets[i]:self.offsets[i + 1]].decode('utf-8') if self.valid[i] else None
+                for i in range(len(self))]
+
+    def take(self, indices):
+        data, offsets = _take_lists(self.data, self.offsets, indices)
+        return StringColumn(data, offsets, self.valid[np.asarray(indices, dtype=np.int64)])
+
+    @classmethod
+    def concat(cls, columns):
+        return cls(np.concatenate([column.data for column in columns]),
+                   _concat_lists([column.offsets for column in columns]),
+                   np.concatenate([column.valid for column in columns]))
+
+    def arrays(self, prefix):
+        return {f'{prefix}.data': self.data, f'{prefix}.offsets': self.offsets, f'{prefix}.valid': self.valid}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix):
+        return cls(arrays[f'{prefix}.data'], arrays[f'{prefix}.offsets'], arrays[f'{prefix}.valid'])
+
+
+def _dictionary_encode(values, vocab_index, vocab):
+    """Maps values to int32 codes, growing `vocab` as needed; None becomes -1."""
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is None:
+            codes[i] = -1
+            continue
+        code = vocab_index.get(value)
+        if code is None:
+            code = vocab_index[value] = len(vocab)
+            vocab.append(value)
+        codes[i] = code
+    return codes
+
+
+def _to_datetime64(value):
+    if not value:
+        return np.datetime64('NaT', 's')
+    return np.datetime64(value.rstrip('Z'), 's')
+
+
+def _from_datetime64(value):
+    if np.isnat(value):
+        return None
+    return str(value.astype('datetime64[s]')) + 'Z'
+
+
+def _list_offsets(lengths):
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def _take_lists(values, offsets, indices):
+    """Gathers variable-length list rows from a flat values array and returns (values, offsets)."""
+    indices = np.asarray(indices, dtype=np.int64)
+    starts = offsets[indices]
+    lengths = offsets[indices + 1] - starts
+    new_offsets = _list_offsets(lengths)
+    gathered = np.arange(new_offsets[-1]) - np.repeat(new_offsets[:-1] - starts, lengths)
+    return values[gathered], new_offsets
+
+
+def _merge_vocabularies(vocabularies):
+    """Merges vocab lists and returns (merged vocab, one old-code -> new-code array per input)."""
+    merged, index = [], {}
+    remaps = []
+    for vocab in vocabularies:
+        # The extra trailing slot maps the null code -1 to -1.
+        remap = np.append(_dictionary_encode(vocab, index, merged), np.int32(-1))
+        remaps.append(remap)
+    return merged, remaps
+
+
+def _concat_lists(offset_arrays):
+    offsets = [np.zeros(1, dtype=np.int64)]
+    base = 0
+    for array in offset_arrays:
+        offsets.append(array[1:] + base)
+        base += array[-1]
+    return np.concatenate(offsets)
+
+
+class PaperBatch:
+    """
+    A columnar batch of papers.
+
+    Scalar text fields are StringColumns and dates are datetime64 arrays. Categories,
+    author names and affiliations are dictionary-encoded into int32 codes, and the
+    per-paper author and category lists are stored as flat code arrays with offsets,
+    in the spirit of Arrow list columns. Filters work on whole arrays at once and
+    return boolean masks that can be combined with `&` and `|`.
+    """
+
+    def __init__(self, columns, published, updated, category_vocab, category_codes, category_offsets,
+                 primary_category_codes, author_vocab, affiliation_vocab, author_codes, affiliation_codes,
+                 author_offsets, links):
+        self.columns = columns
+        self.published = published
+        self.updated = updated
+        self.category_vocab = category_vocab
+        self.category_codes = category_codes
+        self.category_offsets = category_offsets
+        self.primary_category_codes = primary_category_codes
+        self.author_vocab = author_vocab
+        self.affiliation_vocab = affiliation_vocab
+        self.author_codes = author_codes
+        self.affiliation_codes = affiliation_codes
+        self.author_offsets = author_offsets
+        self.links = links  # StringColumn of JSON-encoded link lists; rarely read.
+
+    @classmethod
+    def from_dicts(cls, papers):
+        """Builds a batch from dicts produced by `extract_arxiv_metadata`."""
+        return cls.from_records([PaperRecord.from_dict(paper) for paper in papers])
+
+    @classmethod
+    def from_records(cls, records):
+        columns = {field: StringColumn.from_list([getattr(record, field) for record in records])
+                   for field in STRING_FIELDS}
+        published = np.array([_to_datetime64(record.published) for record in records], dtype='datetime64[s]')
+        updated = np.array([_to_datetime64(record.updated) for record in records], dtype='datetime64[s]')
+
+        category_vocab, category_index = [], {}
+        category_codes = _dictionary_encode([c for record in records for c in record.categories],
+                                            category_index, category_vocab)
+        category_offsets = _list_offsets([len(record.categories) for record in records])
+        primary_category_codes = _dictionary_encode([record.primary_category for record in records],
+                                                    category_index, category_vocab)
+
+        author_vocab, author_index = [], {}
+        affiliation_vocab, affiliation_index = [], {}
+        author_codes = _dictionary_encode([name for record in records for name, _ in record.authors],
+                                          author_index, author_vocab)
+        affiliation_codes = _dictionary_encode([aff for record in records for _, aff in record.authors],
+                                               affiliation_index, affiliation_vocab)
+        author_offsets = _list_offsets([len(record.authors) for record in records])
+        links = StringColumn.from_list([json.dumps(list(record.links)) if record.links else None for record in records])
+
+        return cls(columns, published, updated, category_vocab, category_codes, category_offsets,
+                   primary_category_codes, author_vocab, affiliation_vocab, author_codes, affiliation_codes,
+                   author_offsets, links)
+
+    def __len__(self):
+        return len(self.published)
+
+    def _list_at(self, codes, offsets, i):
+        return codes[offsets[i]:offsets[i + 1]]
+
+    def __getitem__(self, i):
+        """Materializes one paper as a PaperRecord."""
+        if i < 0:
+            i += len(self)
+        authors = [
+            (self.author_vocab[name] if name >= 0 else None, self.affiliation_vocab[aff] if aff >= 0 else None)
+            for name, aff in zip(self._list_at(self.author_codes, self.author_offsets, i),
+                                 self._list_at(self.affiliation_codes, self.author_offsets, i))
+        ]
+        primary = self.primary_category_codes[i]
+        links = self.links[i]
+        return PaperRecord(
+            authors=authors,
+            categories=[self.category_vocab[c] for c in self._list_at(self.category_codes, self.category_offsets, i)],
+            primary_category=self.category_vocab[primary] if primary >= 0 else None,
+            published=_from_datetime64(self.published[i]),
+            updated=_from_datetime64(self.updated[i]),
+            links=json.loads(links) if links else (),
+            **{field: self.columns[field][i] for field in STRING_FIELDS},
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_dicts(self):
+        return [record.to_dict() for record in self]
+
+    # --- Vectorized filters (each returns a boolean mask over the batch) ---
+
+    def _rows_of(self, offsets):
+        return np.repeat(np.arange(len(self)), np.diff(offsets))
+
+    def mask_category(self, *categories, primary_only=False):
+        """Selects papers listed under any of the given categories (or with it as primary category)."""
+        wanted = [self.category_vocab.index(c) for c in categories if c in self.category_vocab]
+        if primary_only:
+            return np.isin(self.primary_category_codes, wanted)
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self._rows_of(self.category_offsets)[np.isin(self.category_codes, wanted)]] = True
+        return mask
+
+    def mask_published(self, start=None, end=None):
+        """Selects papers published in [start, end); bounds are ISO dates or datetimes."""
+        mask = ~np.isnat(self.published)
+        if start is not None:
+            mask &= self.published >= np.datetime64(start, 's')
+        if end is not None:
+            mask &= self.published < np.datetime64(end, 's')
+        return mask
+
+    def mask_author(self, name_substring):
+        """Selects papers with an author whose name contains `name_substring` (case-insensitive)."""
+        needle = name_substring.lower()
+        wanted = [code for code, name in enumerate(self.author_vocab) if name and needle in name.lower()]
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self._rows_of(self.author_offsets)[np.isin(self.author_codes, wanted)]] = True
+        return mask
+
+    def take(self, indices):
+        """Returns a new batch with the given rows, sharing the vocabularies."""
+        indices = np.asarray(indices, dtype=np.int64)
+        category_codes, category_offsets = _take_lists(self.category_codes, self.category_offsets, indices)
+        author_codes, author_offsets = _take_lists(self.author_codes, self.author_offsets, indices)
+        affiliation_codes, _ = _take_lists(self.affiliation_codes, self.author_offsets, indices)
+        return PaperBatch(
+            {field: column.take(indices) for field, column in self.columns.items()},
+            self.published[indices], self.updated[indices], self.category_vocab, category_codes,
+            category_offsets, self.primary_category_codes[indices], self.author_vocab, self.affiliation_vocab,
+            author_codes, affiliation_codes, author_offsets, self.links.take(indices),
+        )
+
+    def filter(self, mask):
+        return self.take(np.flatnonzero(mask))
+
+    @classmethod
+    def concat(cls, batches):
+        """Concatenates batches (e.g., several daily snapshots) into one, re-coding their vocabularies."""
+        if not batches:
+            return cls.from_records([])
+        category_vocab, category_remaps = _merge_vocabularies([batch.category_vocab for batch in batches])
+        author_vocab, author_remaps = _merge_vocabularies([batch.author_vocab for batch in batches])
+        affiliation_vocab, affiliation_remaps = _merge_vocabularies([batch.affiliation_vocab for batch in batches])
+        return cls(
+            {field: StringColumn.concat([batch.columns[field] for batch in batches]) for field in STRING_FIELDS},
+            np.concatenate([batch.published for batch in batches]),
+            np.concatenate([batch.updated for batch in batches]),
+            category_vocab,
+            np.concatenate([remap[batch.category_codes] for remap, batch in zip(category_remaps, batches)]),
+            _concat_lists([batch.category_offsets for batch in batches]),
+            np.concatenate([remap[batch.primary_category_codes] for remap, batch in zip(category_remaps, batches)]),
+            author_vocab,
+            affiliation_vocab,
+            np.concatenate([remap[batch.author_codes] for remap, batch in zip(author_remaps, batches)]),
+            np.concatenate([remap[batch.affiliation_codes] for remap, batch in zip(affiliation_remaps, batches)]),
+            _concat_lists([batch.author_offsets for batch in batches]),
+            StringColumn.concat([batch.links for batch in batches]),
+        )
+
+    # --- Persistence ---
+
+    def save(self, path):
+        """Writes the batch to an uncompressed .npz file; loading reads the arrays back without parsing."""
+        arrays = {
+            'published': self.published.astype(np.int64),
+            'updated': self.updated.astype(np.int64),
+            'category_codes': self.category_codes,
+            'category_offsets': self.category_offsets,
+            'primary_category_codes': self.primary_category_codes,
+            'author_codes': self.author_codes,
+            'affiliation_codes': self.affiliation_codes,
+            'author_offsets': self.author_offsets,
+        }
+        for field, column in self.columns.items():
+            arrays.update(column.arrays(field))
+        arrays.update(self.links.arrays('links'))
+        arrays.update(StringColumn.from_list(self.category_vocab).arrays('category_vocab'))
+        arrays.update(StringColumn.from_list(self.author_vocab).arrays('author_vocab'))
+        arrays.update(StringColumn.from_list(self.affiliation_vocab).arrays('affiliation_vocab'))
+        # The temporary name must not end in .npz, or snapshot globs could pick up a partial file.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            arrays = {key: data[key] for key in data.files}
+        return cls(
+            {field: StringColumn.from_arrays(arrays, field) for field in STRING_FIELDS},
+            arrays['published'].astype('datetime64[s]'),
+            arrays['updated'].astype('datetime64[s]'),
+            StringColumn.from_arrays(arrays, 'category_vocab').to_list(),
+            arrays['category_codes'], arrays['category_offsets'], arrays['primary_category_codes'],
+            StringColumn.from_arrays(arrays, 'author_vocab').to_list(),
+            StringColumn.from_arrays(arrays, 'affiliation_vocab').to_list(),
+            arrays['author_codes'], arrays['affiliation_codes'], arrays['author_offsets'],
+            StringColumn.from_arrays(arrays, 'links'),
+        )
+
+
+_snapshot_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _locked_snapshots(snapshot_dir):
+    """Holds this process's snapshot lock and, where the platform allows, an exclusive lock on the directory."""
+    with _snapshot_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(snapshot_dir, 'lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def save_daily_snapshot(papers, snapshot_dir, date=None, name=None, merge=False):
+    """
+    Saves one day's papers as a columnar snapshot file named by date (and optional name, e.g. a category).
+
+    Args:
+        papers (list of dict or PaperBatch): The day's papers.
+        snapshot_dir (str): The directory holding all snapshots.
+        date (datetime.date, optional): The snapshot date. Defaults to today.
+        name (str, optional): A suffix distinguishing several snapshots on the same day.
+        merge (bool): Add the papers to an existing snapshot of the same date and name instead of
+                      replacing it. Papers already in it (by arXiv ID, any version) are replaced.
+                      The read and the write happen under a lock on `snapshot_dir`, so concurrent
+                      runs merging into the same snapshot keep each other's papers.
+
+    Returns:
+        str: The path of the written snapshot.
+    """
+    batch = papers if isinstance(papers, PaperBatch) else PaperBatch.from_dicts(papers)
+    date = date or datetime.date.today()
+    os.makedirs(snapshot_dir, exist_ok=True)
+    filename = date.strftime('%Y%m%d') + (f"_{name}" if name else "") + '.npz'
+    path = os.path.join(snapshot_dir, filename)
+    with _locked_snapshots(snapshot_dir):
+        if merge and os.path.exists(path):
+            from src.arxiv_utils import parse_arxiv_id
+
+            existing = PaperBatch.load(path)
+            new_ids = {parse_arxiv_id(paper_id)[0] for paper_id in batch.columns['id'].to_list() if paper_id}
+            keep = [i for i, paper_id in enumerate(existing.columns['id'].to_list())
+                    if not paper_id or parse_arxiv_id(paper_id)[0] not in new_ids]
+            batch = PaperBatch.concat([existing.take(keep), batch])
+        batch.save(path)
+    return path
+
+
+def load_snapshots(snapshot_dir, start_date=None, end_date=None):
+    """
+    Loads and concatenates the snapshots whose date falls in [start_date, end_date].
+
+    Returns:
+        PaperBatch: All papers from the matching snapshots (empty if there are none).
+    """
+    batches = []
+    for path in sorted(glob.glob(os.path.join(snapshot_dir, '*.npz'))):
+        if '.tmp' in os.path.basename(path):
+            # A partial file from an interrupted save, e.g. '20260105.npz.1234.tmp.npz'.
+            continue
+        stamp = os.path.basename(path)[:8]
+        try:
+            day = datetime.datetime.strptime(stamp, '%Y%m%d').date()
+        except ValueError:
+            continue
+        if (start_date and day < start_date) or (end_date and day > end_date):
+            continue
+        batches.append(PaperBatch.load(path))
+    if len(batches) == 1:
+        return batches[0]
+    return PaperBatch.concat(batches)
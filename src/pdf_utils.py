@@ -1,19 +1,84 @@
 import PyPDF2
+import contextlib
+import io
 import os # For FileNotFoundError related to os.remove
+import shutil
+
+
+@contextlib.contextmanager
+def open_pdf_source(source):
+    """
+    Yields a binary file object for a PDF given as a path, raw bytes or an open file object.
+
+    Paths are opened (and closed afterwards); bytes are wrapped in a BytesIO; file objects
+    are rewound and passed through without being closed.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield io.BytesIO(source)
+    elif hasattr(source, 'read'):
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        yield source
+    else:
+        with open(source, 'rb') as pdf_file:
+            yield pdf_file
+
+
+def iter_pdf_pages(source, start_page=0, end_page=None):
+    """
+    Yields the text of each page as it is parsed, so callers can start work before the last page.
+
+    Args:
+        source: A PDF path, bytes, or a binary file object.
+        start_page (int): The first page to extract (0-based).
+        end_page (int, optional): One past the last page to extract. Defaults to the end of the document.
+
+    Yields:
+        str: The extracted text of each page, in order.
+    """
+    with open_pdf_source(source) as pdf_file:
+        yield from iter_reader_pages(PyPDF2.PdfReader(pdf_file), start_page, end_page)
+
+
+def iter_reader_pages(pdf_reader, start_page=0, end_page=None):
+    """Like `iter_pdf_pages`, for an already opened PyPDF2.PdfReader."""
+    n_pages = len(pdf_reader.pages)
+    end_page = n_pages if end_page is None else min(end_page, n_pages)
+    for page_num in range(start_page, end_page):
+        yield pdf_reader.pages[page_num].extract_text() or ""
+
 
 def extract_text_from_pdf(pdf_path):
-    """Extracts text content from a PDF file using PyPDF2."""
-    text = ""
+    """Extracts text content from a PDF path, bytes or binary file object using PyPDF2."""
     try:
-        with open(pdf_path, 'rb') as pdf_file:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text()
-        return text
+        # Joining once avoids re-copying the accumulated text for every page.
+        return "".join(iter_pdf_pages(pdf_path))
     except FileNotFoundError:
         print(f"Error: PDF file not found at {pdf_path}")
         return None
     except Exception as e:
         print(f"Error extracting text from PDF: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def spill_pdf_source(source, directory, name):
+    """
+    Returns a path to the PDF, so worker processes can each open it instead of receiving a copy.
+
+    Paths and files already on disk (e.g., opened from the paper cache) are used as they are;
+    bytes and in-memory buffers are written once to `directory`/`name`.pdf.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return source
+    file_name = getattr(source, 'name', None)
+    if isinstance(file_name, str) and os.path.isfile(file_name):
+        return file_name
+    path = os.path.join(directory, f"{name}.pdf")
+    with open(path, 'wb') as out:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            out.write(source)
+        else:
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            shutil.copyfileobj(source, out)
+    return path
@@ -0,0 +1,537 @@
+"""
+Pipeline stages shared by the command-line interface and the long-running service.
+
+Heavy dependencies (sentence-transformers, google-genai) are imported only inside the
+functions that need them, so commands such as `digest --cached` start instantly.
+"""
+import datetime
+import os
+import re
+import threading
+
+from src.instrumentation import count, span
+
+DEFAULT_CATEGORY = "astro-ph.GA"
+DEFAULT_INTERESTS = ("I'm interested in the connection between molecular gas and star formation in nearby "
+                     "galaxies, with a focus on dense molecular gas.")
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Politeness limits for arXiv and Gemini. Benchmarks against local stubs lift them.
+DEFAULT_LIMITS = {
+    'arxiv_api_delay': 3,              # Seconds between arXiv API requests.
+    'pdf_requests_per_second': 1 / 3,  # Shared across all concurrent PDF downloads.
+    'llm_requests_per_minute': 15,     # Shared across all concurrent summarization requests.
+}
+
+
+def get_cache_dir():
+    return os.getenv("ARXIV_ASSISTANT_CACHE_DIR", ".cache")
+
+
+class PipelineContext:
+    """
+    Lazily constructed, reusable resources: the embedding model, the Gemini client, the
+    on-disk caches and the run state. A CLI invocation pays only for what its command touches; the service keeps
+    one context alive so the model and clients stay warm between requests.
+
+    The corpus and lexical indexes are not thread-safe: code that may run concurrently (the
+    service) reads and writes them only while holding `index_lock`.
+    """
+
+    def __init__(self, cache_dir=None, embedding_model_name=EMBEDDING_MODEL_NAME, limits=None, embedding_model=None,
+                 client=None):
+        """
+        Args:
+            cache_dir (str, optional): Defaults to $ARXIV_ASSISTANT_CACHE_DIR or .cache.
+            embedding_model_name (str): The SentenceTransformer to load on first use.
+            limits (dict, optional): Overrides for DEFAULT_LIMITS.
+            embedding_model, client (optional): Prebuilt stand-ins (e.g., offline fakes for
+                                                benchmarks) used instead of loading the real ones.
+        """
+        self.cache_dir = cache_dir or get_cache_dir()
+        self.embedding_model_name = embedding_model_name
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self._embedding_model = embedding_model
+        self._client = client
+        self._embedding_cache = None
+        self._llm_cache = None
+        self._corpus_index = None
+        self._state = None
+        self._lexical_index = None
+        self._paper_cache = None
+        self.index_lock = threading.RLock()
+
+    @property
+    def embedding_model(self):
+        if self._embedding_model is None:
+            from sentence_transformers import SentenceTransformer
+            self._embedding_model = SentenceTransformer(self.embedding_model_name)
+        return self._embedding_model
+
+    @property
+    def client(self):
+        if self._client is None:
+            from google import genai
+            api_key = os.getenv("GOOGLE_API_KEY")
+            if api_key is None:
+                raise ValueError("GOOGLE_API_KEY environment variable not set. Please create a .env file with GOOGLE_API_KEY=YOUR_KEY.")
+            self._client = genai.Client(api_key=api_key)
+        return self._client
+
+    @property
+    def embedding_cache(self):
+        if self._embedding_cache is None:
+            from src.embedding_cache import EmbeddingCache
+            self._embedding_cache = EmbeddingCache(os.path.join(self.cache_dir, "embeddings"), self.embedding_model_name)
+        return self._embedding_cache
+
+    @property
+    def llm_cache(self):
+        if self._llm_cache is None:
+            from src.llm_cache import LLMCache
+            self._llm_cache = LLMCache(os.path.join(self.cache_dir, "llm_responses.sqlite"),
+                                       ttl_seconds=30 * 86400, max_bytes=200 * 1024 * 1024)
+        return self._llm_cache
+
+    @property
+    def corpus_index(self):
+        if self._corpus_index is None:
+            from src.corpus_index import CorpusIndex
+            self._corpus_index = CorpusIndex.open(os.path.join(self.cache_dir, "corpus"),
+                                                  self.embedding_model.get_sentence_embedding_dimension())
+        return self._corpus_index
+
+    @property
+    def lexical_index(self):
+        if self._lexical_index is None:
+            from src.lexical_index import LexicalIndex
+            self._lexical_index = LexicalIndex.open(os.path.join(self.cache_dir, "lexical_index.npz"))
+        return self._lexical_index
+
+    @property
+    def paper_cache(self):
+        if self._paper_cache is None:
+            from src.paper_cache import PaperCache
+            self._paper_cache = PaperCache(os.path.join(self.cache_dir, "papers"), max_bytes=2 * 1024 ** 3)
+        return self._paper_cache
+
+    @property
+    def state(self):
+        if self._state is None:
+            from src.state_store import PipelineState
+            self._state = PipelineState(os.path.join(self.cache_dir, "state.sqlite"))
+        return self._state
+
+    def snapshot_dir(self):
+        return os.path.join(self.cache_dir, "snapshots")
+
+    def digest_path(self, day, name):
+        """The saved digest for a day and a category (or a batch user's digest name)."""
+        return os.path.join(self.cache_dir, "digests", f"{day.strftime('%Y%m%d')}_{name}.md")
+
+
+def window_day(end_date):
+    """Returns the date a YYYYMMDDHHMM window end falls on, used to name snapshots and digests."""
+    return datetime.datetime.strptime(end_date[:8], "%Y%m%d").date()
+
+
+def user_digest_name(user_name):
+    """The digest name used for a batch user's digest, e.g. 'user_ashley'."""
+    return "user_" + re.sub(r'[^A-Za-z0-9_.-]+', '_', user_name)
+
+
+def fetch_papers(ctx, category, start_date, end_date, run=None, feed_info=None, embed=True):
+    """
+    Fetches, embeds and stores every paper in a category and window.
+
+    Papers are embedded page by page as the feed streams in, added to the corpus and lexical
+    indexes, and saved as a columnar daily snapshot.
+
+    Args:
+        run (dict, optional): A run from `ctx.state`. Papers that earlier runs of the same name
+                              ingested from this category are skipped, and new ones are recorded.
+        feed_info (dict, optional): Passed to `iter_arxiv_feed`; 'complete' tells whether the
+                                    whole window was fetched.
+        embed (bool): If False, papers are only indexed lexically, for ranking with a prefilter
+                      that embeds just the candidates.
+
+    Returns:
+        tuple: (papers, embeddings) for the papers that have an ID and an abstract. The
+               embeddings are None if `embed` is False.
+    """
+    from src.arxiv_utils import iter_arxiv_feed
+    from src.paper_store import save_daily_snapshot
+    from src.ranking_utils import encode_paper_stream
+
+    feed = iter_arxiv_feed(category, start_date, end_date, delay=ctx.limits['arxiv_api_delay'], feed_info=feed_info)
+    if run is not None:
+        feed = skip_known_papers(ctx.state, feed, run, category)
+    with span('fetch'):
+        if embed:
+            papers, embeddings = encode_paper_stream(feed, ctx.embedding_model, cache=ctx.embedding_cache)
+        else:
+            papers = [paper for paper in feed if paper.get('id') is not None and paper.get('abstract') is not None]
+            embeddings = None
+    if run is not None:
+        ctx.state.record_papers(papers, 'embedded' if embed else 'fetched', run['run_id'])
+        ctx.state.record_ingested(run, category, [paper['id'] for paper in papers])
+    if papers:
+        with ctx.index_lock:
+            if embed:
+                ctx.corpus_index.add([paper['id'] for paper in papers], embeddings)
+                ctx.corpus_index.save()
+            if ctx.lexical_index.add(papers):
+                ctx.lexical_index.save()
+        # Keep a compact columnar copy of the day's metadata for later filtering and corpus search.
+        # Merge, since a rerun over the same window only brings the papers it had not seen.
+        save_daily_snapshot(papers, ctx.snapshot_dir(), window_day(end_date), name=category, merge=True)
+    return papers, embeddings
+
+
+def skip_known_papers(state, papers, run, feed):
+    """Drops papers that an earlier run of the same name ingested from `feed`, so each run handles only new submissions."""
+    for paper in papers:
+        if paper.get('id') is None or not state.is_known(paper['id'], run, feed):
+            yield paper
+
+
+def incremental_window(ctx, feeds, run_name):
+    """
+    Returns the run to work on: the unfinished run named `run_name` if one exists (so a crashed
+    run resumes where it stopped), otherwise a new run from the earliest of its watermarks for
+    `feeds` (one category or a list of them) to the end of the latest arXiv window. A feed without a
+    watermark starts from the latest window.
+
+    Returns:
+        dict or None: The run, or None if there is nothing new since the watermarks.
+    """
+    from src.arxiv_utils import get_arxiv_dates
+
+    state = ctx.state
+    run = state.unfinished_run(run_name)
+    if run is not None:
+        print(f"Resuming {run_name} for {run['start_date']}-{run['end_date']} (last completed step: {run['status']}).")
+        return run
+    feeds = [feeds] if isinstance(feeds, str) else list(feeds)
+    default_start, end_date = get_arxiv_dates()
+    start_date = min(state.get_watermark(run_name, feed) or default_start for feed in feeds)
+    if start_date >= end_date:
+        print(f"No new submissions for {', '.join(feeds)} since {start_date}.")
+        return None
+    if start_date < default_start:
+        print(f"Catching up on {', '.join(feeds)} from {start_date}.")
+    return state.start_run(run_name, start_date, end_date)
+
+
+def load_papers(ctx, category, end_date, fetch_missing=True, start_date=None, embed=True):
+    """
+    Loads a day's papers from its snapshot, with embeddings from the embedding cache.
+
+    When the cache already holds every abstract, the embedding model is never loaded. If no
+    snapshot exists and `fetch_missing` is set, the papers are fetched from arXiv instead.
+    With `embed` False, no embeddings are loaded or computed.
+
+    Returns:
+        tuple: (papers, embeddings), or ([], None) if nothing is available.
+    """
+    from src.paper_store import PaperBatch
+    from src.ranking_utils import encode_papers
+
+    day = window_day(end_date)
+    path = os.path.join(ctx.snapshot_dir(), f"{day.strftime('%Y%m%d')}_{category}.npz")
+    if os.path.exists(path):
+        papers = PaperBatch.load(path).to_dicts()
+        papers = [paper for paper in papers if paper['abstract'] is not None and paper['id'] is not None]
+        if not papers or not embed:
+            return papers, None
+        # The model is a lazy property, so it is only constructed on a cache miss.
+        model = LazyEmbeddingModel(ctx)
+        return papers, encode_papers(papers, model, cache=ctx.embedding_cache)
+    if fetch_missing and start_date is not None:
+        return fetch_papers(ctx, category, start_date, end_date, embed=embed)
+    return [], None
+
+
+class LazyEmbeddingModel:
+    """Defers constructing the embedding model until `encode` is actually called."""
+
+    def __init__(self, ctx):
+        self._ctx = ctx
+
+    def encode(self, *args, **kwargs):
+        return self._ctx.embedding_model.encode(*args, **kwargs)
+
+
+def build_review_prompt(top_relevant_papers, research_interests):
+    """Builds the prompt asking the LLM to pick the most relevant papers from the pre-ranked list."""
+    llm_prompt_content = f"""Based on your research interests: "{research_interests}", please review the following arXiv paper metadata and identify the most relevant ones. The papers are pre-ranked based on the semantic similarity of their abstracts to your interests.
+
+    ArXiv Paper Metadata (Top Relevant):
+    """
+    for i, item in enumerate(top_relevant_papers):
+        paper = item['metadata']
+        llm_prompt_content += f"""
+    --- Paper {i+1} (Similarity: {item['similarity']:.4f}) ---
+    Title: {paper['title']}
+    ArXiv ID: {paper['id']}
+    Authors: {', '.join([author['name'] for author in paper['authors']])}
+    Publish Date: {paper['published']}
+    Abstract: {paper['abstract']}
+    Categories: {', '.join(paper['categories'])}
+    """
+
+    llm_prompt_content += f"""
+
+    Based on the above metadata (ranked by abstract similarity), please identify the top 3 papers that would be of most interest, considering both the similarity score and the content of the abstract. For each of these top 3 papers, list the **Title**, **Similarity**, **ArXiv ID**, **Author List**, **ArXiv Publish Date**, **Abstract**, and a brief **Reasoning** explaining why it aligns with the research interests: "{research_interests}". Format your response in Markdown, with each piece of metadata on a new line.
+    """
+    return llm_prompt_content
+
+
+def review_top_papers(ctx, top_relevant_papers, research_interests):
+    """Asks Gemini to review the pre-ranked papers. Returns the response text or None."""
+    from src.llm_utils import generate_content_with_history
+
+    prompt = build_review_prompt(top_relevant_papers, research_interests)
+    try:
+        response_from_llm, _ = generate_content_with_history(prompt, ctx.client, chat_session=None, cache=ctx.llm_cache)
+        return response_from_llm.text if response_from_llm is not None else None
+    except Exception as e:
+        print(f"An error occurred while generating the LLM response: {e}")
+        return None
+
+
+def summarize_paper_urls(ctx, arxiv_urls, token_budget=6000, state=None):
+    """
+    Downloads, extracts and summarizes papers.
+
+    PDFs are fetched concurrently into memory, parsed in sandboxed worker processes with
+    time and memory limits, reduced to their most relevant sections, and summarized with
+    independent concurrent requests. PDFs and extracted texts are kept in the shared paper
+    cache, so a paper another run or user already processed costs a disk read. With a `state`,
+    each completed stage is recorded as it finishes, and papers that already have a summary or
+    cleanly extracted text skip those stages.
+
+    Returns:
+        list of dict: {'arxiv_url', 'downloaded', 'summary'} for each paper, in input order.
+                      'summary' is None if the paper could not be summarized.
+    """
+    from src.arxiv_utils import convert_abs_url_to_pdf_url
+    from src.context_utils import select_context
+    from src.download_utils import download_pdfs
+    from src.extraction_runner import (STATUS_OK, STATUS_TRUNCATED, extract_texts_sandboxed,
+                                       report_extraction_problems)
+    from src.llm_utils import build_summary_prompt
+    from src.state_store import stage_reached
+    from src.summarize_executor import SummarizationExecutor
+
+    if not arxiv_urls:
+        return []
+    progress = state.get_progress(arxiv_urls) if state is not None else {}
+    downloaded = {url: stage_reached(progress.get(url), 'downloaded') for url in arxiv_urls}
+    # Only clean extractions keep their text in the state; the rest are extracted again.
+    texts = {url: progress[url]['text'] for url in arxiv_urls
+             if stage_reached(progress.get(url), 'extracted') and progress[url]['text'] is not None}
+    summaries = {url: progress[url]['summary'] for url in arxiv_urls if stage_reached(progress.get(url), 'summarized')}
+
+    pending = [url for url in arxiv_urls if url not in texts and url not in summaries]
+    if len(pending) < len(arxiv_urls):
+        print(f"Reusing earlier progress for {len(arxiv_urls) - len(pending)} of {len(arxiv_urls)} papers.")
+    if pending:
+        paper_cache = ctx.paper_cache
+        for url in pending:
+            text = paper_cache.get_text(url)
+            if text:
+                texts[url] = text
+                downloaded[url] = True
+                if state is not None:
+                    # The text stays in the paper cache, which a resumed run reads again.
+                    state.mark_stage(url, 'extracted')
+        cached = [url for url in pending if url in texts]
+        count('paper_cache.text_hits', len(cached))
+        if cached:
+            print(f"Read the extracted text of {len(cached)} papers from the paper cache.")
+            pending = [url for url in pending if url not in texts]
+    if pending:
+        pdf_urls = [convert_abs_url_to_pdf_url(arxiv_url) for arxiv_url in pending]
+        print(f"\nDownloading {len(pdf_urls)} PDFs concurrently...")
+        with span('download'):
+            pdf_buffers = download_pdfs(pdf_urls, max_workers=4, cache=paper_cache,
+                                        requests_per_second=ctx.limits['pdf_requests_per_second'])
+        for url, pdf_buffer in zip(pending, pdf_buffers):
+            downloaded[url] = bool(pdf_buffer)
+            if state is not None:
+                state.mark_stage(url, 'downloaded' if pdf_buffer else None,
+                                 error=None if pdf_buffer else "download failed")
+
+        with span('extract'):
+            extraction_results = extract_texts_sandboxed(pdf_buffers, max_workers=4)
+        count('extract.papers', sum(result is not None for result in extraction_results))
+        count('extract.pages', sum(result['pages_extracted'] for result in extraction_results if result))
+        for pdf_buffer in pdf_buffers:
+            if pdf_buffer:
+                pdf_buffer.close()
+        report_extraction_problems(extraction_results, labels=pending)
+        for url, result in zip(pending, extraction_results):
+            if result and result['text']:
+                texts[url] = result['text']
+                # Fallback and partial texts are not cached, as they may stem from a transient timeout.
+                if result['status'] in (STATUS_OK, STATUS_TRUNCATED):
+                    paper_cache.put_text(url, result['text'], result['status'])
+                if state is not None:
+                    # Fallback, partial and truncated texts are not reused by a resumed run.
+                    state.mark_stage(url, 'extracted', text=result['text'] if result['status'] == STATUS_OK else None)
+            elif result and state is not None:
+                state.mark_stage(url, None, error=f"extraction {result['status']}: {result['reason']}")
+
+    to_summarize = [url for url in arxiv_urls if url not in summaries and url in texts]
+    if to_summarize:
+        # References, appendices and boilerplate are dropped and the remaining passages are
+        # trimmed to those closest to the summary headings before the text reaches the prompt.
+        # Responses that arrived before a crash are answered from the LLM cache on the rerun.
+        embedding_model = ctx.embedding_model
+
+        def build_prompt(text):
+            with span('context'):
+                context = select_context(text, embedding_model, token_budget=token_budget)
+            return build_summary_prompt(context)
+
+        summarizer = SummarizationExecutor(
+            ctx.client, max_concurrency=4, requests_per_minute=ctx.limits['llm_requests_per_minute'],
+            cache=ctx.llm_cache, prompt_builder=build_prompt,
+        )
+        with span('summarize'):
+            new_summaries = summarizer.summarize_all([texts[url] for url in to_summarize])
+        for url, summary in zip(to_summarize, new_summaries):
+            summaries[url] = summary
+            if state is not None:
+                state.mark_stage(url, 'summarized' if summary else None,
+                                 summary=summary, error=None if summary else "summarization failed")
+    return [
+        {'arxiv_url': url, 'downloaded': downloaded[url], 'summary': summaries.get(url)}
+        for url in arxiv_urls
+    ]
+
+
+def format_summary_entries(results):
+    """Turns `summarize_paper_urls` results into numbered digest entries (or failure notes)."""
+    entries = []
+    for i, result in enumerate(results):
+        if not result['downloaded']:
+            entries.append(f"Failed to download PDF for Paper {i+1}\n")
+        elif result['summary']:
+            entries.append(f"**Paper {i+1}: {result['summary']}\n")
+        else:
+            entries.append(f"Failed to generate summary for Paper {i+1}\n")
+    return entries
+
+
+def summarize_papers(ctx, arxiv_urls, token_budget=6000):
+    """
+    Summarizes papers with `summarize_paper_urls`.
+
+    Returns:
+        list of str: One digest entry per paper (a summary or a failure note), in input order.
+    """
+    return format_summary_entries(summarize_paper_urls(ctx, arxiv_urls, token_budget))
+
+
+def format_digest(summary_entries):
+    return "Good morning! Here's a quick look at some papers you might find relevant\n\n" + "\n".join(summary_entries)
+
+
+def save_digest(ctx, day, name, digest):
+    path = ctx.digest_path(day, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(digest)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_cached_digest(ctx, day, name):
+    """Returns the saved digest for a day and category (or batch user), or None. Needs no heavy imports."""
+    path = ctx.digest_path(day, name)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def load_run_papers(ctx, run, embed=True):
+    """Reloads a resumed run's papers from the state store, with embeddings from the embedding cache."""
+    from src.ranking_utils import encode_papers
+
+    papers = ctx.state.get_papers(run.get('papers', []))
+    if not papers or not embed:
+        return papers, None
+    return papers, encode_papers(papers, LazyEmbeddingModel(ctx), cache=ctx.embedding_cache)
+
+
+def run_digest(ctx, category=DEFAULT_CATEGORY, research_interests=DEFAULT_INTERESTS, top_k=5, prefilter=None,
+               boost_terms=None, exclude_terms=None):
+    """
+    Runs the fetch -> rank -> review -> summarize pipeline and saves the digest.
+
+    Only papers submitted since this category's digest last ran are fetched, so a run after a gap
+    covers every missed day and a repeated run finds nothing new. Each step is recorded in
+    `ctx.state`, and a run that stopped partway resumes from its last completed step.
+
+    With `prefilter` set, papers are narrowed to that many BM25 candidates (with optional
+    boost and exclusion keywords) and only the candidates are embedded, which keeps large
+    catch-up windows cheap.
+    """
+    from src.ranking_utils import rank_papers
+
+    print(f"Your research interests are: {research_interests}")
+    state = ctx.state
+    run = incremental_window(ctx, category, f"digest:{category}")
+    if run is None:
+        return None
+    start_date, end_date = run['start_date'], run['end_date']
+    print(f"Start date (YYYYMMDDHHMM): {start_date}")
+    print(f"End date (YYYYMMDDHHMM): {end_date}")
+
+    if run['status'] == 'started':
+        feed_info = {}
+        papers, embeddings = fetch_papers(ctx, category, start_date, end_date, run=run, feed_info=feed_info,
+                                          embed=not prefilter)
+        state.update_run(run, 'fetched', papers=[paper['id'] for paper in papers])
+        # The watermark only moves once the whole window has been fetched; otherwise the next
+        # run asks for the same window again and skips the papers this run already has.
+        if feed_info.get('complete'):
+            state.set_watermark(run['name'], category, end_date)
+    else:
+        papers, embeddings = load_run_papers(ctx, run, embed=not prefilter)
+
+    if run['status'] == 'fetched':
+        top_relevant_papers = rank_papers(
+            papers, research_interests, ctx.embedding_model, top_k=top_k, paper_embeddings=embeddings,
+            cache=ctx.embedding_cache, lexical_index=ctx.lexical_index if prefilter else None, candidates=prefilter,
+            boost_terms=boost_terms, exclude_terms=exclude_terms,
+        ) if papers else []
+        state.update_run(run, 'ranked', selected=[[item['metadata']['id'], item['similarity']]
+                                                  for item in top_relevant_papers])
+    else:
+        by_id = {paper['id']: paper for paper in papers}
+        top_relevant_papers = [{'metadata': by_id[paper_id], 'similarity': similarity}
+                               for paper_id, similarity in run['selected'] if paper_id in by_id]
+
+    if not top_relevant_papers:
+        print("No new arXiv papers were found since the last run, so the LLM cannot identify papers of interest.")
+        state.update_run(run, 'done')
+        return None
+
+    review = review_top_papers(ctx, top_relevant_papers, research_interests)
+    if review:
+        print("\n--- LLM Response: Top Relevant Papers (Based on Embeddings and LLM Review) ---\n")
+        print(review)
+
+    arxiv_urls = [item['metadata']['id'] for item in top_relevant_papers]
+    digest = format_digest(format_summary_entries(summarize_paper_urls(ctx, arxiv_urls, state=state)))
+    save_digest(ctx, window_day(end_date), category, digest)
+    state.update_run(run, 'done')
+    print("\n--- All Paper Summaries ---")
+    print(digest)
+    print(f"LLM response cache: {ctx.llm_cache.stats()}")
+    return digest
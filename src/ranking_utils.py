@@ -0,0 +1,205 @@
+import numpy as np
+
+from src.embedding_cache import make_cache_key
+from src.instrumentation import count, span
+from src.lexical_index import prefilter_papers
+
+
+def encode_texts(embedding_model, texts, batch_size=64):
+    """
+    Encodes a list of texts in one batched call and returns unit-length vectors.
+
+    Args:
+        embedding_model: A SentenceTransformer (or any object with a compatible `encode` method).
+        texts (list of str): The texts to embed.
+        batch_size (int): The batch size passed through to the model.
+
+    Returns:
+        numpy.ndarray: A (len(texts), dim) float32 array of L2-normalized embeddings.
+    """
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    embeddings = embedding_model.encode(
+        list(texts),
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False,
+    )
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+
+def normalize_rows(matrix):
+    """L2-normalizes each row of a 2-D array, leaving all-zero rows untouched."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_indices(scores, k):
+    """
+    Selects the indices of the k highest scores in each row of a score matrix.
+
+    Uses argpartition so only the k winners are sorted, rather than the whole row.
+
+    Args:
+        scores (numpy.ndarray): A (n_profiles, n_papers) score matrix.
+        k (int): The number of indices to keep per row.
+
+    Returns:
+        numpy.ndarray: A (n_profiles, min(k, n_papers)) array of column indices,
+                       ordered from highest to lowest score.
+    """
+    n_papers = scores.shape[1]
+    k = min(k, n_papers)
+    if k <= 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    if k < n_papers:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(n_papers), (scores.shape[0], 1))
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def score_profiles(profile_embeddings, paper_embeddings, top_k=5):
+    """
+    Scores every paper against every research-interest profile with one matrix multiply.
+
+    Both inputs are expected to be L2-normalized, so the dot product is the cosine similarity.
+
+    Args:
+        profile_embeddings (numpy.ndarray): A (n_profiles, dim) array.
+        paper_embeddings (numpy.ndarray): A (n_papers, dim) array.
+        top_k (int): The number of papers to keep per profile.
+
+    Returns:
+        tuple: (indices, scores), each of shape (n_profiles, min(top_k, n_papers)),
+               with indices into `paper_embeddings` ordered by descending similarity.
+    """
+    profile_embeddings = np.atleast_2d(profile_embeddings)
+    scores = profile_embeddings @ paper_embeddings.T
+    indices = top_k_indices(scores, top_k)
+    return indices, np.take_along_axis(scores, indices, axis=1)
+
+
+def encode_papers(papers, embedding_model, batch_size=64, cache=None, flush=True):
+    """
+    Encodes paper abstracts, reading from and filling an embedding cache if one is given.
+
+    Args:
+        papers (list of dict): Paper metadata with non-empty 'id' and 'abstract' fields.
+        embedding_model: The SentenceTransformer used on cache misses.
+        batch_size (int): The batch size used when encoding.
+        cache (EmbeddingCache, optional): The store to consult before calling the model.
+        flush (bool): Write the cache index before returning.
+
+    Returns:
+        numpy.ndarray: A (len(papers), dim) float32 array of normalized embeddings.
+    """
+    abstracts = [paper['abstract'] for paper in papers]
+    with span('embed'):
+        if cache is None:
+            count('embed.papers', len(abstracts))
+            return encode_texts(embedding_model, abstracts, batch_size)
+
+        encoded = []
+
+        def encode_misses(texts):
+            encoded.append(len(texts))
+            return encode_texts(embedding_model, texts, batch_size)
+
+        keys = [make_cache_key(paper['id'], paper['abstract']) for paper in papers]
+        embeddings = cache.get_or_encode(keys, abstracts, encode_misses, flush=flush)
+        count('embed.papers', sum(encoded))
+        count('embedding_cache.hits', len(abstracts) - sum(encoded))
+        return embeddings
+
+
+def encode_paper_stream(papers, embedding_model, batch_size=64, cache=None, chunk_size=200):
+    """
+    Embeds papers from an iterator in chunks as they arrive, so encoding overlaps with fetching.
+
+    Papers without an 'id' or 'abstract' are dropped.
+
+    Args:
+        papers (iterable of dict): Paper metadata, e.g. from `iter_arxiv_feed`.
+        embedding_model: The SentenceTransformer used to embed abstracts.
+        batch_size (int): The batch size used when encoding.
+        cache (EmbeddingCache, optional): The store to consult before calling the model.
+        chunk_size (int): The number of papers collected before each encoding call.
+
+    Returns:
+        tuple: (papers, embeddings), the kept papers and a matching (n, dim) array.
+    """
+    kept, chunks, pending = [], [], []
+    for paper in papers:
+        if paper.get('abstract') is None or paper.get('id') is None:
+            continue
+        pending.append(paper)
+        if len(pending) >= chunk_size:
+            chunks.append(encode_papers(pending, embedding_model, batch_size, cache, flush=False))
+            kept.extend(pending)
+            pending = []
+    if pending:
+        chunks.append(encode_papers(pending, embedding_model, batch_size, cache, flush=False))
+        kept.extend(pending)
+    if cache is not None:
+        # The index is written once per stream rather than once per chunk.
+        cache.flush()
+    if not chunks:
+        return [], np.zeros((0, 0), dtype=np.float32)
+    return kept, np.concatenate(chunks)
+
+
+def rank_papers(papers, research_interests, embedding_model, top_k=5, batch_size=64, paper_embeddings=None, cache=None,
+                lexical_index=None, candidates=200, boost_terms=None, exclude_terms=None):
+    """
+    Ranks papers against one or more research-interest profiles.
+
+    Args:
+        papers (list of dict): Paper metadata as produced by `extract_arxiv_metadata`.
+        research_interests (str or list of str): One interest string, or one per profile.
+        embedding_model: The SentenceTransformer used to embed abstracts and interests.
+        top_k (int): The number of papers to return per profile.
+        batch_size (int): The batch size used when encoding.
+        paper_embeddings (numpy.ndarray, optional): Precomputed normalized embeddings, one row
+                                                    per paper in `papers`. If omitted, abstracts
+                                                    are encoded here.
+        cache (EmbeddingCache, optional): An embedding store consulted before encoding abstracts.
+        lexical_index (LexicalIndex, optional): If given (and `paper_embeddings` is not), papers are
+                                                first narrowed to each profile's top `candidates`
+                                                BM25 matches, and only those are embedded and reranked.
+        candidates (int): The number of lexical candidates kept per profile.
+        boost_terms (list or dict, optional): Keywords that raise a paper's lexical score.
+        exclude_terms (list of str, optional): Keywords whose papers are never candidates.
+
+    Returns:
+        list: For a single interest string, a list of {'metadata', 'similarity'} dicts ordered
+              by similarity. For a list of interests, one such list per profile.
+    """
+    single_profile = isinstance(research_interests, str)
+    profiles = [research_interests] if single_profile else list(research_interests)
+
+    if paper_embeddings is None:
+        papers = [paper for paper in papers if paper.get('abstract') is not None and paper.get('id') is not None]
+        if lexical_index is not None:
+            papers = prefilter_papers(lexical_index, papers, profiles, candidates, boost_terms, exclude_terms)
+        paper_embeddings = encode_papers(papers, embedding_model, batch_size, cache)
+
+    if not papers or not profiles:
+        return [] if single_profile else [[] for _ in profiles]
+
+    with span('rank'):
+        profile_embeddings = encode_texts(embedding_model, profiles, batch_size)
+        indices, scores = score_profiles(profile_embeddings, paper_embeddings, top_k)
+
+    ranked = [
+        [{'metadata': papers[j], 'similarity': float(s)} for j, s in zip(row_indices, row_scores)]
+        for row_indices, row_scores in zip(indices, scores)
+    ]
+    return ranked[0] if single_profile else ranked
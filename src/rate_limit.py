@@ -0,0 +1,62 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    A thread-safe token-bucket rate limiter shared by every worker that talks to one service.
+
+    Tokens refill continuously at `rate` per second up to `capacity`. `acquire` blocks
+    until enough tokens are available, so N workers together never exceed the rate.
+    """
+
+    def __init__(self, rate, capacity=1.0, clock=time.monotonic, sleep=time.sleep):
+        """
+        Args:
+            rate (float): Tokens added per second (e.g., 1/3 for one request every three seconds).
+            capacity (float): The maximum burst size.
+            clock (callable): A monotonic clock, replaceable in tests.
+            sleep (callable): The sleep function, replaceable in tests.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive.")
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens=1.0, cancel_event=None):
+        """
+        Blocks until `tokens` can be taken from the bucket.
+
+        Requests larger than the capacity are allowed through once the bucket is full,
+        leaving it in debt, so oversized requests still get paced rather than refused.
+
+        Args:
+            tokens (float): The number of tokens to take.
+            cancel_event (threading.Event, optional): Stops waiting early when set.
+
+        Returns:
+            bool: True once the tokens were taken, False if cancelled first.
+        """
+        needed = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= needed:
+                    self._tokens -= tokens
+                    return True
+                wait = (needed - self._tokens) / self.rate
+            if cancel_event is not None:
+                if cancel_event.wait(wait):
+                    return False
+            else:
+                self._sleep(wait)
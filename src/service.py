@@ -0,0 +1,229 @@
+"""
+A long-running HTTP service that keeps the embedding model, clients and each day's paper
+embeddings warm, so ranking requests for many users are answered in milliseconds.
+
+Endpoints (JSON in, JSON out):
+    GET  /health
+    POST /rank     {"interests": ["...", ...], "category": "astro-ph.GA", "top_k": 5}
+    POST /similar  {"text": "..."} or {"paper_id": "http://arxiv.org/abs/..."}, optional "k"
+    GET  /digest?category=astro-ph.GA&date=YYYYMMDD, or ?user=<batch user name>&date=YYYYMMDD
+    POST /digest   A batch config (the JSON of `main.py batch --config`); runs it and returns each user's digest path
+"""
+import collections
+import datetime
+import json
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from src.pipeline import (DEFAULT_CATEGORY, PipelineContext, load_cached_digest, load_papers, user_digest_name,
+                          window_day)
+from src.ranking_utils import encode_texts, score_profiles
+
+
+class RankingService:
+    """Holds warm resources and per-day paper embeddings shared by all requests."""
+
+    def __init__(self, ctx=None, max_cached_profiles=4096, max_cached_days=16):
+        self.ctx = ctx or PipelineContext()
+        self._lock = threading.Lock()
+        self._days = collections.OrderedDict()  # (category, end_date) -> (papers, embeddings), LRU order
+        self._loading = {}  # (category, end_date) -> Future of a load in progress
+        self._max_cached_days = max_cached_days
+        self._profiles = collections.OrderedDict()  # interest text -> normalized embedding
+        self._max_cached_profiles = max_cached_profiles
+        self._batch_lock = threading.Lock()
+
+    def warm_up(self):
+        """Loads the embedding model and the corpus index before the first request arrives."""
+        self.ctx.embedding_model
+        with self.ctx.index_lock:
+            self.ctx.corpus_index
+
+    def papers_for(self, category, start_date=None, end_date=None):
+        """
+        Returns a window's (papers, embeddings), loading them on first use.
+
+        Loads run outside the service lock, so a slow cold load (an arXiv fetch or the first
+        model load) only delays requests for the same window, which wait for it instead of
+        starting their own. Only non-empty results are cached, in an LRU of `max_cached_days`
+        windows; a failed or empty load is retried by the next request.
+        """
+        from src.arxiv_utils import get_arxiv_dates
+
+        if end_date is None:
+            start_date, end_date = get_arxiv_dates()
+        key = (category, end_date)
+        with self._lock:
+            if key in self._days:
+                self._days.move_to_end(key)
+                return self._days[key]
+            future = self._loading.get(key)
+            loading_here = future is None
+            if loading_here:
+                future = self._loading[key] = Future()
+        if not loading_here:
+            return future.result()
+
+        try:
+            result = load_papers(self.ctx, category, end_date, start_date=start_date)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[key]
+            if result[0]:
+                self._days[key] = result
+                while len(self._days) > self._max_cached_days:
+                    self._days.popitem(last=False)
+        future.set_result(result)
+        return result
+
+    def profile_embeddings(self, interests):
+        """Embeds interest strings, reusing embeddings of profiles seen in earlier requests."""
+        with self._lock:
+            missing = [text for text in dict.fromkeys(interests) if text not in self._profiles]
+        if missing:
+            vectors = encode_texts(self.ctx.embedding_model, missing)
+            with self._lock:
+                for text, vector in zip(missing, vectors):
+                    self._profiles[text] = vector
+                while len(self._profiles) > self._max_cached_profiles:
+                    self._profiles.popitem(last=False)
+        with self._lock:
+            for text in interests:
+                self._profiles.move_to_end(text)
+            return np.stack([self._profiles[text] for text in interests])
+
+    def rank(self, interests, category=DEFAULT_CATEGORY, top_k=5):
+        papers, embeddings = self.papers_for(category)
+        if not papers:
+            return [[] for _ in interests]
+        indices, scores = score_profiles(self.profile_embeddings(interests), embeddings, top_k)
+        return [
+            [{'id': papers[j]['id'], 'title': papers[j]['title'], 'similarity': float(s)}
+             for j, s in zip(row_indices, row_scores)]
+            for row_indices, row_scores in zip(indices, scores)
+        ]
+
+    def run_batch(self, config):
+        """
+        Runs a batch config with the warm context and returns {user name: digest path}.
+
+        Batches run one at a time; a request for a config whose run is already underway waits
+        for it and then finds nothing new.
+        """
+        from src.batch import parse_batch_config, run_batch
+
+        config = parse_batch_config(config, 'the request')
+        with self._batch_lock:
+            return run_batch(self.ctx, config)
+
+    def similar(self, text=None, paper_id=None, k=10):
+        query = encode_texts(self.ctx.embedding_model, [text])[0] if paper_id is None else None
+        # Loads for other requests may be adding papers to the index concurrently.
+        with self.ctx.index_lock:
+            index = self.ctx.corpus_index
+            if paper_id is not None:
+                return index.search_similar_to(paper_id, k=k)
+            return index.search(query, k=k)
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status, payload, content_type='application/json'):
+            body = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return json.loads(self.rfile.read(length) or b'{}')
+
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            if url.path == '/health':
+                self._send(200, {'status': 'ok'})
+            elif url.path == '/digest':
+                query = urllib.parse.parse_qs(url.query)
+                user = query.get('user', [None])[0]
+                category = query.get('category', [DEFAULT_CATEGORY])[0]
+                try:
+                    if 'date' in query:
+                        day = datetime.datetime.strptime(query['date'][0], '%Y%m%d').date()
+                    else:
+                        from src.arxiv_utils import get_arxiv_dates
+                        day = window_day(get_arxiv_dates()[1])
+                except ValueError as e:
+                    self._send(400, {'error': str(e)})
+                    return
+                digest = load_cached_digest(service.ctx, day, user_digest_name(user) if user else category)
+                if digest is None:
+                    self._send(404, {'error': f'no digest for {user or category} on {day}'})
+                else:
+                    self._send(200, digest.encode('utf-8'), 'text/markdown; charset=utf-8')
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            started = time.perf_counter()
+            try:
+                request = self._read_json()
+                if self.path == '/rank':
+                    interests = request.get('interests')
+                    if isinstance(interests, str):
+                        interests = [interests]
+                    if not interests:
+                        self._send(400, {'error': "'interests' is required"})
+                        return
+                    results = service.rank(interests, request.get('category', DEFAULT_CATEGORY),
+                                           int(request.get('top_k', 5)))
+                elif self.path == '/similar':
+                    if not request.get('text') and not request.get('paper_id'):
+                        self._send(400, {'error': "'text' or 'paper_id' is required"})
+                        return
+                    results = service.similar(request.get('text'), request.get('paper_id'), int(request.get('k', 10)))
+                elif self.path == '/digest':
+                    results = service.run_batch(request)
+                else:
+                    self._send(404, {'error': 'not found'})
+                    return
+            except (ValueError, KeyError) as e:
+                self._send(400, {'error': str(e)})
+                return
+            except Exception as e:
+                print(f"Error handling {self.path}: {e}")
+                self._send(500, {'error': str(e)})
+                return
+            self._send(200, {'results': results, 'elapsed_ms': (time.perf_counter() - started) * 1000})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host='127.0.0.1', port=8765, ctx=None):
+    """Starts the ranking service and blocks until interrupted."""
+    service = RankingService(ctx)
+    print("Warming up the embedding model and corpus index...")
+    service.warm_up()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f"Serving ranking requests on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,279 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Per-paper pipeline stages, in order. A paper's recorded stage only ever moves forward.
+STAGES = ('fetched', 'embedded', 'downloaded', 'extracted', 'summarized')
+_STAGE_RANK = {stage: rank for rank, stage in enumerate(STAGES)}
+
+# Run statuses, in order: papers fetched and embedded, top papers selected, digest saved.
+RUN_STATUSES = ('started', 'fetched', 'ranked', 'done')
+
+
+class PipelineState:
+    """
+    A small SQLite store that makes runs incremental and resumable.
+
+    It records, per run name (e.g. 'digest:astro-ph.GA' or 'batch:team') and feed (a
+    category), the end of the last fully ingested submission window (the watermark), so the
+    next run of that name asks arXiv only for papers submitted since then, however many days
+    ago that was. It also records which papers each run name ingested from each feed, so a
+    rerun skips them, while other run names, and other feeds a paper is cross-listed to, still
+    see them. Each run records how far it got, and each paper records the last pipeline stage
+    it completed, along with its summary and, for clean extractions, its text, so a run that
+    crashed midway resumes without repeating downloads, extraction or LLM calls (this progress
+    is shared by all runs). When a run finishes, paper rows no unfinished run needs are
+    deleted, so the store does not grow with every paper ever processed; the paper and LLM
+    caches still answer for them. Every update is committed immediately; WAL mode lets several
+    processes share the file.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): The SQLite database file.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(
+            'CREATE TABLE IF NOT EXISTS run_watermarks ('
+            ' run_name TEXT NOT NULL, feed TEXT NOT NULL, watermark TEXT NOT NULL, updated REAL NOT NULL,'
+            ' PRIMARY KEY (run_name, feed));'
+            'CREATE TABLE IF NOT EXISTS ingested ('
+            ' run_name TEXT NOT NULL, feed TEXT NOT NULL, paper_id TEXT NOT NULL, run_id INTEGER NOT NULL,'
+            ' PRIMARY KEY (run_name, feed, paper_id));'
+            'CREATE TABLE IF NOT EXISTS runs ('
+            ' run_id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, start_date TEXT NOT NULL,'
+            ' end_date TEXT NOT NULL, status TEXT NOT NULL, payload TEXT NOT NULL,'
+            ' created REAL NOT NULL, updated REAL NOT NULL);'
+            'CREATE INDEX IF NOT EXISTS runs_name ON runs (name, status);'
+            'CREATE TABLE IF NOT EXISTS papers ('
+            ' paper_id TEXT PRIMARY KEY, stage INTEGER NOT NULL, run_id INTEGER, metadata TEXT,'
+            ' text BLOB, summary TEXT, error TEXT, updated REAL NOT NULL);'
+        )
+        self._conn.commit()
+        self._migrate_watermarks()
+
+    def _migrate_watermarks(self):
+        """
+        Moves watermarks from the old per-feed 'watermarks' table to per-run-name ones.
+
+        An old watermark was shared by every run over its feed, so it is copied to that feed's
+        digest and to every batch run name on record, and the old table is dropped.
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                exists = self._conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'watermarks'").fetchone()
+                if exists:
+                    rows = self._conn.execute('SELECT feed, watermark, updated FROM watermarks').fetchall()
+                    batch_names = [row[0] for row in self._conn.execute(
+                        "SELECT DISTINCT name FROM runs WHERE name LIKE 'batch:%'")]
+                    self._conn.executemany(
+                        'INSERT INTO run_watermarks (run_name, feed, watermark, updated) VALUES (?, ?, ?, ?)'
+                        ' ON CONFLICT(run_name, feed) DO NOTHING',
+                        [(run_name, feed, watermark, updated) for feed, watermark, updated in rows
+                         for run_name in [f"digest:{feed}"] + batch_names],
+                    )
+                    self._conn.execute('DROP TABLE watermarks')
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    # --- Watermarks ---
+
+    def get_watermark(self, run_name, feed):
+        """Returns the end (YYYYMMDDHHMM) of the last window a run name fully ingested from a feed, or None."""
+        with self._lock:
+            row = self._conn.execute('SELECT watermark FROM run_watermarks WHERE run_name = ? AND feed = ?',
+                                     (run_name, feed)).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, run_name, feed, watermark):
+        """Advances a run name's watermark for a feed. It never moves backwards."""
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO run_watermarks (run_name, feed, watermark, updated) VALUES (?, ?, ?, ?)'
+                ' ON CONFLICT(run_name, feed) DO UPDATE SET watermark = MAX(watermark, excluded.watermark),'
+                ' updated = excluded.updated',
+                (run_name, feed, watermark, time.time()),
+            )
+            self._conn.commit()
+
+    # --- Runs ---
+
+    def _run_from_row(self, row):
+        run = {'run_id': row[0], 'name': row[1], 'start_date': row[2], 'end_date': row[3], 'status': row[4]}
+        run.update(json.loads(row[5]))
+        return run
+
+    def start_run(self, name, start_date, end_date):
+        """Records a new run over a submission window and returns it as a dict."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT INTO runs (name, start_date, end_date, status, payload, created, updated)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)', (name, start_date, end_date, RUN_STATUSES[0], '{}', now, now))
+            self._conn.commit()
+        return {'run_id': cursor.lastrowid, 'name': name, 'start_date': start_date, 'end_date': end_date,
+                'status': RUN_STATUSES[0]}
+
+    def unfinished_run(self, name):
+        """Returns the most recent run with this name that did not finish, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT run_id, name, start_date, end_date, status, payload FROM runs'
+                ' WHERE name = ? AND status != ? ORDER BY run_id DESC LIMIT 1', (name, RUN_STATUSES[-1])).fetchone()
+        return self._run_from_row(row) if row else None
+
+    def update_run(self, run, status, **payload):
+        """
+        Moves a run to a new status and stores extra JSON-serializable fields with it.
+
+        The run dict is updated in place, so callers can keep using it. Finishing a run prunes
+        the paper rows that no unfinished run still needs (see `prune_papers`).
+        """
+        run.update(payload)
+        run['status'] = status
+        stored = {key: value for key, value in run.items()
+                  if key not in ('run_id', 'name', 'start_date', 'end_date', 'status')}
+        with self._lock:
+            self._conn.execute('UPDATE runs SET status = ?, payload = ?, updated = ? WHERE run_id = ?',
+                               (status, json.dumps(stored), time.time(), run['run_id']))
+            self._conn.commit()
+        if status == RUN_STATUSES[-1]:
+            self.prune_papers()
+        return run
+
+    def prune_papers(self):
+        """
+        Deletes the paper rows that no unfinished run needs to resume.
+
+        A row is kept while it belongs to an unfinished run, i.e. that run fetched it (its
+        `run_id`) or lists it among its papers or selected papers. Everything else (metadata,
+        text and summary) is dropped; later runs that select the same paper read its text from
+        the paper cache and its summary from the LLM cache instead.
+
+        Returns:
+            int: The number of rows deleted.
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                keep = set()
+                for (payload,) in self._conn.execute('SELECT payload FROM runs WHERE status != ?',
+                                                     (RUN_STATUSES[-1],)):
+                    payload = json.loads(payload)
+                    keep.update(payload.get('papers') or ())
+                    keep.update(item[0] for item in payload.get('selected') or ())
+                candidates = [row[0] for row in self._conn.execute(
+                    'SELECT paper_id FROM papers WHERE run_id IS NULL'
+                    ' OR run_id NOT IN (SELECT run_id FROM runs WHERE status != ?)', (RUN_STATUSES[-1],))]
+                doomed = [(paper_id,) for paper_id in candidates if paper_id not in keep]
+                self._conn.executemany('DELETE FROM papers WHERE paper_id = ?', doomed)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return len(doomed)
+
+    # --- Papers ---
+
+    def is_known(self, paper_id, run, feed):
+        """True if an earlier run with the same name as `run` already ingested the paper from `feed`."""
+        with self._lock:
+            row = self._conn.execute('SELECT run_id FROM ingested WHERE run_name = ? AND feed = ? AND paper_id = ?',
+                                     (run['name'], feed, paper_id)).fetchone()
+        return row is not None and row[0] != run['run_id']
+
+    def record_ingested(self, run, feed, paper_ids):
+        """Records that `run` ingested these papers from `feed`, so later runs of the same name skip them."""
+        with self._lock:
+            self._conn.executemany(
+                'INSERT INTO ingested (run_name, feed, paper_id, run_id) VALUES (?, ?, ?, ?)'
+                ' ON CONFLICT(run_name, feed, paper_id) DO NOTHING',
+                [(run['name'], feed, paper_id, run['run_id']) for paper_id in paper_ids],
+            )
+            self._conn.commit()
+
+    def record_papers(self, papers, stage, run_id=None):
+        """Stores paper metadata, raises each paper to at least `stage` and assigns it to `run_id`, if given."""
+        rank, now = _STAGE_RANK[stage], time.time()
+        with self._lock:
+            self._conn.executemany(
+                'INSERT INTO papers (paper_id, stage, run_id, metadata, updated) VALUES (?, ?, ?, ?, ?)'
+                ' ON CONFLICT(paper_id) DO UPDATE SET stage = MAX(stage, excluded.stage),'
+                ' run_id = COALESCE(excluded.run_id, run_id), metadata = excluded.metadata,'
+                ' updated = excluded.updated',
+                [(paper['id'], rank, run_id, json.dumps(paper), now) for paper in papers],
+            )
+            self._conn.commit()
+
+    def get_papers(self, paper_ids):
+        """Returns the stored metadata for the given paper IDs, in order, skipping unknown ones."""
+        found = {}
+        with self._lock:
+            for paper_id in paper_ids:
+                row = self._conn.execute('SELECT metadata FROM papers WHERE paper_id = ?', (paper_id,)).fetchone()
+                if row and row[0]:
+                    found[paper_id] = json.loads(row[0])
+        return [found[paper_id] for paper_id in paper_ids if paper_id in found]
+
+    def mark_stage(self, paper_id, stage, text=None, summary=None, error=None):
+        """
+        Records that a paper completed a stage, optionally with its extracted text or summary.
+
+        Passing only `error` records a failure without advancing the stage. Callers store only
+        text from clean extractions, since a resumed run reuses it as it is.
+        """
+        rank = _STAGE_RANK[stage] if stage is not None else 0
+        blob = zlib.compress(text.encode('utf-8')) if text is not None else None
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO papers (paper_id, stage, text, summary, error, updated) VALUES (?, ?, ?, ?, ?, ?)'
+                ' ON CONFLICT(paper_id) DO UPDATE SET stage = MAX(stage, excluded.stage),'
+                ' text = COALESCE(excluded.text, text), summary = COALESCE(excluded.summary, summary),'
+                ' error = excluded.error, updated = excluded.updated',
+                (paper_id, rank, blob, summary, error, time.time()),
+            )
+            self._conn.commit()
+
+    def get_progress(self, paper_ids):
+        """
+        Returns how far each paper got.
+
+        Returns:
+            dict: paper ID -> {'stage', 'text', 'summary', 'error'} for the papers on record.
+        """
+        progress = {}
+        with self._lock:
+            for paper_id in paper_ids:
+                row = self._conn.execute('SELECT stage, text, summary, error FROM papers WHERE paper_id = ?',
+                                         (paper_id,)).fetchone()
+                if row:
+                    progress[paper_id] = {
+                        'stage': STAGES[row[0]],
+                        'text': zlib.decompress(row[1]).decode('utf-8') if row[1] is not None else None,
+                        'summary': row[2],
+                        'error': row[3],
+                    }
+        return progress
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def stage_reached(progress, stage):
+    """True if a `get_progress` entry (or None) has completed at least `stage`."""
+    return progress is not None and _STAGE_RANK[progress['stage']] >= _STAGE_RANK[stage]
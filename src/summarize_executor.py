@@ -0,0 +1,206 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google.genai import types
+
+from src.context_utils import estimate_tokens
+from src.instrumentation import count, span
+from src.llm_cache import make_cache_key
+from src.llm_utils import DEFAULT_MODEL, SUMMARY_GENERATION_CONFIG, build_summary_prompt, record_llm_usage
+from src.rate_limit import TokenBucket
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def is_retryable_error(error):
+    """True for rate-limit and server errors (HTTP 429/5xx) and transport failures."""
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS_CODES or code >= 500
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    try:
+        import httpx
+        return isinstance(error, httpx.TransportError)
+    except ImportError:
+        return False
+
+
+class SummarizationCancelled(Exception):
+    """Raised inside workers when the executor is cancelled."""
+
+
+class SummarizationExecutor:
+    """
+    Summarizes many papers concurrently with independent, history-free requests.
+
+    Unlike `summarize_text_with_llm`, which sends every paper into one chat session (so each
+    request also carries every earlier paper), each request here contains only its own prompt.
+    Requests run on a bounded thread pool under shared requests-per-minute and
+    tokens-per-minute budgets, and retry with exponential backoff on 429/5xx errors.
+    Any object whose `models.generate_content(model=, contents=, config=)` returns something
+    with a `.text` attribute can serve as the client, e.g. `FakeGenaiClient` for offline tests.
+    """
+
+    def __init__(self, client, model=DEFAULT_MODEL, max_concurrency=4, requests_per_minute=15,
+                 tokens_per_minute=1_000_000, max_retries=5, backoff_base=2.0, generation_config=None,
+                 cache=None, prompt_builder=build_summary_prompt):
+        """
+        Args:
+            client: A genai.Client (or a fake with the same `models.generate_content` method).
+            model (str): The model name.
+            max_concurrency (int): The maximum number of requests in flight.
+            requests_per_minute (float): The shared request budget.
+            tokens_per_minute (float): The shared input+output token budget.
+            max_retries (int): Attempts per paper on retryable errors.
+            backoff_base (float): The first retry delay in seconds; it doubles on each retry.
+            generation_config (dict, optional): Overrides SUMMARY_GENERATION_CONFIG.
+            cache (LLMCache, optional): A response cache consulted before calling the model.
+            prompt_builder (callable): Turns a paper's text into the full prompt.
+        """
+        self.client = client
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.generation_config = dict(generation_config or SUMMARY_GENERATION_CONFIG)
+        self.cache = cache
+        self.prompt_builder = prompt_builder
+        self._request_limiter = TokenBucket(requests_per_minute / 60.0, capacity=max(1, min(max_concurrency, requests_per_minute)))
+        self._token_limiter = TokenBucket(tokens_per_minute / 60.0, capacity=tokens_per_minute / 10.0)
+        self._cancelled = threading.Event()
+        self._futures = []
+
+    def cancel(self):
+        """Stops queued work and wakes workers waiting on rate limits or backoff; in-flight calls finish."""
+        self._cancelled.set()
+        for future in self._futures:
+            future.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def _config(self):
+        return types.GenerateContentConfig(**self.generation_config)
+
+    def _generate(self, prompt):
+        config = self._config()
+        cache_key = None
+        if self.cache is not None:
+            cache_key = make_cache_key(self.model, config, prompt)
+            cached_text = self.cache.get(cache_key)
+            if cached_text is not None:
+                count('llm.cache_hits')
+                return cached_text
+
+        budget = estimate_tokens(prompt) + self.generation_config.get('max_output_tokens', 0)
+        for attempt in range(self.max_retries):
+            if not self._request_limiter.acquire(1, self._cancelled) or \
+                    not self._token_limiter.acquire(budget, self._cancelled):
+                raise SummarizationCancelled()
+            try:
+                with span('llm.request'):
+                    response = self.client.models.generate_content(model=self.model, contents=prompt, config=config)
+            except Exception as e:
+                if not is_retryable_error(e) or attempt == self.max_retries - 1:
+                    raise
+                delay = min(60.0, self.backoff_base * (2 ** attempt)) * (0.5 + random.random() / 2)
+                print(f"Summarization request failed ({e}); retrying in {delay:.1f} seconds...")
+                if self._cancelled.wait(delay):
+                    raise SummarizationCancelled()
+                continue
+            record_llm_usage(prompt, response)
+            text = getattr(response, 'text', None)
+            if text and cache_key is not None:
+                self.cache.put(cache_key, text, model=self.model)
+            return text
+        return None
+
+    def _summarize_one(self, text):
+        if self.cancelled:
+            raise SummarizationCancelled()
+        return self._generate(self.prompt_builder(text))
+
+    def summarize_all(self, texts):
+        """
+        Summarizes each text independently and concurrently.
+
+        Args:
+            texts (list of str): Extracted paper texts. None or empty entries are skipped.
+
+        Returns:
+            list: The summary text (or None on failure, skip or cancellation) for each input, in input order.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            self._futures = [executor.submit(self._summarize_one, text) if text else None for text in texts]
+            results = []
+            for i, future in enumerate(self._futures):
+                if future is None:
+                    results.append(None)
+                    continue
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    if not isinstance(e, SummarizationCancelled) and not self.cancelled:
+                        print(f"Error during LLM summarization of paper {i + 1}: {e}")
+                    results.append(None)
+            return results
+
+
+class FakeAPIError(Exception):
+    """An API error with an HTTP-style `code`, as raised by FakeGenaiClient."""
+
+    def __init__(self, code, message="fake API error"):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeGenaiClient:
+    """
+    An offline stand-in for genai.Client's `models.generate_content` and `chats.create(...).send_message`,
+    for tests and benchmarks.
+
+    Args:
+        latency (float or callable): Seconds each call sleeps before answering, or a function
+                                     mapping the prompt to that delay (e.g., to scale with its length).
+        responder (callable, optional): Maps the prompt to the response text. Defaults to a canned summary.
+        failures (list of int, optional): HTTP codes to raise on the first calls, in order (e.g., [429, 503]).
+    """
+
+    class _Response:
+        def __init__(self, text):
+            self.text = text
+
+    class _Chat:
+        def __init__(self, client, model):
+            self._client = client
+            self._model = model
+
+        def send_message(self, message):
+            return self._client.generate_content(self._model, message)
+
+    def __init__(self, latency=0.0, responder=None, failures=None):
+        self.latency = latency
+        self.responder = responder or (lambda prompt: f"### Key Findings\nSummary of a {len(prompt)}-character prompt.")
+        self.failures = list(failures or [])
+        self.calls = []
+        self._lock = threading.Lock()
+        self.models = self
+        self.chats = self
+
+    def create(self, model, config=None):
+        return self._Chat(self, model)
+
+    def generate_content(self, model, contents, config=None):
+        with self._lock:
+            self.calls.append({'model': model, 'contents': contents, 'config': config})
+            failure = self.failures.pop(0) if self.failures else None
+        latency = self.latency(contents) if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+        if failure is not None:
+            raise FakeAPIError(failure)
+        return self._Response(self.responder(contents))
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Lets `pytest` import the src and benchmarks packages from a checkout without installing anything.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,100 @@
+import gzip
+import urllib.parse
+
+import pytest
+
+from benchmarks.fixtures import feed_fixture, make_feed
+from benchmarks.stubs import StubArxivServer, _StubHandler
+from src import arxiv_utils
+from src.arxiv_utils import iter_arxiv_entries, iter_arxiv_feed
+
+WINDOW = ('astro-ph.GA', '202601010000', '202601020000')
+
+
+class _FaultyHandler(_StubHandler):
+    """Answers each API request with the next scripted fault, then behaves like the stub."""
+
+    def do_GET(self):
+        stub = self.server.stub
+        url = urllib.parse.urlsplit(self.path)
+        fault = stub.faults.pop(0) if url.path == '/api/query' and stub.faults else None
+        if fault is None:
+            return super().do_GET()
+        stub.record_request(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        start, max_results = int(query['start'][0]), int(query['max_results'][0])
+        entries = stub.entries[start:start + max_results]
+        if fault == 'error':
+            self._send(503, b"busy", "text/plain")
+            return
+        if fault == 'empty':
+            entries = []
+        elif fault == 'short':
+            entries = entries[:len(entries) // 2]
+        page = make_feed(entries, total=len(stub.entries), start=start)
+        if fault == 'cut':
+            # The connection drops in the middle of the third entry.
+            page = page[:page.index('<entry>', page.index('<entry>', page.index('<entry>') + 1) + 1) + 40]
+        self._send(200, page.encode('utf-8'), "application/atom+xml; charset=utf-8")
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    server = StubArxivServer(feed_fixture(str(tmp_path), 25))
+    server._server.RequestHandlerClass = _FaultyHandler
+    server.faults = []
+    monkeypatch.setattr(arxiv_utils, 'ARXIV_API_URL', server.api_url)
+    with server:
+        yield server
+
+
+def feed_ids(**kwargs):
+    return [paper['id'] for paper in iter_arxiv_feed(*WINDOW, delay=0, **kwargs)]
+
+
+@pytest.fixture
+def all_ids(tmp_path):
+    with gzip.open(feed_fixture(str(tmp_path), 25), 'rb') as f:
+        return [paper['id'] for paper in iter_arxiv_entries(f)]
+
+
+def test_pages_are_followed_to_the_total(stub, all_ids):
+    info = {}
+    assert feed_ids(page_size=10, feed_info=info) == all_ids
+    assert stub.requests['api'] == 3
+    assert info == {'complete': True, 'total_results': 25}
+
+
+def test_max_results_stops_early_and_is_incomplete(stub, all_ids):
+    info = {}
+    assert feed_ids(page_size=10, max_results=12, feed_info=info) == all_ids[:12]
+    assert stub.requests['api'] == 2
+    assert info['complete'] is False
+
+
+def test_short_pages_continue_from_what_arrived(stub, all_ids):
+    stub.faults = ['short', None, 'short']
+    info = {}
+    assert feed_ids(page_size=10, feed_info=info) == all_ids
+    assert info['complete'] is True
+
+
+def test_empty_and_failed_pages_are_retried(stub, all_ids):
+    stub.faults = [None, 'empty', 'error']
+    info = {}
+    assert feed_ids(page_size=10, feed_info=info) == all_ids
+    assert stub.requests['api'] == 5 and info['complete'] is True
+
+
+def test_truncated_page_resumes_after_the_entries_yielded(stub, all_ids):
+    stub.faults = ['cut']
+    info = {}
+    assert feed_ids(page_size=10, feed_info=info) == all_ids
+    assert info['complete'] is True
+
+
+def test_giving_up_leaves_the_feed_incomplete(stub, all_ids):
+    stub.faults = [None, 'error', 'error', 'error']
+    info = {}
+    assert feed_ids(page_size=10, max_retries=3, feed_info=info) == all_ids[:10]
+    assert info == {'complete': False, 'total_results': 25}
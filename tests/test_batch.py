@@ -0,0 +1,162 @@
+import threading
+
+import pytest
+
+from benchmarks.stubs import HashingEmbeddingModel
+from src import arxiv_utils
+from src.batch import fetch_categories, parse_batch_config, score_users
+from src.lexical_index import LexicalIndex
+from src.pipeline import PipelineContext, fetch_papers, incremental_window
+from src.ranking_utils import encode_papers
+
+START, END = '202601050000', '202601060000'
+
+ABSTRACTS = {
+    1: "Molecular gas and dust in nearby spiral galaxies observed with ALMA.",
+    2: "Quasar outflows drive feedback in massive galaxies at high redshift.",
+    3: "Weak lensing of galaxy clusters constrains dark matter halos.",
+    4: "Dense molecular gas fuels star formation in galaxy mergers.",
+    5: "Cosmic reionization traced by Lyman alpha emitters with JWST.",
+}
+
+
+def paper(number, *categories, version=1):
+    return {'id': f"http://arxiv.org/abs/2601.{number:05d}v{version}", 'title': f"Paper {number}",
+            'abstract': ABSTRACTS.get(number, f"Abstract of paper {number} about galaxies."),
+            'authors': [{'name': 'A. Author'}], 'categories': list(categories), 'primary_category': categories[0]}
+
+
+@pytest.fixture
+def ctx(tmp_path, monkeypatch):
+    feeds = {}
+
+    def iter_arxiv_feed(category, start_date, end_date, delay=3, feed_info=None, **kwargs):
+        if feed_info is not None:
+            feed_info['complete'] = True
+        return iter(list(feeds.get(category, [])))
+
+    monkeypatch.setattr(arxiv_utils, 'iter_arxiv_feed', iter_arxiv_feed)
+    monkeypatch.setattr(arxiv_utils, 'get_arxiv_dates', lambda: (START, END))
+    ctx = PipelineContext(cache_dir=str(tmp_path), embedding_model_name='hashing-384',
+                          embedding_model=HashingEmbeddingModel())
+    ctx.feeds = feeds
+    yield ctx
+    ctx.state.close()
+
+
+def make_user(name, categories, interests, top_k=5, **kwargs):
+    return dict({'name': name, 'categories': categories, 'interests': interests, 'top_k': top_k}, **kwargs)
+
+
+class CountingModel(HashingEmbeddingModel):
+    def __init__(self):
+        super().__init__()
+        self.encoded = []
+
+    def encode(self, texts, *args, **kwargs):
+        self.encoded.extend(texts)
+        return super().encode(texts, *args, **kwargs)
+
+
+def test_digest_does_not_starve_a_batch_over_the_same_category(ctx):
+    ctx.feeds['astro-ph.GA'] = [paper(1, 'astro-ph.GA'), paper(2, 'astro-ph.GA', 'astro-ph.CO')]
+    ctx.feeds['astro-ph.CO'] = [paper(2, 'astro-ph.GA', 'astro-ph.CO'), paper(3, 'astro-ph.CO')]
+    digest = incremental_window(ctx, 'astro-ph.GA', 'digest:astro-ph.GA')
+    fetch_papers(ctx, 'astro-ph.GA', START, END, run=digest)
+    ctx.state.set_watermark(digest['name'], 'astro-ph.GA', END)
+    ctx.state.update_run(digest, 'done')
+    assert incremental_window(ctx, 'astro-ph.GA', 'digest:astro-ph.GA') is None
+
+    batch = incremental_window(ctx, ['astro-ph.GA', 'astro-ph.CO'], 'batch:team')
+    assert batch is not None
+    papers, _, members = fetch_categories(ctx, ['astro-ph.GA', 'astro-ph.CO'], START, END, run=batch)
+    ids = [p['id'] for p in papers]
+    assert len(ids) == 3
+    assert {ids[i] for i in members['astro-ph.CO']} == {paper(2, 'x')['id'], paper(3, 'x')['id']}
+
+
+def test_cross_listed_paper_reaches_a_feed_it_is_new_to(ctx):
+    ctx.feeds['astro-ph.GA'] = [paper(2, 'astro-ph.GA', 'astro-ph.CO')]
+    first = ctx.state.start_run('batch:team', START, END)
+    fetch_categories(ctx, ['astro-ph.GA'], START, END, run=first)
+    ctx.state.update_run(first, 'done')
+
+    ctx.feeds['astro-ph.CO'] = [paper(2, 'astro-ph.GA', 'astro-ph.CO')]
+    second = ctx.state.start_run('batch:team', START, END)
+    papers, _, members = fetch_categories(ctx, ['astro-ph.GA', 'astro-ph.CO'], START, END, run=second)
+    assert [p['id'] for p in papers] == [paper(2, 'x')['id']]
+    assert members['astro-ph.GA'] == set() and members['astro-ph.CO'] == {0}
+
+
+def test_fetch_adds_to_the_indexes_under_the_index_lock(ctx, monkeypatch):
+    ctx.feeds['astro-ph.GA'] = [paper(1, 'astro-ph.GA'), paper(2, 'astro-ph.GA')]
+    held = []
+    lexical_add = LexicalIndex.add
+    monkeypatch.setattr(LexicalIndex, 'add', lambda index, papers: held.append(ctx.index_lock._is_owned())
+                        or lexical_add(index, papers))
+    fetch_categories(ctx, ['astro-ph.GA'], START, END)
+    assert held == [True]
+    assert len(ctx.corpus_index) == 2 and len(ctx.lexical_index) == 2
+
+
+def test_users_only_see_papers_from_their_categories():
+    model = HashingEmbeddingModel()
+    papers = [paper(i, 'astro-ph.GA') for i in (1, 2, 3, 4, 5)]
+    members = {'astro-ph.GA': {0, 3}, 'astro-ph.CO': {2, 4}, 'astro-ph.HE': {1, 2}}
+    users = [make_user('ga', ['astro-ph.GA'], ["quasar outflows and feedback"]),
+             make_user('co+he', ['astro-ph.CO', 'astro-ph.HE'], ["molecular gas"], top_k=2),
+             make_user('empty', ['astro-ph.SR'], ["stars"])]
+    rankings = score_users(users, papers, encode_papers(papers, model), members, model)
+    # Paper 2 matches 'ga' best, but it is not listed in astro-ph.GA.
+    assert {item['metadata']['id'] for item in rankings['ga']} == {paper(1, 'x')['id'], paper(4, 'x')['id']}
+    assert len(rankings['co+he']) == 2
+    assert {item['metadata']['id'] for item in rankings['co+he']} <= {paper(i, 'x')['id'] for i in (2, 3, 5)}
+    assert rankings['empty'] == []
+
+
+def test_a_users_score_is_the_best_over_their_interests():
+    model = HashingEmbeddingModel()
+    papers = [paper(i, 'astro-ph.GA') for i in (1, 2, 3, 4, 5)]
+    embeddings = encode_papers(papers, model)
+    members = {'astro-ph.GA': set(range(5))}
+    interests = ["quasar outflows", "weak lensing of clusters"]
+    ranked = score_users([make_user('u', ['astro-ph.GA'], interests)], papers, embeddings, members, model)['u']
+    best = (model.encode(interests) @ embeddings.T).max(axis=0)
+    assert [item['similarity'] for item in ranked] == pytest.approx(sorted(best, reverse=True), abs=1e-6)
+
+
+def test_prefilter_embeds_only_lexical_candidates():
+    model = CountingModel()
+    papers = [paper(i, 'astro-ph.GA') for i in (1, 2, 3, 4, 5)]
+    members = {'astro-ph.GA': set(range(5)), 'astro-ph.CO': {2}}
+    users = [make_user('gas', ['astro-ph.GA'], ["molecular gas"], exclude_terms=["mergers"]),
+             make_user('lensing', ['astro-ph.CO'], ["galaxy clusters"]),
+             make_user('nothing', ['astro-ph.GA'], ["exoplanet atmospheres"])]
+    lock = threading.RLock()
+    rankings = score_users(users, papers, None, members, model, LexicalIndex(), candidates=3, index_lock=lock)
+    assert [item['metadata']['id'] for item in rankings['gas']] == [paper(1, 'x')['id']]
+    assert [item['metadata']['id'] for item in rankings['lensing']] == [paper(3, 'x')['id']]
+    assert rankings['nothing'] == []
+    # Only the two candidates were embedded, besides the interest profiles.
+    assert sorted(set(model.encoded) - {interest for user in users for interest in user['interests']}) == \
+        sorted([ABSTRACTS[1], ABSTRACTS[3]])
+
+
+def test_prefilter_with_no_candidates_embeds_nothing():
+    model = CountingModel()
+    papers = [paper(1, 'astro-ph.GA')]
+    rankings = score_users([make_user('u', ['astro-ph.GA'], ["exoplanets"])], papers, None, {'astro-ph.GA': {0}},
+                           model, LexicalIndex(), candidates=5)
+    assert rankings == {'u': []} and model.encoded == []
+
+
+def test_batch_configs_are_validated():
+    config = parse_batch_config({'users': [{'name': 'a', 'categories': 'astro-ph.GA', 'interests': 'gas'}],
+                                 'top_k': 3, 'prefilter': '50'})
+    assert config == {'name': 'default', 'review': True, 'prefilter': 50, 'users': [
+        {'name': 'a', 'categories': ['astro-ph.GA'], 'interests': ['gas'], 'top_k': 3,
+         'boost_terms': None, 'exclude_terms': None}]}
+    for bad in ([], {}, {'users': [{'name': 'a', 'categories': 'astro-ph.GA'}]},
+                {'users': [{'name': 'a', 'categories': 'x', 'interests': 'y'}] * 2}):
+        with pytest.raises(ValueError):
+            parse_batch_config(bad)
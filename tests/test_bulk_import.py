@@ -0,0 +1,151 @@
+import json
+import os
+
+import numpy as np
+
+from benchmarks.stubs import HashingEmbeddingModel
+from src.bulk_import import (MANIFEST_NAME, import_metadata, index_shards, iter_oai_records, iter_shards,
+                             iter_snapshot_range, normalize_oai_record, plan_tasks)
+from src.lexical_index import LexicalIndex
+
+OAI_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">
+<ListRecords>
+<record>
+ <header><identifier>oai:arXiv.org:2601.00001</identifier></header>
+ <metadata>
+  <arXiv xmlns="http://arxiv.org/OAI/arXiv/">
+   <id>2601.00001</id><created>2026-01-02</created><updated>2026-01-09</updated>
+   <authors>
+    <author><keyname>Rivera</keyname><forenames>Ana M.</forenames><affiliation>Leiden</affiliation></author>
+    <author><keyname>Okafor</keyname><forenames>Chidi</forenames><suffix>Jr</suffix></author>
+   </authors>
+   <title>Dust in high-redshift galaxies</title>
+   <categories>astro-ph.GA astro-ph.CO</categories>
+   <comments>12 pages</comments>
+   <abstract>  We measure dust masses.  </abstract>
+  </arXiv>
+ </metadata>
+</record>
+<record>
+ <header status="deleted"><identifier>oai:arXiv.org:2601.00002</identifier></header>
+</record>
+<record>
+ <header><identifier>oai:arXiv.org:2601.00003</identifier></header>
+ <metadata>
+  <arXivRaw xmlns="http://arxiv.org/OAI/arXivRaw/">
+   <id>2601.00003</id>
+   <version version="v1"><date>Fri, 2 Jan 2026 10:00:00 GMT</date></version>
+   <version version="v2"><date>Tue, 6 Jan 2026 08:30:00 GMT</date></version>
+   <title>Quasar outflows</title>
+   <authors>B. Chen, D. Diaz and E. Evans</authors>
+   <categories>astro-ph.HE</categories>
+   <journal-ref>ApJ 1, 2 (2026)</journal-ref>
+   <abstract>Outflows quench star formation.</abstract>
+  </arXivRaw>
+ </metadata>
+</record>
+</ListRecords>
+</OAI-PMH>
+"""
+
+
+def snapshot_record(i, category="astro-ph.GA", day=5):
+    return {'id': f"2601.{i:05d}", 'title': f"Paper {i} on dust", 'abstract': f"Abstract {i} about dust and halos.",
+            'authors': "A. Author", 'authors_parsed': [["Author", "A.", ""], ["Bee", "C.", "III"]],
+            'categories': category, 'comments': None, 'journal-ref': None, 'doi': None,
+            'versions': [{'version': 'v1', 'created': f"Mon, {day} Jan 2026 09:00:00 GMT"},
+                         {'version': 'v2', 'created': "Fri, 9 Jan 2026 09:00:00 GMT"}]}
+
+
+def write_snapshot(path, records, malformed_at=None):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i, record in enumerate(records):
+            if i == malformed_at:
+                f.write('{"id": "broken\n')
+            f.write(json.dumps(record) + "\n")
+    return str(path)
+
+
+def test_oai_records_in_both_formats(tmp_path):
+    path = tmp_path / 'harvest.xml'
+    path.write_text(OAI_XML, encoding='utf-8')
+    papers = [normalize_oai_record(metadata) for metadata in iter_oai_records(str(path))]
+    assert [paper['id'] for paper in papers] == ['http://arxiv.org/abs/2601.00001', 'http://arxiv.org/abs/2601.00003v2']
+
+    arxiv, raw = papers
+    assert arxiv['authors'] == [{'name': "Ana M. Rivera", 'affiliation': "Leiden"},
+                                {'name': "Chidi Okafor Jr", 'affiliation': None}]
+    assert (arxiv['published'], arxiv['updated']) == ('2026-01-02T00:00:00Z', '2026-01-09T00:00:00Z')
+    assert arxiv['abstract'] == "We measure dust masses." and arxiv['comment'] == "12 pages"
+    assert arxiv['primary_category'] == 'astro-ph.GA' and arxiv['doi'] is None
+
+    assert [author['name'] for author in raw['authors']] == ["B. Chen", "D. Diaz", "E. Evans"]
+    assert (raw['published'], raw['updated']) == ('2026-01-02T10:00:00Z', '2026-01-06T08:30:00Z')
+    assert raw['journal_ref'] == "ApJ 1, 2 (2026)"
+    assert raw['links'][1]['href'] == 'http://arxiv.org/pdf/2601.00003v2'
+
+
+def test_snapshot_ranges_cover_every_line_once(tmp_path, capsys):
+    path = write_snapshot(tmp_path / 'snapshot.jsonl', [snapshot_record(i) for i in range(20)], malformed_at=7)
+    tasks = plan_tasks([path], str(tmp_path), chunk_bytes=300)
+    assert len(tasks) > 5
+    ids = [record['id'] for _, _, _, start, end, *_ in tasks for record in iter_snapshot_range(path, start, end)]
+    assert ids == [f"2601.{i:05d}" for i in range(20)]
+    assert "Skipping a malformed line" in capsys.readouterr().out
+
+
+def test_import_filters_and_embeds_in_worker_processes(tmp_path):
+    records = [snapshot_record(i, category="astro-ph.GA" if i % 2 else "hep-th", day=1 if i % 4 == 1 else 5)
+               for i in range(40)]
+    records[3]['abstract'] = None
+    snapshot = write_snapshot(tmp_path / 'snapshot.jsonl', records)
+    harvest = tmp_path / 'harvest.xml'
+    harvest.write_text(OAI_XML, encoding='utf-8')
+    out_dir = str(tmp_path / 'import')
+
+    manifest = import_metadata([snapshot, str(harvest)], out_dir, embedding_model=HashingEmbeddingModel(dim=16),
+                               categories=['astro-ph'], since='2026-01-02', max_workers=2, chunk_bytes=2000,
+                               shard_size=4)
+    expected = sorted([f"http://arxiv.org/abs/2601.{i:05d}v2" for i in range(7, 40, 4)]
+                      + ['http://arxiv.org/abs/2601.00001', 'http://arxiv.org/abs/2601.00003v2'])
+    batches = list(iter_shards(out_dir))
+    assert sorted(paper_id for batch, _ in batches for paper_id in batch.columns['id'].to_list()) == expected
+    assert manifest['papers'] == len(expected) and len(manifest['tasks']) > 2
+    assert all(len(batch) <= 4 for batch, _ in batches)
+    for batch, embeddings in batches:
+        assert embeddings.dtype == np.float32 and embeddings.shape == (len(batch), 16)
+        assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0, atol=1e-2)
+
+    lexical_index = LexicalIndex(str(tmp_path / 'lexical.npz'))
+    assert index_shards(out_dir, lexical_index=lexical_index) == len(expected)
+    assert lexical_index.search("quasar outflows", k=1)[0][0] == 'http://arxiv.org/abs/2601.00003v2'
+
+
+def test_interrupted_import_resumes_from_the_manifest(tmp_path, capsys):
+    snapshot = write_snapshot(tmp_path / 'snapshot.jsonl', [snapshot_record(i) for i in range(30)])
+    out_dir = str(tmp_path / 'import')
+    manifest = import_metadata([snapshot], out_dir, max_workers=2, chunk_bytes=2000, shard_size=5)
+    names = sorted(manifest['tasks'])
+    assert manifest['papers'] == 30 and len(names) > 2
+
+    # Simulate an import that was killed before the last task was recorded.
+    with open(os.path.join(out_dir, MANIFEST_NAME), encoding='utf-8') as f:
+        partial = json.load(f)
+    dropped = partial['tasks'].pop(names[-1])
+    partial['papers'] -= sum(dropped['counts'])
+    with open(os.path.join(out_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(partial, f)
+    kept_shard = os.path.join(out_dir, partial['tasks'][names[0]]['shards'][0])
+    os.utime(kept_shard, ns=(0, 0))
+    capsys.readouterr()
+
+    resumed = import_metadata([snapshot], out_dir, max_workers=2, chunk_bytes=2000, shard_size=5)
+    assert f"Importing 1 chunks ({len(names) - 1} already done)" in capsys.readouterr().out
+    assert resumed == manifest and os.stat(kept_shard).st_mtime_ns == 0
+
+    assert import_metadata([snapshot], out_dir, max_workers=2, chunk_bytes=2000, shard_size=5) == manifest
+    assert "Importing 0 chunks" in capsys.readouterr().out
+
+    restarted = import_metadata([snapshot], out_dir, categories=['hep-th'], max_workers=2, chunk_bytes=2000)
+    assert "starting" in capsys.readouterr().out and restarted['papers'] == 0
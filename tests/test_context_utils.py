@@ -0,0 +1,78 @@
+import pytest
+
+from src.context_utils import classify_heading, select_context, split_sections
+
+
+@pytest.mark.parametrize('line, section', [
+    ('1 Introduction', 'introduction'),
+    ('1. INTRODUCTION', 'introduction'),
+    ('Introduction', 'introduction'),
+    ('2 Observations and data reduction', 'data'),
+    ('Observations and Data Reduction', 'data'),
+    ('3.2 Sample selection', 'data'),
+    ('II. METHODS', 'methods'),
+    ('4 Model', 'methods'),
+    ('Results', 'results'),
+    ('6 Summary', 'conclusions'),
+    ('SUMMARY', 'conclusions'),
+    ('Acknowledgements', 'acknowledgements'),
+    ('References', 'references'),
+    ('Appendix', 'appendix'),
+    ('APPENDIX B', 'appendix'),
+    ('Appendix A: Derivation of the Likelihood', 'appendix'),
+    ('APPENDIX B. ADDITIONAL FIGURES', 'appendix'),
+])
+def test_headings_are_classified(line, section):
+    assert classify_heading(line) == section
+
+
+@pytest.mark.parametrize('line', [
+    # Body sentences that merely start with a section word.
+    'Appendix A shows the full derivation of the fit.',
+    'Appendix A shows the full derivation',
+    'We also find Z which is the key result.',
+    'Results from the fit are shown in Figure 3.',
+    # Lone everyday words, e.g. the tail of a wrapped sentence or a figure label.
+    'Model',
+    'Summary',
+    'Analysis',
+    'Sample',
+    'the data',
+    # Too long to be a heading.
+    'Introduction To The Many Different Ways Of Measuring Star Formation Rates In Galaxies',
+])
+def test_body_lines_are_not_headings(line):
+    assert classify_heading(line) is None
+
+
+def test_appendix_sentence_does_not_swallow_the_rest_of_the_section():
+    text = "\n".join([
+        "A Paper Title",
+        "1 Introduction",
+        "Some introduction.",
+        "Appendix A shows the full derivation of the fit.",
+        "We also find Z which is the key result.",
+        "2 Results",
+        "More results.",
+        "Appendix A: Derivation",
+        "Long algebra.",
+    ])
+    sections = dict(split_sections(text))
+    assert "We also find Z which is the key result." in sections['introduction']
+    assert sections['results'] == "More results."
+    assert sections['appendix'] == "Long algebra."
+
+
+def test_select_context_drops_appendix_and_references_but_keeps_body():
+    body = " ".join(["The measured depletion time is two gigayears."] * 40)
+    text = "\n".join([
+        "A Paper Title",
+        "1 Results",
+        "Appendix A shows the full derivation of the fit.",
+        body,
+        "References",
+        " ".join(["Smith, A. 2020, ApJ, 900, 1."] * 200),
+    ])
+    context = select_context(text, embedding_model=None, token_budget=800)
+    assert "depletion time" in context
+    assert "ApJ" not in context
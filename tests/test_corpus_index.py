@@ -0,0 +1,158 @@
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+from src.corpus_index import CorpusIndex
+from src.ranking_utils import normalize_rows
+
+DIM = 16
+
+
+def unit_vectors(n, seed=0):
+    return normalize_rows(np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32))
+
+
+def ids(start, stop, version=1):
+    return [f"2601.{i:05d}v{version}" for i in range(start, stop)]
+
+
+def drifting_vectors(n, n_clusters=40, seed=0):
+    """Clustered vectors whose topics shift as the corpus grows, so early centroids fit later rows poorly."""
+    rng = np.random.default_rng(seed)
+    centers = unit_vectors(n_clusters, seed + 1000)
+    clusters = (np.arange(n) * n_clusters // n + rng.integers(0, 3, n)) % n_clusters
+    return normalize_rows(centers[clusters] + 0.25 * rng.standard_normal((n, DIM)))
+
+
+def sample_queries(vectors, n=50, seed=5):
+    rows = np.random.default_rng(seed).choice(len(vectors), n, replace=False)
+    return normalize_rows(vectors[rows] + 0.05)
+
+
+def recall_at_10(index, vectors, queries):
+    hits = 0
+    for query in queries:
+        exact = set(np.argsort(-(vectors @ query))[:10].tolist())
+        found = {int(paper_id[5:10]) for paper_id, _ in index.search(query, k=10)}
+        hits += len(exact & found)
+    return hits / (10 * len(queries))
+
+
+def test_round_trip_and_search(tmp_path):
+    vectors = unit_vectors(50)
+    index = CorpusIndex(str(tmp_path), DIM)
+    assert index.add(ids(0, 50), vectors) == 50
+    index.save()
+    loaded = CorpusIndex.load(str(tmp_path))
+    assert len(loaded) == 50 and '2601.00007v3' in loaded
+    assert loaded.search(vectors[7], k=1)[0][0] == '2601.00007v1'
+    assert '2601.00007v1' not in [paper_id for paper_id, _ in loaded.search_similar_to('2601.00007v1', k=5)]
+
+
+def test_newer_versions_replace_their_row(tmp_path):
+    vectors = unit_vectors(3)
+    index = CorpusIndex(str(tmp_path), DIM)
+    index.add(ids(0, 3), vectors)
+    index.save()
+    assert index.add(['2601.00001v2'], vectors[2:3]) == 0
+    assert index.add(['2601.00001v1'], vectors[0:1]) == 0
+    index.save()
+    loaded = CorpusIndex.load(str(tmp_path))
+    assert len(loaded) == 3 and loaded.ids[1] == '2601.00001v2'
+    assert os.path.getsize(loaded.vectors_path) == 3 * DIM * 4
+    assert {paper_id for paper_id, _ in loaded.search(vectors[2], k=2)} == {'2601.00001v2', '2601.00002v1'}
+
+
+def test_stale_instances_keep_each_others_papers(tmp_path):
+    vectors = unit_vectors(10)
+    CorpusIndex(str(tmp_path), DIM).save()
+    service = CorpusIndex.open(str(tmp_path), DIM)  # e.g. a long-running service
+    cli = CorpusIndex.open(str(tmp_path), DIM)
+    cli.add(ids(0, 4), vectors[:4])
+    cli.save()
+    service.add(ids(4, 5), vectors[4:5])
+    service.save()
+    cli.add(ids(5, 7), vectors[5:7])
+    service.add(['2601.00000v2'], vectors[9:10])
+    service.save()
+    cli.save()
+
+    loaded = CorpusIndex.load(str(tmp_path))
+    assert sorted(loaded.ids) == sorted(['2601.00000v2'] + ids(1, 7))
+    for row, paper_id in enumerate(loaded.ids):
+        expected = vectors[9] if paper_id == '2601.00000v2' else vectors[int(paper_id[5:10])]
+        assert np.allclose(loaded._vectors()[row], expected)
+    assert not [name for name in os.listdir(str(tmp_path)) if name.endswith('.unsaved')]
+
+
+def _add_in_process(path, start, stop):
+    index = CorpusIndex.open(path, DIM)
+    for i in range(start, stop):
+        index.add(ids(i, i + 1), unit_vectors(1, seed=i))
+        index.save()
+
+
+def test_concurrent_processes_lose_no_papers(tmp_path):
+    CorpusIndex(str(tmp_path), DIM).save()
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_add_in_process, args=(str(tmp_path), 20 * w, 20 * w + 20)) for w in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    loaded = CorpusIndex.load(str(tmp_path))
+    assert sorted(loaded.ids) == ids(0, 60)
+    for row, paper_id in enumerate(loaded.ids):
+        assert np.allclose(loaded._vectors()[row], unit_vectors(1, seed=int(paper_id[5:10]))[0])
+
+
+def test_unsaved_rows_from_a_crash_are_trimmed(tmp_path):
+    index = CorpusIndex(str(tmp_path), DIM)
+    index.add(ids(0, 5), unit_vectors(5))
+    index.save()
+    with open(index.vectors_path, 'ab') as f:
+        f.write(unit_vectors(2, seed=1).tobytes())  # appended by a save that never wrote its metadata
+    loaded = CorpusIndex.load(str(tmp_path))
+    assert len(loaded) == 5 and os.path.getsize(loaded.vectors_path) == 5 * DIM * 4
+
+
+def test_index_retrains_as_it_grows(tmp_path):
+    vectors = drifting_vectors(8000)
+    index = CorpusIndex(str(tmp_path), DIM, train_threshold=500, n_probe=8)
+    index.add(ids(0, 500), vectors[:500])
+    assert index.is_trained and index.trained_rows == 500
+    first_lists = len(index.centroids)
+    for start in range(500, 8000, 500):
+        index.add(ids(start, start + 500), vectors[start:start + 500])
+    index.save()
+    assert index.trained_rows == 8000 and len(index.centroids) > first_lists
+
+    loaded = CorpusIndex.load(str(tmp_path))
+    assert loaded.trained_rows == 8000 and len(loaded.centroids) == len(index.centroids)
+    assert recall_at_10(loaded, vectors, sample_queries(vectors)) >= 0.8
+
+
+def test_retraining_keeps_recall_and_lists_short_after_growth(tmp_path):
+    vectors = drifting_vectors(8000)
+    fixed = CorpusIndex(str(tmp_path / 'fixed'), DIM, train_threshold=500, n_probe=8, retrain_factor=float('inf'))
+    grown = CorpusIndex(str(tmp_path / 'grown'), DIM, train_threshold=500, n_probe=8)
+    for start in range(0, 8000, 500):
+        fixed.add(ids(start, start + 500), vectors[start:start + 500])
+        grown.add(ids(start, start + 500), vectors[start:start + 500])
+    queries = sample_queries(vectors)
+    scanned = {index: np.mean([len(index._candidate_rows(query, 8)) for query in queries]) for index in (fixed, grown)}
+    # Lists trained on the first 500 rows hold ever more rows of topics they were not trained on.
+    assert recall_at_10(grown, vectors, queries) > recall_at_10(fixed, vectors, queries)
+    assert scanned[grown] < scanned[fixed] / 2
+    assert np.bincount(grown.assignments).max() < np.bincount(fixed.assignments).max() / 2
+
+
+@pytest.mark.parametrize('quantization', ['float16', 'float32'])
+def test_other_quantizations(tmp_path, quantization):
+    vectors = unit_vectors(20)
+    index = CorpusIndex(str(tmp_path), DIM, quantization=quantization)
+    index.add(ids(0, 20), vectors)
+    index.save()
+    assert CorpusIndex.load(str(tmp_path)).search(vectors[3], k=1)[0][0] == '2601.00003v1'
@@ -0,0 +1,134 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.download_utils import create_session, download_pdfs, fetch_pdf
+from src.rate_limit import TokenBucket
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((time.monotonic(), self.path))
+            hits = sum(1 for _, path in server.requests if path == self.path)
+        if self.path.startswith('/pdf/'):
+            size = int(self.path.rsplit('/', 1)[1])
+            body = b'%PDF' + b'x' * (size - 4)
+            self._send(200, body)
+        elif self.path == '/flaky' and hits == 1:
+            self._send(503, headers={"Retry-After": "0"})
+        elif self.path == '/flaky':
+            self._send(200, b'%PDF flaky')
+        else:
+            self._send(404, b"not found")
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_paces_to_its_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(2.0, capacity=1, clock=clock, sleep=clock.sleep)
+    for _ in range(5):
+        assert bucket.acquire()
+    assert clock.now == pytest.approx(2.0)
+
+
+def test_token_bucket_allows_bursts_and_oversized_requests():
+    clock = FakeClock()
+    bucket = TokenBucket(1.0, capacity=3, clock=clock, sleep=clock.sleep)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.now == 0.0
+    bucket.acquire(10)  # waits for a full bucket, then goes into debt
+    assert clock.now == pytest.approx(3.0)
+    bucket.acquire()
+    assert clock.now == pytest.approx(11.0)
+
+
+def test_token_bucket_wait_can_be_cancelled():
+    bucket = TokenBucket(0.01, capacity=1)
+    bucket.acquire()
+    cancel = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+    started = time.monotonic()
+    assert bucket.acquire(cancel_event=cancel) is False
+    assert time.monotonic() - started < 2
+
+
+def test_downloads_share_one_rate_limit(server):
+    urls = [f"{server.url}/pdf/{i}/100" for i in range(6)]
+    buffers = download_pdfs(urls, max_workers=6, requests_per_second=20, burst=1)
+    assert [buffer.read() for buffer in buffers] == [b'%PDF' + b'x' * 96] * 6
+    times = sorted(at for at, _ in server.requests)
+    # Six requests at 20 per second with no burst take at least 5 intervals of 50 ms.
+    assert times[-1] - times[0] >= 0.2
+
+
+def test_large_pdfs_spill_to_disk(server):
+    session = create_session()
+    small = fetch_pdf(f"{server.url}/pdf/a/1000", session, spill_threshold=4096)
+    large = fetch_pdf(f"{server.url}/pdf/b/10000", session, spill_threshold=4096)
+    assert not small._rolled and large._rolled
+    assert len(large.read()) == 10000 and large.tell() == 10000
+    session.close()
+
+
+def test_retryable_errors_are_retried(server):
+    buffer = fetch_pdf(f"{server.url}/flaky", create_session(), backoff_base=0.01)
+    assert buffer.read() == b'%PDF flaky'
+    assert [path for _, path in server.requests] == ['/flaky', '/flaky']
+
+
+@pytest.mark.parametrize('url', ['{url}/missing', 'http://[not-a-url', 'nope://host/paper.pdf'])
+def test_failed_urls_return_none_without_aborting_the_batch(server, url):
+    buffers = download_pdfs([f"{server.url}/pdf/ok/50", url.format(url=server.url), None], requests_per_second=1e6,
+                            max_retries=1)
+    assert buffers[0].read().startswith(b'%PDF')
+    assert buffers[1:] == [None, None]
+
+
+def test_unreachable_host_gives_up_after_retries():
+    assert fetch_pdf("http://127.0.0.1:9/paper.pdf", create_session(), max_retries=2, backoff_base=0.01,
+                     timeout=1) is None
+
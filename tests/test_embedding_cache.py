@@ -0,0 +1,98 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from src.embedding_cache import EmbeddingCache, make_cache_key
+
+
+def vectors(n, dim=4, seed=0):
+    return np.random.default_rng(seed).random((n, dim), dtype=np.float32)
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / 'embeddings')
+
+
+def test_cache_key_tracks_version_and_text():
+    key = make_cache_key('http://arxiv.org/abs/2504.06802v1', "abstract")
+    assert key.startswith('2504.06802|1|')
+    assert key != make_cache_key('http://arxiv.org/abs/2504.06802v2', "abstract")
+    assert key != make_cache_key('http://arxiv.org/abs/2504.06802v1', "edited abstract")
+
+
+def test_round_trip_across_instances(cache_dir):
+    cache = EmbeddingCache(cache_dir, 'model/a')
+    data = vectors(3)
+    cache.put_many(['a', 'b', 'c'], data, flush=True)
+    assert np.array_equal(cache.get('b'), data[1])
+    assert cache.get('missing') is None
+
+    reopened = EmbeddingCache(cache_dir, 'model/a')
+    assert len(reopened) == 3
+    assert np.array_equal(reopened.get_or_encode(['c', 'a'], ["", ""], None), data[[2, 0]])
+    assert len(EmbeddingCache(cache_dir, 'model/b')) == 0
+
+
+def test_get_or_encode_only_encodes_misses(cache_dir):
+    cache = EmbeddingCache(cache_dir, 'model')
+    encoded = []
+
+    def encode(texts):
+        encoded.append(list(texts))
+        return np.array([[len(text), 0, 0, 0] for text in texts], dtype=np.float32)
+
+    first = cache.get_or_encode(['a', 'b', 'a'], ["x", "yy", "x"], encode)
+    second = cache.get_or_encode(['b', 'c'], ["yy", "zzz"], encode)
+    assert encoded == [["x", "yy"], ["zzz"]]
+    assert first[:, 0].tolist() == [1, 2, 1]
+    assert second[:, 0].tolist() == [2, 3]
+
+
+def test_index_writes_are_batched_until_flush(cache_dir):
+    cache = EmbeddingCache(cache_dir, 'model', flush_every=100)
+    cache.put_many(['a'], vectors(1))
+    assert 'a' in cache and 'a' not in EmbeddingCache(cache_dir, 'model')
+    cache.flush()
+    assert 'a' in EmbeddingCache(cache_dir, 'model')
+
+
+def test_writers_in_separate_instances_keep_each_others_entries(cache_dir):
+    first, second = EmbeddingCache(cache_dir, 'model'), EmbeddingCache(cache_dir, 'model')
+    first.put_many(['a'], vectors(1, seed=1), flush=True)
+    second.put_many(['b'], vectors(1, seed=2), flush=True)
+    reopened = EmbeddingCache(cache_dir, 'model')
+    assert np.array_equal(reopened.get('a'), vectors(1, seed=1)[0])
+    assert np.array_equal(reopened.get('b'), vectors(1, seed=2)[0])
+
+
+def test_partial_row_is_cut_off_before_appending(cache_dir):
+    cache = EmbeddingCache(cache_dir, 'model')
+    cache.put_many(['a'], vectors(1, seed=1), flush=True)
+    with open(cache.vectors_path, 'ab') as f:
+        f.write(b'\x00' * 6)  # an interrupted write
+    cache.put_many(['b'], vectors(1, seed=2), flush=True)
+    assert os.path.getsize(cache.vectors_path) == 2 * 4 * 4
+    assert np.array_equal(EmbeddingCache(cache_dir, 'model').get('b'), vectors(1, seed=2)[0])
+
+
+def test_eviction_compacts_the_remaining_vectors(cache_dir):
+    cache = EmbeddingCache(cache_dir, 'model')
+    data = vectors(3)
+    cache.put_many(['a'], data[:1], flush=True)
+    time.sleep(0.3)
+    cache.put_many(['b', 'c'], data[1:], flush=True)
+    assert cache.evict(max_age_days=0.1 / 86400) == 1
+    assert os.path.getsize(cache.vectors_path) == 2 * 4 * 4
+    reopened = EmbeddingCache(cache_dir, 'model')
+    assert reopened.get('a') is None
+    assert np.array_equal(reopened.get('b'), data[1]) and np.array_equal(reopened.get('c'), data[2])
+
+
+def test_dimension_mismatch_is_rejected(cache_dir):
+    cache = EmbeddingCache(cache_dir, 'model')
+    cache.put_many(['a'], vectors(1, dim=4))
+    with pytest.raises(ValueError):
+        cache.put_many(['b'], vectors(1, dim=8))
@@ -0,0 +1,95 @@
+import io
+import multiprocessing
+import tempfile
+import time
+
+import pytest
+
+from benchmarks.fixtures import make_pdf
+from src import extraction_runner
+from src.extraction_runner import (STATUS_ERROR, STATUS_FALLBACK, STATUS_MEMORY, STATUS_OK, STATUS_TIMEOUT,
+                                   STATUS_TRUNCATED, extract_text_sandboxed, extract_texts_sandboxed,
+                                   report_extraction_problems)
+from src.pdf_utils import extract_text_from_pdf, iter_pdf_pages, spill_pdf_source
+
+# Patched page iterators only reach the worker when it is forked from this process.
+needs_fork = pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason="needs the fork start method")
+
+
+def test_clean_extraction_is_ok():
+    pdf = make_pdf(3)
+    result = extract_text_sandboxed(pdf)
+    assert result['status'] == STATUS_OK and result['reason'] is None
+    assert result['pages_extracted'] == result['total_pages'] == 3
+    assert result['text'] == extract_text_from_pdf(pdf)
+
+
+def test_page_limit_truncates():
+    result = extract_text_sandboxed(make_pdf(5), max_pages=2)
+    assert result['status'] == STATUS_TRUNCATED
+    assert (result['pages_extracted'], result['total_pages']) == (2, 5)
+    assert result['text'] == "".join(iter_pdf_pages(make_pdf(5), 0, 2))
+
+
+def test_fallback_extracts_the_first_pages_when_the_full_run_yields_nothing():
+    result = extract_text_sandboxed(make_pdf(6), timeout=0, fallback_pages=2, fallback_timeout=30)
+    assert result['status'] == STATUS_FALLBACK
+    assert result['pages_extracted'] == 2 and result['text']
+    assert result['reason'].startswith(STATUS_TIMEOUT)
+
+
+def _slow_pages(pdf_reader, start_page=0, end_page=None):
+    yield pdf_reader.pages[0].extract_text()
+    time.sleep(30)
+    yield "never sent"
+
+
+@needs_fork
+def test_timeout_keeps_the_pages_received(monkeypatch):
+    monkeypatch.setattr(extraction_runner, 'iter_reader_pages', _slow_pages)
+    started = time.monotonic()
+    result = extract_text_sandboxed(make_pdf(4), timeout=1, fallback_pages=0)
+    assert time.monotonic() - started < 10
+    assert result['status'] == STATUS_TIMEOUT and result['pages_extracted'] == 1
+    assert result['text'] and result['total_pages'] == 4
+
+
+def _greedy_pages(pdf_reader, start_page=0, end_page=None):
+    hog = bytearray(4 * 1024 ** 3)
+    yield str(len(hog))
+
+
+@needs_fork
+@pytest.mark.skipif(extraction_runner.resource is None, reason="needs the resource module")
+def test_memory_cap_is_reported(monkeypatch):
+    monkeypatch.setattr(extraction_runner, 'iter_reader_pages', _greedy_pages)
+    result = extract_text_sandboxed(make_pdf(2), max_memory_mb=256, fallback_pages=0)
+    assert result['status'] == STATUS_MEMORY and result['text'] is None
+
+
+def test_unparseable_pdf_is_an_error():
+    result = extract_text_sandboxed(b"not a pdf")
+    assert result['status'] == STATUS_ERROR and result['text'] is None
+
+
+def test_file_sources_are_passed_by_path(tmp_path):
+    on_disk = tmp_path / 'paper.pdf'
+    on_disk.write_bytes(make_pdf(1))
+    with open(on_disk, 'rb') as pdf_file:
+        assert spill_pdf_source(pdf_file, str(tmp_path), 'copy') == str(on_disk)
+    spooled = tempfile.SpooledTemporaryFile(max_size=10)
+    spooled.write(make_pdf(1))
+    path = spill_pdf_source(spooled, str(tmp_path), 'spooled')
+    assert path == str(tmp_path / 'spooled.pdf')
+    with open(path, 'rb') as spilled:
+        assert spilled.read() == make_pdf(1)
+
+
+def test_many_sources_keep_their_order():
+    buffer = io.BytesIO(make_pdf(2, seed=1))
+    buffer.seek(7)  # sources are rewound before they are spilled
+    results = extract_texts_sandboxed([make_pdf(1), None, buffer, b"broken"], max_workers=2, fallback_pages=0)
+    assert [result and result['status'] for result in results] == [STATUS_OK, None, STATUS_OK, STATUS_ERROR]
+    assert results[2]['text'] == extract_text_from_pdf(make_pdf(2, seed=1))
+    problems = report_extraction_problems(results, labels=['a', 'b', 'c', 'd'])
+    assert [(label, status) for label, status, _ in problems] == [('d', STATUS_ERROR)]
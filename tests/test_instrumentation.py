@@ -0,0 +1,86 @@
+import json
+import threading
+
+import pytest
+
+from src import instrumentation
+from src.instrumentation import Metrics, count, get_metrics, set_metrics, span
+
+
+@pytest.fixture
+def metrics():
+    previous = get_metrics()
+    metrics = Metrics()
+    set_metrics(metrics)
+    yield metrics
+    set_metrics(previous)
+
+
+def test_spans_aggregate_count_total_and_percentiles():
+    metrics = Metrics()
+    for seconds in [0.4, 0.1, 0.3, 0.2, 1.0]:
+        metrics.record('extract', seconds)
+    stats = metrics.snapshot()['spans']['extract']
+    assert stats['count'] == 5
+    assert stats['total_s'] == pytest.approx(2.0) and stats['mean_s'] == pytest.approx(0.4)
+    assert (stats['min_s'], stats['p50_s'], stats['p95_s'], stats['max_s']) == (0.1, 0.3, 1.0, 1.0)
+
+
+def test_percentiles_use_the_first_samples_only(monkeypatch):
+    monkeypatch.setattr(instrumentation, 'MAX_SAMPLES', 3)
+    metrics = Metrics()
+    for seconds in [1.0, 2.0, 3.0, 100.0]:
+        metrics.record('fetch', seconds)
+    stats = metrics.snapshot()['spans']['fetch']
+    assert stats['count'] == 4 and stats['max_s'] == 100.0 and stats['total_s'] == pytest.approx(106.0)
+    assert stats['p95_s'] == 3.0
+
+
+def test_span_records_even_when_the_block_raises(metrics):
+    with pytest.raises(RuntimeError):
+        with span('summarize'):
+            raise RuntimeError("boom")
+    with span('summarize'):
+        with span('llm.request'):
+            pass
+    spans = metrics.snapshot()['spans']
+    assert spans['summarize']['count'] == 2 and spans['llm.request']['count'] == 1
+    # Nested spans are inclusive.
+    assert spans['summarize']['max_s'] >= spans['llm.request']['max_s']
+
+
+def test_counters_add_up_across_threads(metrics):
+    def work():
+        for _ in range(1000):
+            count('download.requests')
+            count('download.bytes', 10)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert metrics.snapshot()['counters'] == {'download.bytes': 40000, 'download.requests': 4000}
+
+
+def test_reset_and_json_export(tmp_path):
+    metrics = Metrics()
+    metrics.record('embed', 0.5)
+    metrics.count('embed.papers', 3)
+    path = tmp_path / 'out' / 'metrics.json'
+    exported = json.loads(metrics.to_json(str(path)))
+    assert json.loads(path.read_text()) == exported
+    assert exported['spans']['embed']['count'] == 1 and exported['counters'] == {'embed.papers': 3}
+    assert [p.name for p in path.parent.iterdir()] == ['metrics.json']
+    metrics.reset()
+    assert metrics.snapshot()['spans'] == {} and metrics.snapshot()['counters'] == {}
+
+
+def test_set_metrics_redirects_the_module_helpers(metrics):
+    other = Metrics()
+    set_metrics(other)
+    count('llm.requests')
+    set_metrics(metrics)
+    count('llm.requests', 2)
+    assert other.snapshot()['counters'] == {'llm.requests': 1}
+    assert metrics.snapshot()['counters'] == {'llm.requests': 2}
@@ -0,0 +1,133 @@
+import math
+import multiprocessing
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from src.lexical_index import LexicalIndex, decode_varints, encode_varints, paper_terms, prefilter_papers, tokenize
+
+WORDS = ("galaxy quasar dust halo merger spectra redshift lensing cluster stellar feedback outflow survey "
+         "metallicity kinematics").split()
+
+
+def random_papers(n, seed=0):
+    rng = random.Random(seed)
+    return [{'id': f"http://arxiv.org/abs/2601.{i:05d}v1",
+             'title': " ".join(rng.choices(WORDS, k=rng.randint(2, 6))),
+             'abstract': " ".join(rng.choices(WORDS, k=rng.randint(10, 200))),
+             'comment': rng.choice([None, "10 pages, 3 figures", " ".join(rng.choices(WORDS, k=3))])}
+            for i in range(n)]
+
+
+def brute_force_bm25(papers, weighted_terms, k1=1.2, b=0.75):
+    docs = [paper_terms(paper) for paper in papers]
+    lengths = [sum(doc.values()) for doc in docs]
+    average = sum(lengths) / len(docs)
+    scores = []
+    for doc, length in zip(docs, lengths):
+        score = 0.0
+        for term, weight in weighted_terms.items():
+            df = sum(1 for other in docs if term in other)
+            if not df or not doc[term]:
+                continue
+            idf = math.log(1.0 + (len(docs) - df + 0.5) / (df + 0.5))
+            score += weight * idf * doc[term] * (k1 + 1.0) / (doc[term] + k1 * (1.0 - b + b * length / average))
+        scores.append(score)
+    return np.array(scores)
+
+
+def test_varints_round_trip():
+    values = [0, 1, 127, 128, 300, 16383, 16384, 2 ** 32 + 5]
+    assert decode_varints(encode_varints(values)).tolist() == values
+    assert decode_varints(b"").tolist() == []
+
+
+def test_tokenize_drops_stopwords_and_single_characters():
+    assert tokenize("The H-alpha emission of a z=2 galaxy") == ['alpha', 'emission', 'galaxy']
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_scores_match_brute_force(seed):
+    papers = random_papers(300, seed)
+    index = LexicalIndex()
+    index.add(papers[:150])
+    index.add(papers[150:])
+    query = Counter(tokenize("dust feedback in galaxy merger outflows")) + Counter({'lensing': 2.5})
+    assert np.allclose(index.score(query), brute_force_bm25(papers, query), rtol=1e-5, atol=1e-6)
+
+
+def test_search_ranks_like_brute_force(tmp_path):
+    papers = random_papers(200)
+    index = LexicalIndex(str(tmp_path / 'lexical.npz'))
+    index.add(papers)
+    index.save()
+    index = LexicalIndex.load(str(tmp_path / 'lexical.npz'))
+    expected = brute_force_bm25(papers, Counter(tokenize("quasar spectra redshift")))
+    results = index.search("quasar spectra redshift", k=10)
+    assert len(results) == 10
+    assert [score for _, score in results] == pytest.approx(sorted(expected, reverse=True)[:10], rel=1e-5)
+
+
+def test_boost_exclude_and_key_filters():
+    papers = [
+        {'id': 'a', 'title': "Dust in galaxies", 'abstract': "Dust emission."},
+        {'id': 'b', 'title': "Quasar outflows", 'abstract': "Dust and quasar feedback."},
+        {'id': 'c', 'title': "Weak lensing", 'abstract': "Cluster lensing with dust."},
+    ]
+    index = LexicalIndex()
+    assert index.add(papers) == 3
+    assert index.add(papers) == 0
+    assert {key for key, _ in index.search("dust")} == {'a', 'b', 'c'}
+    assert index.search("dust", boost_terms=['lensing'])[0][0] == 'c'
+    assert {key for key, _ in index.search("dust", exclude_terms=['quasar feedback'])} == {'a', 'c'}
+    assert [key for key, _ in index.search("dust", keys=['b'])] == ['b']
+
+
+def test_prefilter_keeps_original_order():
+    papers = random_papers(50)
+    selected = prefilter_papers(LexicalIndex(), papers, ["quasar", "dust"], candidates=5)
+    positions = [papers.index(paper) for paper in selected]
+    assert 5 <= len(selected) <= 10 and positions == sorted(positions)
+
+
+def test_stale_writers_keep_each_others_papers(tmp_path):
+    path = str(tmp_path / 'lexical.npz')
+    papers = random_papers(60, seed=3)
+    base = LexicalIndex(path)
+    base.add(papers[:20])
+    base.save()
+    first, second = LexicalIndex.load(path), LexicalIndex.load(path)
+    first.add(papers[20:40])
+    second.add(papers[30:60])  # overlaps the first writer's papers
+    first.save()
+    second.save()
+    merged = LexicalIndex.load(path)
+    assert sorted(merged.doc_keys) == sorted(paper['id'] for paper in papers)
+    assert len(second) == 60
+    expected = brute_force_bm25(sorted(papers, key=lambda paper: merged.doc_keys.index(paper['id'])),
+                                Counter(tokenize("dust halo")))
+    results = merged.search("dust halo", k=60)
+    assert [score for _, score in results] == pytest.approx(sorted(expected[expected > 0], reverse=True), rel=1e-5)
+    # A writer that is up to date does not reload the file.
+    second.add(random_papers(61, seed=4)[60:])
+    assert second.save() == path and len(LexicalIndex.load(path)) == 61
+
+
+def _add_and_save(path, start):
+    index = LexicalIndex.open(path)
+    for paper in random_papers(start + 10)[start:]:
+        index.add([paper])
+        index.save()
+
+
+def test_concurrent_saves_keep_every_paper(tmp_path):
+    path = str(tmp_path / 'lexical.npz')
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_add_and_save, args=(path, 10 * w)) for w in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert sorted(LexicalIndex.load(path).doc_keys) == sorted(paper['id'] for paper in random_papers(30))
@@ -0,0 +1,98 @@
+import time
+
+import pytest
+
+from src.llm_cache import LLMCache, make_cache_key
+from src.llm_utils import DEFAULT_MODEL, generate_content_with_history
+from src.summarize_executor import FakeGenaiClient
+
+CONFIG = {'temperature': 0.2, 'max_output_tokens': 1024}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = LLMCache(str(tmp_path / 'llm.sqlite'), bypass=False)
+    yield cache
+    cache.close()
+
+
+def test_cache_key_covers_model_config_and_prompt():
+    key = make_cache_key('gemini-a', CONFIG, "prompt")
+    assert key == make_cache_key('gemini-a', dict(reversed(list(CONFIG.items()))), "prompt")
+    assert key != make_cache_key('gemini-b', CONFIG, "prompt")
+    assert key != make_cache_key('gemini-a', dict(CONFIG, temperature=0.3), "prompt")
+    assert key != make_cache_key('gemini-a', CONFIG, "prompt ")
+    assert key != make_cache_key('gemini-a', None, "prompt")
+
+
+def test_round_trip_and_persistence(cache, tmp_path):
+    key = make_cache_key('gemini-a', CONFIG, "prompt")
+    assert cache.get(key) is None
+    cache.put(key, "Résumé of the paper")
+    assert cache.get(key) == "Résumé of the paper"
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+    reopened = LLMCache(cache.path, bypass=False)
+    assert reopened.get(key) == "Résumé of the paper"
+    reopened.close()
+
+
+def test_empty_responses_are_not_stored(cache):
+    cache.put('key', "")
+    assert cache.stats()['entries'] == 0
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = LLMCache(str(tmp_path / 'llm.sqlite'), ttl_seconds=0.05, bypass=False)
+    cache.put('key', "text")
+    time.sleep(0.1)
+    assert cache.get('key') is None
+    assert cache.evict() == 1
+    cache.close()
+
+
+def test_bypass_skips_reads_but_records_responses(tmp_path):
+    cache = LLMCache(str(tmp_path / 'llm.sqlite'), bypass=True)
+    cache.put('key', "text")
+    assert cache.get('key') is None
+    assert cache.stats()['entries'] == 1
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = LLMCache(str(tmp_path / 'llm.sqlite'), max_entries=2, bypass=False)
+    cache.put('a', "1")
+    time.sleep(0.01)
+    cache.put('b', "2")
+    time.sleep(0.01)
+    cache.get('a')
+    time.sleep(0.01)
+    cache.put('c', "3")
+    assert cache.get('b') is None
+    assert cache.get('a') == "1" and cache.get('c') == "3"
+    cache.close()
+
+
+def test_generate_content_with_history_uses_the_cache(cache):
+    client = FakeGenaiClient(responder=lambda prompt: f"answer to {prompt}")
+    first, _ = generate_content_with_history("question", client, cache=cache, config=CONFIG)
+    second, _ = generate_content_with_history("question", client, cache=cache, config=CONFIG)
+    assert first.text == second.text == "answer to question"
+    assert len(client.calls) == 1
+    assert cache.get(make_cache_key(DEFAULT_MODEL, CONFIG, "question")) == "answer to question"
+
+    generate_content_with_history("question", client, cache=cache, model='other-model', config=CONFIG)
+    assert len(client.calls) == 2
+
+
+def test_session_without_a_model_is_not_cached(cache):
+    client = FakeGenaiClient()
+    session = client.chats.create(model='gemini-a')
+    generate_content_with_history("question", client, chat_session=session, cache=cache)
+    generate_content_with_history("question", client, chat_session=session, cache=cache)
+    assert len(client.calls) == 2
+    assert cache.stats()['entries'] == 0
+
+    generate_content_with_history("question", client, chat_session=session, cache=cache, model='gemini-a')
+    generate_content_with_history("question", client, chat_session=session, cache=cache, model='gemini-a')
+    assert len(client.calls) == 3
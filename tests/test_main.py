@@ -0,0 +1,60 @@
+import datetime
+import json
+
+import pytest
+
+pytest.importorskip('dotenv')
+
+import main  # noqa: E402
+from src import batch as batch_module  # noqa: E402
+from src import pipeline  # noqa: E402
+from src.pipeline import PipelineContext, save_digest, user_digest_name  # noqa: E402
+
+
+@pytest.mark.parametrize('argv, func', [
+    (['fetch'], main.cmd_fetch),
+    (['rank', '--interests', 'dust', '--prefilter', '50'], main.cmd_rank),
+    (['summarize', 'http://arxiv.org/abs/2601.00001v1'], main.cmd_summarize),
+    (['digest', '--cached'], main.cmd_digest),
+    (['batch', '--config', 'users.json'], main.cmd_batch),
+    (['import', 'dump.xml.gz', '--no-embed'], main.cmd_import),
+    (['serve', '--port', '0'], main.cmd_serve),
+])
+def test_subcommands_dispatch(argv, func):
+    assert main.build_parser().parse_args(argv).func is func
+
+
+def test_default_command_is_the_digest(tmp_path, monkeypatch, capsys):
+    calls = []
+    monkeypatch.setattr(pipeline, 'run_digest', lambda ctx, category, *args, **kwargs: calls.append(category))
+    assert main.main(['--cache-dir', str(tmp_path)]) == 0
+    assert calls == [pipeline.DEFAULT_CATEGORY]
+    # run_digest returned None: nothing was new, which is not a failure.
+    assert "No new digest" in capsys.readouterr().out
+
+
+def test_cached_digests(tmp_path, capsys):
+    ctx = PipelineContext(cache_dir=str(tmp_path))
+    save_digest(ctx, datetime.date(2026, 1, 5), 'astro-ph.GA', "# GA digest")
+    save_digest(ctx, datetime.date(2026, 1, 5), user_digest_name('ashley'), "# Ashley's digest")
+    base = ['--cache-dir', str(tmp_path), 'digest', '--cached', '--date', '20260105']
+    assert main.main(base) == 0 and "# GA digest" in capsys.readouterr().out
+    assert main.main(base + ['--user', 'ashley']) == 0 and "# Ashley's digest" in capsys.readouterr().out
+    assert main.main(base + ['--user', 'bo']) == 1
+
+
+def test_batch_with_nothing_new_succeeds(tmp_path, monkeypatch, capsys):
+    config = tmp_path / 'users.json'
+    config.write_text(json.dumps({'users': [{'name': 'ashley', 'categories': 'astro-ph.GA', 'interests': 'dust'}]}))
+    results = [{'ashley': '/digests/ashley.md'}, {}]
+    monkeypatch.setattr(batch_module, 'run_batch', lambda ctx, config: results.pop(0))
+    argv = ['--cache-dir', str(tmp_path), 'batch', '--config', str(config)]
+    assert main.main(argv) == 0 and "Digest for ashley: /digests/ashley.md" in capsys.readouterr().out
+    assert main.main(argv) == 0 and "No new digests" in capsys.readouterr().out
+
+
+def test_metrics_are_written_even_on_failure(tmp_path):
+    metrics = tmp_path / 'metrics.json'
+    argv = ['--cache-dir', str(tmp_path), '--metrics', str(metrics), 'digest', '--cached', '--date', '20260105']
+    assert main.main(argv) == 1
+    assert 'digest' in json.loads(metrics.read_text())['spans']
@@ -0,0 +1,132 @@
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.download_utils import create_session, fetch_pdf_cached
+from src.paper_cache import PaperCache, paper_cache_key
+
+VERSIONED = 'http://arxiv.org/abs/2504.06802v1'
+UNVERSIONED = 'http://arxiv.org/abs/2504.06802'
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = PaperCache(str(tmp_path / 'papers'))
+    yield cache
+    cache.close()
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('http://arxiv.org/abs/2504.06802v1', ('2504.06802v1', True)),
+    ('http://export.arxiv.org/pdf/2504.06802v1.pdf', ('2504.06802v1', True)),
+    ('https://arxiv.org/pdf/2504.06802', ('2504.06802', False)),
+    ('http://arxiv.org/abs/astro-ph/0601001v2', ('astro-ph_0601001v2', True)),
+])
+def test_cache_keys(url, expected):
+    assert paper_cache_key(url) == expected
+
+
+def test_non_arxiv_urls_are_hashed():
+    key, versioned = paper_cache_key('https://example.org/paper.pdf')
+    assert key.startswith('url-') and not versioned
+
+
+def test_pdf_round_trip_from_bytes_and_file(cache):
+    assert cache.get_pdf(VERSIONED) is None
+    cache.put_pdf(VERSIONED, b'%PDF-1.4 bytes')
+    with cache.get_pdf('http://export.arxiv.org/pdf/2504.06802v1.pdf') as f:
+        assert f.read() == b'%PDF-1.4 bytes'
+
+    cache.put_pdf('http://arxiv.org/abs/2504.00001v1', io.BytesIO(b'%PDF-1.4 stream'))
+    with open(cache.pdf_path('http://arxiv.org/abs/2504.00001v1'), 'rb') as f:
+        assert f.read() == b'%PDF-1.4 stream'
+    assert cache.stats()['pdfs'] == 2
+
+
+def test_text_round_trip(cache):
+    assert cache.get_text(VERSIONED) is None
+    cache.put_text(VERSIONED, "Extracted text with ünïcode", status='ok')
+    assert cache.get_text(VERSIONED) == "Extracted text with ünïcode"
+
+
+def test_unversioned_entries_are_revalidated(tmp_path):
+    cache = PaperCache(str(tmp_path / 'papers'), revalidate_after=0.05)
+    cache.put_pdf(UNVERSIONED, b'%PDF v1', etag='"abc"', last_modified='Mon, 05 Jan 2026 00:00:00 GMT')
+    cache.put_pdf(VERSIONED, b'%PDF v1')
+    time.sleep(0.1)
+    assert cache.get_pdf(UNVERSIONED) is None
+    assert cache.conditional_headers(UNVERSIONED) == {'If-None-Match': '"abc"',
+                                                      'If-Modified-Since': 'Mon, 05 Jan 2026 00:00:00 GMT'}
+    with cache.mark_revalidated(UNVERSIONED) as f:
+        assert f.read() == b'%PDF v1'
+    with cache.get_pdf(VERSIONED) as f:
+        assert f.read() == b'%PDF v1'
+    cache.close()
+
+
+def test_new_pdf_content_drops_the_old_text(cache):
+    cache.put_pdf(UNVERSIONED, b'%PDF v1')
+    cache.put_text(UNVERSIONED, "old text")
+    cache.put_pdf(UNVERSIONED, b'%PDF v1')
+    assert cache.get_text(UNVERSIONED) == "old text"
+    cache.put_pdf(UNVERSIONED, b'%PDF v2')
+    assert cache.get_text(UNVERSIONED) is None
+
+
+def test_least_recently_used_papers_are_evicted(tmp_path):
+    cache = PaperCache(str(tmp_path / 'papers'), max_bytes=25)
+    cache.put_pdf('http://arxiv.org/abs/2504.00001v1', b'x' * 10)
+    time.sleep(0.01)
+    cache.put_pdf('http://arxiv.org/abs/2504.00002v1', b'x' * 10)
+    time.sleep(0.01)
+    cache.get_pdf('http://arxiv.org/abs/2504.00001v1').close()
+    time.sleep(0.01)
+    cache.put_pdf('http://arxiv.org/abs/2504.00003v1', b'x' * 10)
+    assert cache.pdf_path('http://arxiv.org/abs/2504.00002v1') is None
+    assert cache.pdf_path('http://arxiv.org/abs/2504.00001v1') is not None
+    assert cache.stats()['bytes'] <= 25
+    cache.close()
+
+
+class _ConditionalHandler(BaseHTTPRequestHandler):
+    """Serves one PDF with an ETag and answers 304 when the request already has it."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(self.headers.get('If-None-Match'))
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = b'%PDF v1'
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def test_not_modified_reuses_the_cached_copy(tmp_path):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _ConditionalHandler)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/pdf/2504.06802"
+    cache = PaperCache(str(tmp_path / 'papers'), revalidate_after=0)
+    session = create_session()
+    try:
+        for _ in range(2):
+            pdf = fetch_pdf_cached(url, session, cache)
+            assert pdf.read() == b'%PDF v1'
+            pdf.close()
+        assert server.requests == [None, '"v1"']
+        assert cache.stats()['revalidated'] == 1
+    finally:
+        session.close()
+        cache.close()
+        server.shutdown()
+        server.server_close()
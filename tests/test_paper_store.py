@@ -0,0 +1,87 @@
+import datetime
+import io
+import multiprocessing
+import os
+
+import numpy as np
+
+from benchmarks.fixtures import make_entry, make_feed
+from src.arxiv_utils import iter_arxiv_entries
+from src.paper_store import PaperBatch, load_snapshots, save_daily_snapshot
+
+DAY = datetime.date(2026, 1, 5)
+
+
+def make_papers(indices, category="astro-ph.GA", seed=0):
+    feed = make_feed([make_entry(i, seed, category) for i in indices])
+    return list(iter_arxiv_entries(io.BytesIO(feed.encode('utf-8'))))
+
+
+def with_version(paper, version):
+    paper = dict(paper)
+    paper['id'] = paper['id'].rsplit('v', 1)[0] + f"v{version}"
+    return paper
+
+
+def test_batch_round_trips_through_a_file(tmp_path):
+    papers = make_papers(range(12)) + [{'id': 'http://arxiv.org/abs/2601.99999v1', 'title': None, 'authors': []}]
+    path = str(tmp_path / 'batch.npz')
+    PaperBatch.from_dicts(papers).save(path)
+    loaded = PaperBatch.load(path)
+    assert len(loaded) == 13
+    assert loaded.to_dicts()[:12] == papers[:12]
+    assert loaded[-1].id == 'http://arxiv.org/abs/2601.99999v1' and loaded[-1].published is None
+    assert os.listdir(str(tmp_path)) == ['batch.npz']
+
+
+def test_concat_recodes_vocabularies_and_keeps_filters_working():
+    first = PaperBatch.from_dicts(make_papers(range(5), "astro-ph.GA"))
+    second = PaperBatch.from_dicts(make_papers(range(5, 9), "astro-ph.CO"))
+    merged = PaperBatch.concat([first, second])
+    assert merged.to_dicts() == first.to_dicts() + second.to_dicts()
+    assert np.flatnonzero(merged.mask_category("astro-ph.CO", primary_only=True)).tolist() == [5, 6, 7, 8]
+    assert merged.take([6, 1]).to_dicts() == [second[1].to_dict(), first[1].to_dict()]
+    assert len(PaperBatch.concat([])) == 0
+
+
+def test_snapshots_replace_unless_merged(tmp_path):
+    directory = str(tmp_path)
+    save_daily_snapshot(make_papers(range(4)), directory, DAY, name='astro-ph.GA')
+    save_daily_snapshot(make_papers(range(2, 6)), directory, DAY, name='astro-ph.GA')
+    assert [paper.id for paper in load_snapshots(directory)] == [paper['id'] for paper in make_papers(range(2, 6))]
+
+    save_daily_snapshot(make_papers(range(4)), directory, DAY, name='astro-ph.GA')
+    updated = with_version(make_papers([1])[0], 9)
+    path = save_daily_snapshot([updated] + make_papers(range(4, 6)), directory, DAY, name='astro-ph.GA', merge=True)
+    merged = PaperBatch.load(path)
+    ids = [paper.id for paper in merged]
+    assert len(ids) == 6 and updated['id'] in ids
+    assert sorted(paper_id.rsplit('v', 1)[0] for paper_id in ids) == sorted(
+        paper['id'].rsplit('v', 1)[0] for paper in make_papers(range(6)))
+
+
+def test_load_snapshots_filters_by_date_and_skips_partial_files(tmp_path):
+    directory = str(tmp_path)
+    for offset in range(3):
+        save_daily_snapshot(make_papers([offset]), directory, DAY + datetime.timedelta(days=offset))
+    with open(os.path.join(directory, '20260106.npz.123.tmp.npz'), 'wb') as f:
+        f.write(b'partial')
+    assert len(load_snapshots(directory)) == 3
+    window = load_snapshots(directory, DAY + datetime.timedelta(days=1), DAY + datetime.timedelta(days=1))
+    assert [paper.id for paper in window] == [make_papers([1])[0]['id']]
+
+
+def _merge_in_process(directory, start):
+    for i in range(start, start + 10):
+        save_daily_snapshot(make_papers([i]), directory, DAY, name='astro-ph.GA', merge=True)
+
+
+def test_concurrent_merges_keep_every_paper(tmp_path):
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_merge_in_process, args=(str(tmp_path), 10 * w)) for w in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    merged = load_snapshots(str(tmp_path))
+    assert sorted(paper.id for paper in merged) == sorted(paper['id'] for paper in make_papers(range(30)))
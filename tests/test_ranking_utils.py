@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from benchmarks.stubs import HashingEmbeddingModel
+from src.ranking_utils import normalize_rows, rank_papers, score_profiles, top_k_indices
+
+TOPICS = ["dust in star-forming galaxies", "quasar outflows and feedback", "weak lensing of galaxy clusters",
+          "stellar kinematics of dwarf galaxies", "molecular gas in galaxy mergers", "cosmic reionization"]
+
+
+def make_papers(n):
+    return [{'id': f"http://arxiv.org/abs/2601.{i:05d}v1", 'title': f"Paper {i}",
+             'abstract': f"{TOPICS[i % len(TOPICS)]} observed in survey {i % 7} with {TOPICS[(i * 5) % len(TOPICS)]}"}
+            for i in range(n)]
+
+
+def loop_ranking(papers, interest, model, top_k):
+    """The per-paper loop that rank_papers replaced."""
+    interest_embedding = model.encode([interest])[0]
+    ranked = []
+    for paper in papers:
+        embedding = model.encode([paper['abstract']])[0]
+        similarity = float(np.dot(interest_embedding, embedding) /
+                           (np.linalg.norm(interest_embedding) * np.linalg.norm(embedding)))
+        ranked.append({'metadata': paper, 'similarity': similarity})
+    ranked.sort(key=lambda item: item['similarity'], reverse=True)
+    return ranked[:top_k]
+
+
+@pytest.mark.parametrize('k', [0, 1, 3, 7, 8, 20])
+def test_top_k_matches_argsort(k):
+    rng = np.random.default_rng(k)
+    scores = rng.integers(0, 4, size=(5, 8)).astype(np.float32)  # plenty of ties
+    result = top_k_indices(scores, k)
+    expected = np.argsort(-scores, axis=1, kind='stable')[:, :min(k, 8)]
+    assert result.shape == expected.shape
+    # Ties may be broken differently at the partition boundary, but the scores must agree.
+    assert np.array_equal(np.take_along_axis(scores, result, axis=1), np.take_along_axis(scores, expected, axis=1))
+    if k >= 8 or k == 0:
+        assert np.array_equal(result, expected)
+
+
+def test_top_k_rows_are_independent_and_unique():
+    scores = np.random.default_rng(0).random((4, 50))
+    result = top_k_indices(scores, 10)
+    for row, indices in zip(scores, result):
+        assert len(set(indices.tolist())) == 10
+        assert np.array_equal(indices, np.argsort(-row)[:10])
+
+
+def test_score_profiles_matches_dot_products():
+    rng = np.random.default_rng(1)
+    profiles, papers = normalize_rows(rng.random((3, 16))), normalize_rows(rng.random((30, 16)))
+    indices, scores = score_profiles(profiles, papers, top_k=4)
+    for row in range(3):
+        similarities = papers @ profiles[row]
+        assert np.array_equal(indices[row], np.argsort(-similarities)[:4])
+        assert np.allclose(scores[row], similarities[indices[row]])
+
+
+def test_rank_papers_matches_the_per_paper_loop():
+    model, papers = HashingEmbeddingModel(), make_papers(40)
+    ranked = rank_papers(papers, TOPICS[1], model, top_k=5)
+    expected = loop_ranking(papers, TOPICS[1], model, 5)
+    assert [item['similarity'] for item in ranked] == pytest.approx([item['similarity'] for item in expected], abs=1e-5)
+    assert {item['metadata']['id'] for item in ranked} == {item['metadata']['id'] for item in expected}
+
+
+def test_multi_profile_ranking_matches_one_loop_per_profile():
+    model, papers = HashingEmbeddingModel(), make_papers(40)
+    interests = [TOPICS[0], TOPICS[2], TOPICS[4]]
+    ranked = rank_papers(papers, interests, model, top_k=5)
+    assert len(ranked) == 3
+    for interest, profile_ranking in zip(interests, ranked):
+        expected = loop_ranking(papers, interest, model, 5)
+        assert [item['similarity'] for item in profile_ranking] == \
+            pytest.approx([item['similarity'] for item in expected], abs=1e-5)
+
+    # The best score over all profiles, as batch users with several interests are ranked.
+    best = np.max([[max((item['similarity'] for item in loop_ranking([paper], interest, model, 1)))
+                    for paper in papers] for interest in interests], axis=0)
+    profile_embeddings = model.encode(interests)
+    paper_embeddings = model.encode([paper['abstract'] for paper in papers])
+    assert np.allclose((profile_embeddings @ paper_embeddings.T).max(axis=0), best, atol=1e-5)
+
+
+def test_papers_without_abstracts_are_skipped():
+    papers = make_papers(3) + [{'id': 'http://arxiv.org/abs/2601.99999v1', 'abstract': None}]
+    ranked = rank_papers(papers, TOPICS[0], HashingEmbeddingModel(), top_k=10)
+    assert len(ranked) == 3
+    assert rank_papers([], TOPICS[0], HashingEmbeddingModel()) == []
@@ -0,0 +1,146 @@
+import datetime
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+import pytest
+import requests
+
+from benchmarks.stubs import HashingEmbeddingModel
+from src import batch as batch_module
+from src import service as service_module
+from src.pipeline import PipelineContext, save_digest, user_digest_name
+from src.service import RankingService, make_handler
+
+
+@pytest.fixture
+def ranking_service(tmp_path):
+    return RankingService(PipelineContext(cache_dir=str(tmp_path)), max_cached_days=2)
+
+
+def fake_loader(loads, delays=None, results=None):
+    def load_papers(ctx, category, end_date, start_date=None):
+        loads.append((category, end_date))
+        time.sleep((delays or {}).get(category, 0))
+        if results is not None and category in results:
+            return results[category]
+        return [{'id': category}], np.ones((1, 4), dtype=np.float32)
+    return load_papers
+
+
+def test_slow_load_does_not_block_other_windows(ranking_service, monkeypatch):
+    loads = []
+    monkeypatch.setattr(service_module, 'load_papers', fake_loader(loads, delays={'slow': 1.0}))
+    slow = threading.Thread(target=ranking_service.papers_for, args=('slow', '1', '2'))
+    slow.start()
+    time.sleep(0.1)
+    started = time.perf_counter()
+    ranking_service.papers_for('fast', '1', '2')
+    assert time.perf_counter() - started < 0.5
+    slow.join()
+
+
+def test_concurrent_requests_for_one_window_share_a_single_load(ranking_service, monkeypatch):
+    loads = []
+    monkeypatch.setattr(service_module, 'load_papers', fake_loader(loads, delays={'GA': 0.3}))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(ranking_service.papers_for('GA', '1', '2')))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads == [('GA', '2')]
+    assert len(results) == 5 and all(result is results[0] for result in results)
+
+
+def test_empty_and_failed_loads_are_not_cached(ranking_service, monkeypatch):
+    loads = []
+    monkeypatch.setattr(service_module, 'load_papers', fake_loader(loads, results={'empty': ([], None)}))
+    ranking_service.papers_for('empty', '1', '2')
+    ranking_service.papers_for('empty', '1', '2')
+    assert len(loads) == 2
+
+    def failing_loader(*args, **kwargs):
+        raise RuntimeError("arXiv is down")
+    monkeypatch.setattr(service_module, 'load_papers', failing_loader)
+    with pytest.raises(RuntimeError):
+        ranking_service.papers_for('down', '1', '2')
+    monkeypatch.setattr(service_module, 'load_papers', fake_loader(loads))
+    assert ranking_service.papers_for('down', '1', '2')[0] == [{'id': 'down'}]
+
+
+def test_cached_windows_are_bounded(ranking_service, monkeypatch):
+    loads = []
+    monkeypatch.setattr(service_module, 'load_papers', fake_loader(loads))
+    for category in ('a', 'b', 'a', 'c', 'a'):
+        ranking_service.papers_for(category, '1', '2')
+    # 'b' was least recently used when 'c' arrived, so 'a' stayed cached throughout.
+    assert [category for category, _ in loads] == ['a', 'b', 'c']
+    ranking_service.papers_for('b', '1', '2')
+    assert [category for category, _ in loads] == ['a', 'b', 'c', 'b']
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    model = HashingEmbeddingModel()
+    papers = [{'id': f"http://arxiv.org/abs/2601.0000{i}v1", 'title': title, 'abstract': title}
+              for i, title in enumerate(["quasar outflows", "dust in galaxies", "weak lensing"])]
+    monkeypatch.setattr(service_module, 'load_papers',
+                        lambda *args, **kwargs: (papers, model.encode([paper['abstract'] for paper in papers])))
+    service = RankingService(PipelineContext(cache_dir=str(tmp_path), embedding_model=model))
+    http_server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(service))
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    http_server.url = f"http://127.0.0.1:{http_server.server_address[1]}"
+    http_server.service = service
+    yield http_server
+    http_server.shutdown()
+    http_server.server_close()
+
+
+def test_health_and_unknown_paths(server):
+    assert requests.get(f"{server.url}/health").json() == {'status': 'ok'}
+    assert requests.get(f"{server.url}/nope").status_code == 404
+    assert requests.post(f"{server.url}/nope", json={}).status_code == 404
+
+
+def test_rank_handler(server):
+    response = requests.post(f"{server.url}/rank", json={'interests': "quasar outflows", 'top_k': 2})
+    assert response.status_code == 200
+    results = response.json()['results']
+    assert len(results) == 1 and len(results[0]) == 2
+    assert results[0][0]['title'] == "quasar outflows"
+    assert requests.post(f"{server.url}/rank", json={}).status_code == 400
+    assert requests.post(f"{server.url}/rank", data=b"not json").status_code == 400
+    assert requests.post(f"{server.url}/similar", json={}).status_code == 400
+
+
+def test_digest_handler_serves_category_and_user_digests(server):
+    day = datetime.date(2026, 1, 5)
+    save_digest(server.service.ctx, day, 'astro-ph.GA', "# GA digest")
+    save_digest(server.service.ctx, day, user_digest_name('ashley'), "# Ashley's digest")
+    response = requests.get(f"{server.url}/digest", params={'category': 'astro-ph.GA', 'date': '20260105'})
+    assert response.status_code == 200 and response.text == "# GA digest"
+    assert requests.get(f"{server.url}/digest", params={'user': 'ashley', 'date': '20260105'}).text == "# Ashley's digest"
+    assert requests.get(f"{server.url}/digest", params={'user': 'bo', 'date': '20260105'}).status_code == 404
+    assert requests.get(f"{server.url}/digest", params={'date': 'yesterday'}).status_code == 400
+
+
+def test_digest_handler_runs_batch_configs(server, monkeypatch):
+    runs = []
+
+    def fake_run_batch(ctx, config):
+        runs.append(config)
+        return {user['name']: f"/digests/{user['name']}.md" for user in config['users']} if len(runs) == 1 else {}
+
+    monkeypatch.setattr(batch_module, 'run_batch', fake_run_batch)
+    config = {'name': 'group', 'users': [{'name': 'ashley', 'categories': 'astro-ph.GA', 'interests': 'dust'}]}
+    response = requests.post(f"{server.url}/digest", json=config)
+    assert response.status_code == 200 and response.json()['results'] == {'ashley': "/digests/ashley.md"}
+    assert runs[0]['users'][0]['interests'] == ['dust'] and runs[0]['name'] == 'group'
+    # A rerun with nothing new is not an error.
+    assert requests.post(f"{server.url}/digest", json=config).json()['results'] == {}
+    response = requests.post(f"{server.url}/digest", json={'users': [{'name': 'bo'}]})
+    assert response.status_code == 400 and 'bo' in response.json()['error']
+    assert len(runs) == 2
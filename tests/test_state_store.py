@@ -0,0 +1,170 @@
+import io
+import sqlite3
+
+import pytest
+
+from benchmarks.stubs import HashingEmbeddingModel
+from src import arxiv_utils, download_utils, extraction_runner
+from src.extraction_runner import STATUS_FALLBACK, STATUS_OK, STATUS_TIMEOUT
+from src.pipeline import PipelineContext, fetch_papers, incremental_window, load_papers, summarize_paper_urls
+from src.state_store import PipelineState
+from src.summarize_executor import FakeGenaiClient
+
+START, END = '202601050000', '202601060000'
+
+
+def paper(number, *categories, version=1):
+    return {'id': f"http://arxiv.org/abs/2601.{number:05d}v{version}", 'title': f"Paper {number}",
+            'abstract': f"Abstract of paper {number} about galaxies.", 'authors': [{'name': 'A. Author'}],
+            'categories': list(categories), 'primary_category': categories[0]}
+
+
+@pytest.fixture
+def state(tmp_path):
+    state = PipelineState(str(tmp_path / 'state.sqlite'))
+    yield state
+    state.close()
+
+
+@pytest.fixture
+def ctx(tmp_path, monkeypatch):
+    feeds = {}
+
+    def iter_arxiv_feed(category, start_date, end_date, delay=3, feed_info=None, **kwargs):
+        if feed_info is not None:
+            feed_info['complete'] = True
+        return iter(list(feeds.get(category, [])))
+
+    monkeypatch.setattr(arxiv_utils, 'iter_arxiv_feed', iter_arxiv_feed)
+    monkeypatch.setattr(arxiv_utils, 'get_arxiv_dates', lambda: (START, END))
+    ctx = PipelineContext(cache_dir=str(tmp_path), embedding_model_name='hashing-384',
+                          embedding_model=HashingEmbeddingModel())
+    ctx.feeds = feeds
+    yield ctx
+    ctx.state.close()
+
+
+def test_watermarks_are_kept_per_run_name_and_feed(state):
+    state.set_watermark('digest:astro-ph.GA', 'astro-ph.GA', END)
+    assert state.get_watermark('digest:astro-ph.GA', 'astro-ph.GA') == END
+    assert state.get_watermark('batch:team', 'astro-ph.GA') is None
+    assert state.get_watermark('digest:astro-ph.GA', 'astro-ph.CO') is None
+
+
+def test_watermarks_never_move_backwards(state):
+    state.set_watermark('digest:astro-ph.GA', 'astro-ph.GA', END)
+    state.set_watermark('digest:astro-ph.GA', 'astro-ph.GA', START)
+    assert state.get_watermark('digest:astro-ph.GA', 'astro-ph.GA') == END
+
+
+def test_known_papers_are_scoped_to_run_name_and_feed(state):
+    run = state.start_run('digest:astro-ph.GA', START, END)
+    state.record_ingested(run, 'astro-ph.GA', ['2601.00001v1'])
+    assert not state.is_known('2601.00001v1', run, 'astro-ph.GA')  # the run that ingested it
+    rerun = state.start_run('digest:astro-ph.GA', START, END)
+    assert state.is_known('2601.00001v1', rerun, 'astro-ph.GA')
+    assert not state.is_known('2601.00001v1', rerun, 'astro-ph.CO')
+    other = state.start_run('batch:team', START, END)
+    assert not state.is_known('2601.00001v1', other, 'astro-ph.GA')
+
+
+def test_unfinished_run_resumes(state):
+    run = state.start_run('digest:astro-ph.GA', START, END)
+    state.update_run(run, 'fetched', papers=['2601.00001v1'])
+    resumed = state.unfinished_run('digest:astro-ph.GA')
+    assert resumed['run_id'] == run['run_id'] and resumed['status'] == 'fetched'
+    assert resumed['papers'] == ['2601.00001v1']
+    state.update_run(resumed, 'ranked')
+    state.update_run(resumed, 'done')
+    assert state.unfinished_run('digest:astro-ph.GA') is None
+
+
+def test_rerun_merges_into_the_days_snapshot(ctx):
+    ctx.feeds['astro-ph.GA'] = [paper(1, 'astro-ph.GA')]
+    first = ctx.state.start_run('digest:astro-ph.GA', START, END)
+    fetch_papers(ctx, 'astro-ph.GA', START, END, run=first)
+    ctx.state.update_run(first, 'done')
+
+    ctx.feeds['astro-ph.GA'] = [paper(1, 'astro-ph.GA'), paper(2, 'astro-ph.GA')]
+    rerun = ctx.state.start_run('digest:astro-ph.GA', START, END)
+    new, _ = fetch_papers(ctx, 'astro-ph.GA', START, END, run=rerun)
+    assert [p['id'] for p in new] == [paper(2, 'x')['id']]
+    snapshot, _ = load_papers(ctx, 'astro-ph.GA', END, fetch_missing=False, embed=False)
+    assert sorted(p['id'] for p in snapshot) == [paper(1, 'x')['id'], paper(2, 'x')['id']]
+
+
+
+def test_rerun_after_the_watermark_finds_nothing_new(ctx):
+    run = incremental_window(ctx, 'astro-ph.GA', 'digest:astro-ph.GA')
+    ctx.state.set_watermark(run['name'], 'astro-ph.GA', END)
+    ctx.state.update_run(run, 'done')
+    assert incremental_window(ctx, 'astro-ph.GA', 'digest:astro-ph.GA') is None
+    assert incremental_window(ctx, 'astro-ph.GA', 'batch:team') is not None
+
+
+def test_old_per_feed_watermarks_are_migrated(tmp_path):
+    path = str(tmp_path / 'state.sqlite')
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        'CREATE TABLE watermarks (feed TEXT PRIMARY KEY, watermark TEXT NOT NULL, updated REAL NOT NULL);'
+        'CREATE TABLE runs (run_id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, start_date TEXT NOT NULL,'
+        ' end_date TEXT NOT NULL, status TEXT NOT NULL, payload TEXT NOT NULL, created REAL NOT NULL,'
+        ' updated REAL NOT NULL);'
+    )
+    conn.execute("INSERT INTO watermarks VALUES ('astro-ph.GA', ?, 0)", (END,))
+    conn.execute("INSERT INTO runs (name, start_date, end_date, status, payload, created, updated)"
+                 " VALUES ('batch:team', ?, ?, 'done', '{}', 0, 0)", (START, END))
+    conn.commit()
+    conn.close()
+
+    state = PipelineState(path)
+    assert state.get_watermark('digest:astro-ph.GA', 'astro-ph.GA') == END
+    assert state.get_watermark('batch:team', 'astro-ph.GA') == END
+    assert state.get_watermark('digest:astro-ph.CO', 'astro-ph.CO') is None
+    state.close()
+    # The old table is gone, so reopening does not copy stale watermarks again.
+    state = PipelineState(path)
+    assert state.get_watermark('digest:astro-ph.GA', 'astro-ph.GA') == END
+    state.close()
+
+
+def test_finishing_a_run_prunes_papers_no_unfinished_run_needs(state):
+    first = state.start_run('digest:astro-ph.GA', START, END)
+    state.record_papers([paper(1, 'astro-ph.GA'), paper(2, 'astro-ph.GA')], 'embedded', first['run_id'])
+    state.mark_stage(paper(1, 'x')['id'], 'extracted', text="full text")
+    second = state.start_run('batch:team', START, END)
+    state.record_papers([paper(3, 'astro-ph.GA')], 'embedded', second['run_id'])
+    state.update_run(second, 'ranked', selected=[[paper(2, 'x')['id'], 0.9]])
+    state.mark_stage('http://arxiv.org/abs/2601.09999v1', 'summarized', summary="from `summarize`")
+
+    state.update_run(first, 'done')
+    ids = [paper(i, 'x')['id'] for i in (1, 2, 3)] + ['http://arxiv.org/abs/2601.09999v1']
+    # Paper 2 is selected and paper 3 was fetched by the unfinished batch run.
+    assert sorted(state.get_progress(ids)) == [paper(2, 'x')['id'], paper(3, 'x')['id']]
+    state.update_run(second, 'done')
+    assert state.get_progress(ids) == {}
+
+
+def test_only_clean_extractions_are_reused_on_resume(ctx, monkeypatch):
+    urls = [paper(i, 'x')['id'] for i in (1, 2, 3)]
+    results = [
+        {'status': STATUS_OK, 'text': "clean text", 'pages_extracted': 3, 'total_pages': 3, 'reason': None},
+        {'status': STATUS_FALLBACK, 'text': "first pages", 'pages_extracted': 1, 'total_pages': None,
+         'reason': "timeout: exceeded 60s; used first 1 pages"},
+        {'status': STATUS_TIMEOUT, 'text': "some pages", 'pages_extracted': 2, 'total_pages': 9,
+         'reason': "exceeded 60s"},
+    ]
+    monkeypatch.setattr(download_utils, 'download_pdfs', lambda urls, **kwargs: [io.BytesIO(b'%PDF') for _ in urls])
+    monkeypatch.setattr(extraction_runner, 'extract_texts_sandboxed', lambda sources, **kwargs: results)
+    ctx._client = FakeGenaiClient(failures=[400, 400, 400])  # no summaries, so a rerun extracts again
+    summarize_paper_urls(ctx, urls, state=ctx.state)
+
+    progress = ctx.state.get_progress(urls)
+    assert [progress[url]['stage'] for url in urls] == ['extracted'] * 3
+    assert [progress[url]['text'] for url in urls] == ["clean text", None, None]
+
+    extracted = []
+    monkeypatch.setattr(extraction_runner, 'extract_texts_sandboxed',
+                        lambda sources, **kwargs: extracted.append(len(sources)) or results[1:])
+    summarize_paper_urls(ctx, urls, state=ctx.state)
+    assert extracted == [2]
@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+from src.llm_cache import LLMCache
+from src.summarize_executor import FakeAPIError, FakeGenaiClient, SummarizationExecutor, is_retryable_error
+
+
+def make_executor(client, **kwargs):
+    kwargs.setdefault('requests_per_minute', 1e6)
+    kwargs.setdefault('backoff_base', 0.01)
+    return SummarizationExecutor(client, prompt_builder=lambda text: f"Summarize: {text}", **kwargs)
+
+
+@pytest.mark.parametrize('error, retryable', [
+    (FakeAPIError(429), True),
+    (FakeAPIError(503), True),
+    (FakeAPIError(400), False),
+    (ConnectionError(), True),
+    (TimeoutError(), True),
+    (ValueError(), False),
+])
+def test_retryable_errors(error, retryable):
+    assert is_retryable_error(error) is retryable
+
+
+def test_results_keep_input_order_and_skip_empty_texts():
+    client = FakeGenaiClient(latency=lambda prompt: 0.05 if 'first' in prompt else 0.0,
+                             responder=lambda prompt: prompt.upper())
+    results = make_executor(client).summarize_all(["first", None, "second", ""])
+    assert results == ["SUMMARIZE: FIRST", None, "SUMMARIZE: SECOND", None]
+    assert len(client.calls) == 2
+
+
+def test_retries_rate_limits_and_server_errors():
+    client = FakeGenaiClient(failures=[429, 503])
+    results = make_executor(client, max_concurrency=1).summarize_all(["paper"])
+    assert results[0] is not None
+    assert len(client.calls) == 3
+
+
+def test_gives_up_after_max_retries():
+    client = FakeGenaiClient(failures=[503, 503, 503])
+    assert make_executor(client, max_concurrency=1, max_retries=3).summarize_all(["paper"]) == [None]
+    assert len(client.calls) == 3
+
+
+def test_does_not_retry_client_errors():
+    client = FakeGenaiClient(failures=[400])
+    assert make_executor(client, max_concurrency=1).summarize_all(["paper", "other"])[0] is None
+    assert len(client.calls) == 2
+
+
+def test_cancel_wakes_workers_in_backoff_and_drops_queued_work():
+    client = FakeGenaiClient(failures=[503] * 10)
+    executor = make_executor(client, max_concurrency=2, backoff_base=30.0)
+    results = []
+    worker = threading.Thread(target=lambda: results.extend(executor.summarize_all(["a", "b", "c", "d"])))
+    worker.start()
+    time.sleep(0.2)
+    started = time.perf_counter()
+    executor.cancel()
+    worker.join(5)
+    assert not worker.is_alive() and time.perf_counter() - started < 2
+    assert executor.cancelled
+    assert results == [None] * 4
+    assert len(client.calls) == 2
+
+
+def test_cached_responses_skip_the_client(tmp_path):
+    cache = LLMCache(str(tmp_path / 'llm.sqlite'), bypass=False)
+    client = FakeGenaiClient()
+    first = make_executor(client, cache=cache).summarize_all(["paper"])
+    second = make_executor(client, cache=cache).summarize_all(["paper"])
+    assert first == second and len(client.calls) == 1
+    make_executor(client, cache=cache, generation_config={'temperature': 0.9}).summarize_all(["paper"])
+    assert len(client.calls) == 2
+    cache.close()